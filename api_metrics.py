@@ -0,0 +1,216 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+# Границы корзин гистограммы времени ответа, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class ApiMetrics:
+    """
+    Метрики вызовов Zabbix API по методам ('host.get', 'event.get', ...):
+    число вызовов, гистограмма времени ответа, размер ответа (объекты и байты),
+    ошибки и повторы. Экспорт в текстовом формате Prometheus и в JSON.
+    Потокобезопасный.
+
+    Подключается к API как хук вызовов (API.add_call_hook) или как контекстный
+    менеджер вокруг задачи - тогда по выходу пишется файл с метриками:
+
+        with ApiMetrics(api, job="make_cache", path="/var/lib/node_exporter/zabbix_cache.prom"):
+            cache.make_cache()
+
+    Args:
+        api: API (или AsyncAPI), к которому подключаться в with (None - подключать вручную)
+        job: Имя задачи, добавляется меткой job ко всем метрикам
+        path: Файл, куда записать метрики по выходу из with (.json - JSON, иначе Prometheus)
+        buckets: Границы корзин гистограммы, секунды
+        measure_bytes: Считать размер ответа в байтах. Каждый result сериализуется
+                       в JSON заново, на больших ответах это заметная нагрузка на CPU,
+                       поэтому по умолчанию выключено (метрика bytes не выводится)
+    """
+
+    def __init__(self, api=None, job=None, path=None, buckets=DEFAULT_BUCKETS, measure_bytes=False):
+        self.api = api
+        self.job = job
+        self.path = Path(path) if path else None
+        self.buckets = tuple(sorted(buckets))
+        self.measure_bytes = measure_bytes
+
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._methods = {}
+            self._job = {'start': None, 'duration': None, 'success': None}
+
+    def __call__(self, method, elapsed, result, error, retry):
+        """
+        Хук вызова API.
+
+        Args:
+            method: Метод Zabbix API
+            elapsed: Время ответа, секунды
+            result: Поле result ответа (None при ошибке)
+            error: Исключение или None
+            retry: True, если это повтор вызова
+        """
+        items = len(result) if isinstance(result, (list, dict)) else 0
+        # Размер в байтах UTF-8, как в теле ответа, а не число символов
+        size = (len(json.dumps(result, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+                if self.measure_bytes and error is None else 0)
+
+        with self._lock:
+            stats = self._methods.get(method)
+            if stats is None:
+                stats = self._methods[method] = {
+                    'calls': 0, 'errors': 0, 'retries': 0, 'items': 0, 'bytes': 0,
+                    'latency_sum': 0.0, 'latency_max': 0.0, 'buckets': [0] * len(self.buckets)
+                }
+            stats['calls'] += 1
+            stats['errors'] += error is not None
+            stats['retries'] += bool(retry)
+            stats['items'] += items
+            stats['bytes'] += size
+            stats['latency_sum'] += elapsed
+            stats['latency_max'] = max(stats['latency_max'], elapsed)
+            for i, bound in enumerate(self.buckets):
+                if elapsed <= bound:
+                    stats['buckets'][i] += 1
+                    break
+
+    # ------------------------------------------------------------------ задача
+
+    def __enter__(self):
+        if self.api is not None:
+            self.api.add_call_hook(self)
+        with self._lock:
+            self._job['start'] = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.api is not None:
+            self.api.remove_call_hook(self)
+        with self._lock:
+            self._job['duration'] = time.time() - self._job['start']
+            self._job['success'] = exc_type is None
+        if self.path is not None:
+            try:
+                self.write(self.path)
+            except IOError as e:
+                print(f"Ошибка записи метрик {self.path}: {e}")
+
+    # ------------------------------------------------------------------ экспорт
+
+    def stats(self):
+        """
+        Returns:
+            {'job': {...}, 'methods': {метод: {'calls', 'errors', 'retries', 'items', 'bytes',
+             'latency_sum', 'latency_avg', 'latency_max', 'histogram': {граница: накопленное число}}}}
+        """
+        with self._lock:
+            methods = {}
+            for method, stats in sorted(self._methods.items()):
+                result = {key: value for key, value in stats.items() if key != 'buckets'}
+                result['latency_avg'] = stats['latency_sum'] / stats['calls'] if stats['calls'] else 0.0
+                cumulative = 0
+                result['histogram'] = {}
+                for bound, count in zip(self.buckets, stats['buckets']):
+                    cumulative += count
+                    result['histogram'][_format_bound(bound)] = cumulative
+                result['histogram']['+Inf'] = stats['calls']
+                methods[method] = result
+            return {'job': dict(self._job, name=self.job), 'methods': methods}
+
+    def top(self, key='latency_sum', limit=5):
+        """Методы, на которые пришлось больше всего key (по умолчанию - суммарного времени)"""
+        methods = self.stats()['methods']
+        return sorted(methods.items(), key=lambda item: item[1][key], reverse=True)[:limit]
+
+    def to_json(self):
+        return json.dumps(self.stats(), indent=2)
+
+    def to_prometheus(self):
+        stats = self.stats()
+        base = {'job': self.job} if self.job else {}
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{_format_labels(dict(base, **labels))} {_format_value(value)}")
+
+        methods = stats['methods']
+        counters = [
+            ('calls', 'zabbix_api_requests_total', "Zabbix API calls by method"),
+            ('errors', 'zabbix_api_errors_total', "Failed Zabbix API calls by method"),
+            ('retries', 'zabbix_api_retries_total', "Retried Zabbix API calls by method"),
+            ('items', 'zabbix_api_response_items_total', "Objects returned by Zabbix API")
+        ]
+        if self.measure_bytes:
+            counters.append(('bytes', 'zabbix_api_response_bytes_total', "Size of Zabbix API results, bytes"))
+        for key, name, help_text in counters:
+            metric(name, 'counter', help_text,
+                   [('', {'method': method}, m[key]) for method, m in methods.items()])
+
+        samples = []
+        for method, m in methods.items():
+            for bound, count in m['histogram'].items():
+                samples.append(('_bucket', {'method': method, 'le': bound}, count))
+            samples.append(('_sum', {'method': method}, m['latency_sum']))
+            samples.append(('_count', {'method': method}, m['calls']))
+        metric('zabbix_api_request_duration_seconds', 'histogram',
+               "Zabbix API response time, seconds", samples)
+
+        job = stats['job']
+        if job['duration'] is not None:
+            metric('zabbix_api_job_duration_seconds', 'gauge', "Job duration, seconds",
+                   [('', {}, job['duration'])])
+            metric('zabbix_api_job_success', 'gauge', "1 if the job finished without an exception",
+                   [('', {}, int(job['success']))])
+            metric('zabbix_api_job_last_run_timestamp_seconds', 'gauge', "Job start time, unixtime",
+                   [('', {}, job['start'])])
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path, fmt=None):
+        """
+        Атомарно пишет метрики в файл (подходит для textfile collector node_exporter).
+
+        Args:
+            fmt: 'json' или 'prometheus', по умолчанию - по расширению файла
+        """
+        path = Path(path)
+        fmt = fmt or ('json' if path.suffix == '.json' else 'prometheus')
+        data = self.to_json() if fmt == 'json' else self.to_prometheus()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+
+def _format_bound(bound):
+    return repr(float(bound))
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(int(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
@@ -0,0 +1,268 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from mock_zabbix import MockDataset, MockZabbixServer
+
+
+# Порядок важен: report читает кэши, собранные make_cache и event_cache
+BENCHMARKS = ['api', 'make_cache', 'event_cache', 'report']
+
+
+def _peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает КБ, macOS - байты
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def _connect(url, lazy=False):
+    from zabbix_api import API
+    return API(url=url, user='Admin', password='zabbix', lazy=lazy)
+
+# -------------------------------------------------------------------------------------------
+
+
+def bench_api(url, workdir, options):
+    #Типовой набор вызовов API: группы, хосты, теги/группы/макросы пачками, проблемы, события
+    api = _connect(url)
+    groups = api.get_hostgroup_list_v64()
+    hosts = api.get_hostgroup_hosts_v64(groups=groups['array'])
+    hostids = list(hosts['all'])
+    bulk = api.get_hosts_bulk(hostids, macros=True, fields=True)
+    problems = api.get_problem(hostids)
+    events = sum(1 for _ in api.iter_events(options['time_from'], options['time_till'],
+                                            page_size=options['page_size']))
+    return len(bulk) + len(problems) + events
+
+
+def bench_make_cache(url, workdir, options):
+    from make_cache import ZabbixCache
+    api = _connect(url)
+    cache = ZabbixCache(api, cache_dir=workdir / 'cache_structure', pid_dir=workdir / 'pid')
+    cache.make_cache()
+    with open(cache.cache_file) as f:
+        return len(json.load(f)['host']['all'])
+
+
+def bench_event_cache(url, workdir, options):
+    from event_cache import ZabbixEventCache
+    from cache_format import format_for_path
+    api = _connect(url)
+    cache = ZabbixEventCache(api, workdir / 'cache_event', days_to_cache=options['days'],
+                             page_size=options['page_size'], cache_format=options['cache_format'])
+    cache.run(workers=options['workers'])
+    return sum(len(format_for_path(path).read(path)) for path in cache.cache_dir.glob('events-*'))
+
+
+def bench_report(url, workdir, options):
+    from make_report import ZabbixEventReport
+    config = workdir / 'report.ini'
+    config.write_text(
+        "[paths]\n"
+        f"folder_cache = {workdir / 'cache_structure'}\n"
+        f"folder_cache_event = {workdir / 'cache_event'}\n"
+        f"folder_pid = {workdir / 'pid'}\n"
+        f"folder_report = {workdir / 'report'}\n"
+        "[settings]\n"
+        f"report_event_day = {options['days']}\n"
+        f"report_format = {options['report_format']}\n"
+    )
+    report = ZabbixEventReport(_connect(url, lazy=True), config)
+    if report.run() is None:
+        return 0
+    return sum(1 for _ in report._iter_events())
+
+
+def _problem_events(dataset, time_from, time_till):
+    #Столько проблем (min_severity=1) за период должны вернуть iter_events и кэш событий
+    return sum(1 for e in dataset.events
+               if e['value'] == '1' and int(e['severity']) >= 1 and time_from <= int(e['clock']) <= time_till)
+
+
+def expected_items(name, dataset, options):
+    """
+    Сколько объектов должен обработать замер на этом наборе данных (None - не проверяется).
+    Без проверки замер на сервере, обрезающем ответы (page_limit), "ускоряется"
+    за счет потерянных данных.
+    """
+    if name == 'api':
+        return (len(dataset.hosts) + len(dataset.problems)
+                + _problem_events(dataset, options['time_from'], options['time_till']))
+    if name == 'make_cache':
+        return len(dataset.hosts)
+    if name == 'event_cache':
+        from event_cache import ZabbixEventCache
+        # Дни 1..days назад, как в ZabbixEventCache.run (границы дня входят в оба соседних дня)
+        starts = [ZabbixEventCache._get_day_start(day) for day in range(1, options['days'] + 1)]
+        return sum(_problem_events(dataset, start, start + 86400) for start in starts)
+    return None
+
+
+def _child(name, url, workdir, options, queue):
+    #Каждый замер идет в отдельном процессе: так пиковый RSS относится только к нему
+    func = globals()['bench_' + name]
+    output = None if options['verbose'] else open(os.devnull, 'w')
+    try:
+        with contextlib.redirect_stdout(output or sys.stdout):
+            start = time.perf_counter()
+            items = func(url, Path(workdir), options)
+            wall = time.perf_counter() - start
+        queue.put({'items': items, 'wall': wall, 'rss_mb': _peak_rss_mb(), 'error': None})
+    except Exception as e:
+        queue.put({'items': 0, 'wall': 0.0, 'rss_mb': _peak_rss_mb(), 'error': repr(e)})
+
+# -------------------------------------------------------------------------------------------
+
+
+def run_benchmarks(names=None, dataset_options=None, server_options=None, **options):
+    """
+    Поднимает mock-сервер и по очереди запускает замеры.
+
+    Args:
+        names: Какие замеры запускать (по умолчанию все BENCHMARKS)
+        dataset_options: Параметры MockDataset
+        server_options: Параметры MockZabbix (latency, page_limit, ...)
+        options: days, page_size, workers, cache_format, report_format, verbose
+
+    Returns:
+        {имя: {'requests', 'methods', 'bytes', 'wall', 'rss_mb', 'items', 'expected',
+               'items_per_sec', 'requests_per_sec', 'error'}}
+        expected - сколько объектов должно быть по набору данных (см. expected_items)
+    """
+    dataset_options = dict(dataset_options or {})
+    options = dict({'days': dataset_options.get('days', 3), 'page_size': 1000, 'workers': 1,
+                    'cache_format': 'json', 'report_format': 'xlsx', 'verbose': False}, **options)
+
+    dataset = MockDataset(**dataset_options)
+    clocks = [int(event['clock']) for event in dataset.events] or [0]
+    options.setdefault('time_from', min(clocks))
+    options.setdefault('time_till', max(clocks))
+    results = {}
+
+    with tempfile.TemporaryDirectory(prefix='zabbix-bench-') as workdir, \
+            MockZabbixServer(dataset, **(server_options or {})) as server:
+        for name in names or BENCHMARKS:
+            server.mock.reset_stats()
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_child, args=(name, server.url, workdir, options, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+
+            stats = server.mock.snapshot()
+            wall = result['wall']
+            result.update(
+                requests=stats['requests'],
+                methods=stats['methods'],
+                bytes=stats['bytes'],
+                expected=expected_items(name, dataset, options),
+                items_per_sec=round(result['items'] / wall, 1) if wall else 0.0,
+                requests_per_sec=round(stats['requests'] / wall, 1) if wall else 0.0,
+            )
+            results[name] = result
+
+    return results
+
+
+def check_items(results):
+    """
+    Returns:
+        Список строк о замерах, обработавших не столько объектов, сколько в наборе данных
+    """
+    return [f"{name}: объектов {result['items']}, ожидалось {result['expected']}"
+            for name, result in results.items()
+            if result.get('expected') is not None and result['items'] != result['expected']]
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Сравнивает с сохраненными результатами. Замер с другим числом объектов, чем
+    в базовом прогоне, - тоже регрессия: быстрее за счет потерянных данных.
+
+    Returns:
+        Список строк с регрессиями (пустой - регрессий нет)
+    """
+    regressions = check_items(results)
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        if 'items' in old and result['items'] != old['items']:
+            regressions.append(f"{name}: объектов {old['items']} -> {result['items']}")
+        if result['requests'] > old['requests']:
+            regressions.append(f"{name}: запросов {old['requests']} -> {result['requests']}")
+        for key in ('wall', 'rss_mb'):
+            if old[key] and result[key] > old[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {old[key]:.2f} -> {result[key]:.2f}")
+    return regressions
+
+
+def print_results(results):
+    print(f"{'benchmark':<12} {'requests':>9} {'wall, s':>9} {'peak RSS, MB':>13} "
+          f"{'items':>9} {'items/s':>10} {'req/s':>8}")
+    for name, r in results.items():
+        print(f"{name:<12} {r['requests']:>9} {r['wall']:>9.2f} {r['rss_mb']:>13.1f} "
+              f"{r['items']:>9} {r['items_per_sec']:>10.1f} {r['requests_per_sec']:>8.1f}")
+        if r['error']:
+            print(f"  ошибка: {r['error']}")
+        if r.get('expected') is not None and r['items'] != r['expected']:
+            print(f"  неполные данные: {r['items']} из {r['expected']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Замеры API, make_cache, event_cache и отчета на mock-сервере")
+    parser.add_argument('benchmarks', nargs='*', metavar='benchmark',
+                        help=f"Какие замеры запускать: {', '.join(BENCHMARKS)} (по умолчанию все)")
+    parser.add_argument('--hosts', type=int, default=1000)
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--events-per-day', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0, help="Задержка ответа сервера, секунды")
+    parser.add_argument('--page-limit', type=int, default=None, help="Максимум объектов в ответе сервера")
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=1, help="Потоки ZabbixEventCache.run")
+    parser.add_argument('--cache-format', default='json')
+    parser.add_argument('--report-format', default='xlsx')
+    parser.add_argument('--json', help="Сохранить результаты в файл")
+    parser.add_argument('--baseline', help="Сравнить с ранее сохраненными результатами")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Допустимое ухудшение wall/RSS (доля)")
+    parser.add_argument('--verbose', action='store_true', help="Не скрывать вывод замеряемого кода")
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(f"неизвестный замер: {name}")
+
+    results = run_benchmarks(
+        names=args.benchmarks or None,
+        dataset_options={'hosts': args.hosts, 'groups': args.groups, 'events_per_day': args.events_per_day,
+                         'days': args.days, 'seed': args.seed},
+        server_options={'latency': args.latency, 'page_limit': args.page_limit},
+        days=args.days,
+        page_size=args.page_size,
+        workers=args.workers,
+        cache_format=args.cache_format,
+        report_format=args.report_format,
+        verbose=args.verbose,
+    )
+    print_results(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+    else:
+        regressions = check_items(results)
+    for line in regressions:
+        print(f"Регрессия: {line}")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,426 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+
+
+# Значение "нет данных" для числовых колонок
+NONE = -1
+NONE_NAME = 0xFFFFFFFF
+
+
+class JsonFormat:
+    """
+    Исходный формат кэша событий: список словарей в JSON.
+    """
+    name = 'json'
+    suffix = '.json'
+
+    def write(self, path, events):
+        with open(path, 'w') as f:
+            json.dump(events, f, indent=2)
+
+    def read(self, path):
+        with open(path) as f:
+            return json.load(f)
+
+    def is_valid(self, path):
+        # У JSON нет заголовка - проверить можно только полным разбором
+        try:
+            self.read(path)
+            return True
+        except (ValueError, IOError):
+            return False
+
+# -------------------------------------------------------------------------------------------
+
+
+class ColumnarFormat:
+    """
+    Компактный колоночный формат кэша событий (.evc).
+
+    Файл:
+        заголовок  <4sHHIIQ: magic, версия, резерв, число событий, crc32 данных, размер данных
+        колонки    массивы фиксированной ширины, каждая выровнена на 8 байт
+        списки     хосты и теги событий: offsets u32[count + 1] + значения (с версии 2)
+        строки     таблица уникальных строк (имена проблем, теги):
+                   count u32, offsets u32[count + 1], utf-8
+
+    Идентификаторы и время хранятся как int64, severity как int8, строки - как
+    индексы в таблице строк. Отсутствующие значения: NONE (-1) / NONE_NAME.
+    Чтение идет через mmap, колонки отдаются как memoryview без копирования.
+    """
+    name = 'columnar'
+    suffix = '.evc'
+
+    MAGIC = b'ZEVC'
+    VERSION = 2
+    HEADER = struct.Struct('<4sHHIIQ')
+
+    # Порядок колонок в файле: сначала 8-байтовые, потом 4 и 1 - так выравнивание
+    # нужно только в конце каждой колонки
+    COLUMNS = {
+        1: (
+            ('eventid', 'q'),
+            ('clock', 'q'),
+            ('objectid', 'q'),
+            ('r_eventid', 'q'),
+            ('recovery_eventid', 'q'),
+            ('recovery_clock', 'q'),
+            ('duration', 'q'),
+            ('name', 'I'),
+            ('severity', 'b'),
+        ),
+    }
+    COLUMNS[2] = COLUMNS[1] + (
+        ('acknowledged', 'b'),
+    )
+
+    # Списки переменной длины: (имя, [(колонка значений, тип), ...])
+    LISTS = (
+        ('hosts', (('host_id', 'q'),)),
+        ('tags', (('tag_name', 'I'), ('tag_value', 'I'))),
+    )
+
+    def write(self, path, events):
+        columns = {name: array(code) for name, code in self.COLUMNS[self.VERSION]}
+        lists = {}
+        for name, values in self.LISTS:
+            lists[name] = array('I', [0])
+            for column, code in values:
+                columns[column] = array(code)
+        strings = {}
+
+        def string_id(value):
+            return NONE_NAME if value is None else strings.setdefault(value, len(strings))
+
+        for event in events:
+            problem = event.get('problem', {})
+            recovery = event.get('recovery')
+
+            columns['eventid'].append(_to_int(problem.get('eventid')))
+            columns['clock'].append(_to_int(problem.get('clock')))
+            columns['objectid'].append(_to_int(problem.get('objectid')))
+            columns['r_eventid'].append(_to_int(problem.get('r_eventid')))
+            columns['severity'].append(_to_int(problem.get('severity')))
+            columns['acknowledged'].append(_to_int(problem.get('acknowledged')))
+            columns['name'].append(string_id(problem.get('name')))
+
+            if recovery:
+                columns['recovery_eventid'].append(_to_int(recovery.get('eventid')))
+                columns['recovery_clock'].append(_to_int(recovery.get('clock')))
+                columns['duration'].append(_to_int(event.get('duration')))
+            else:
+                columns['recovery_eventid'].append(NONE)
+                columns['recovery_clock'].append(NONE)
+                columns['duration'].append(NONE)
+
+            for hostid in problem.get('hosts', []):
+                columns['host_id'].append(int(hostid))
+            lists['hosts'].append(len(columns['host_id']))
+
+            for tag in problem.get('tags', []):
+                columns['tag_name'].append(string_id(tag.get('tag')))
+                columns['tag_value'].append(string_id(tag.get('value')))
+            lists['tags'].append(len(columns['tag_name']))
+
+        payload = bytearray()
+
+        def add(values):
+            payload.extend(_le_bytes(values))
+            payload.extend(b'\0' * (-len(payload) % 8))
+
+        for name, _ in self.COLUMNS[self.VERSION]:
+            add(columns[name])
+        for name, values in self.LISTS:
+            add(lists[name])
+            for column, _ in values:
+                add(columns[column])
+
+        encoded = [value.encode('utf-8') for value in strings]
+        offsets = array('I', [0])
+        for item in encoded:
+            offsets.append(offsets[-1] + len(item))
+        payload += struct.pack('<I', len(encoded))
+        payload += _le_bytes(offsets)
+        payload += b''.join(encoded)
+
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, 0, len(events),
+                                  zlib.crc32(payload), len(payload))
+        with open(path, 'wb') as f:
+            f.write(header)
+            f.write(payload)
+
+    def open(self, path):
+        return ColumnarEvents(path, self)
+
+    def read(self, path):
+        with self.open(path) as events:
+            return list(events)
+
+    def is_valid(self, path, checksum=True):
+        """
+        Проверка заголовка и размера файла, при checksum=True еще и crc32 данных.
+        Разбора данных не происходит.
+        """
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(self.HEADER.size)
+                magic, version, _, _, crc, size = self.HEADER.unpack(header)
+                if magic != self.MAGIC or version not in self.COLUMNS:
+                    return False
+                if os.fstat(f.fileno()).st_size != self.HEADER.size + size:
+                    return False
+                if not checksum:
+                    return True
+                if size == 0:
+                    return crc == zlib.crc32(b'')
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return zlib.crc32(mm[self.HEADER.size:]) == crc
+        except (struct.error, OSError, ValueError):
+            return False
+
+# -------------------------------------------------------------------------------------------
+
+
+class ColumnarEvents:
+    """
+    Открытый .evc файл.
+
+    events.columns['clock'] и т.п. - memoryview на данные в mmap (без копирования),
+    events.lists['hosts'] - смещения списков, events.strings - таблица строк.
+    Итерация отдает события в формате JSON-кэша.
+    """
+
+    def __init__(self, path, fmt=None):
+        fmt = fmt or ColumnarFormat()
+        self._file = open(path, 'rb')
+        self._mm = None
+        self._views = []
+
+        try:
+            if os.fstat(self._file.fileno()).st_size < fmt.HEADER.size:
+                raise ValueError(f"Файл {path} не является кэшем событий")
+
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, _, count, _, size = fmt.HEADER.unpack_from(self._mm, 0)
+            if magic != fmt.MAGIC or version not in fmt.COLUMNS:
+                raise ValueError(f"Файл {path} не является кэшем событий (версия {version})")
+
+            self.version = version
+            self.count = count
+            self.columns = {}
+            self.lists = {}
+
+            buf = memoryview(self._mm)
+            self._views.append(buf)
+            self._pos = fmt.HEADER.size
+
+            def take(code, length):
+                width = array(code).itemsize
+                column = self._column(buf[self._pos:self._pos + width * length], code)
+                self._pos += width * length
+                self._pos += -(self._pos - fmt.HEADER.size) % 8
+                return column
+
+            for name, code in fmt.COLUMNS[version]:
+                self.columns[name] = take(code, count)
+
+            if version >= 2:
+                for name, values in fmt.LISTS:
+                    self.lists[name] = take('I', count + 1)
+                    for column, code in values:
+                        self.columns[column] = take(code, self.lists[name][count])
+
+            pos = self._pos
+            (strings_count,) = struct.unpack_from('<I', self._mm, pos)
+            pos += 4
+            offsets = self._column(buf[pos:pos + 4 * (strings_count + 1)], 'I')
+            pos += 4 * (strings_count + 1)
+            blob = bytes(buf[pos:pos + offsets[strings_count]])
+            self.strings = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(strings_count)]
+
+        except Exception:
+            self.close()
+            raise
+
+    def _column(self, view, code):
+        # На little-endian машинах колонку можно использовать прямо из mmap
+        if sys.byteorder == 'little':
+            column = view.cast(code)
+            self._views.append(view)
+            self._views.append(column)
+            return column
+        column = array(code)
+        column.frombytes(view)
+        column.byteswap()
+        return column
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.event(i)
+
+    def _string(self, index):
+        return None if index == NONE_NAME else self.strings[index]
+
+    def event(self, i):
+        columns = self.columns
+        severity = columns['severity'][i]
+
+        event = {
+            'problem': {
+                'eventid': _to_id(columns['eventid'][i]),
+                'name': self._string(columns['name'][i]),
+                'clock': columns['clock'][i],
+                'objectid': _to_id(columns['objectid'][i]),
+                'severity': None if severity == NONE else str(severity),
+                'r_eventid': _to_id(columns['r_eventid'][i])
+            }
+        }
+
+        if self.version >= 2:
+            problem = event['problem']
+            problem['acknowledged'] = _to_id(columns['acknowledged'][i])
+
+            hosts = self.lists['hosts']
+            problem['hosts'] = [str(columns['host_id'][j]) for j in range(hosts[i], hosts[i + 1])]
+
+            tags = self.lists['tags']
+            problem['tags'] = [
+                {'tag': self._string(columns['tag_name'][j]), 'value': self._string(columns['tag_value'][j])}
+                for j in range(tags[i], tags[i + 1])
+            ]
+
+        if columns['recovery_eventid'][i] != NONE:
+            event['recovery'] = {
+                'eventid': _to_id(columns['recovery_eventid'][i]),
+                'clock': columns['recovery_clock'][i]
+            }
+            event['duration'] = columns['duration'][i]
+
+        return event
+
+    def close(self):
+        # memoryview нужно освободить до закрытия mmap
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# -------------------------------------------------------------------------------------------
+
+
+FORMATS = {
+    JsonFormat.name: JsonFormat,
+    ColumnarFormat.name: ColumnarFormat,
+}
+
+
+def get_format(name):
+    if name not in FORMATS:
+        raise ValueError(f"Неизвестный формат кэша '{name}', доступны: {', '.join(FORMATS)}")
+    return FORMATS[name]()
+
+
+def format_for_path(path):
+    """Формат по расширению файла"""
+    for fmt in FORMATS.values():
+        if str(path).endswith(fmt.suffix):
+            return fmt()
+    raise ValueError(f"Неизвестный формат файла {path}")
+
+
+def read_events(path):
+    """Читает дневной кэш событий любого поддерживаемого формата"""
+    return format_for_path(path).read(path)
+
+
+def convert_cache_dir(cache_dir, to='columnar', remove_source=False):
+    """
+    Переводит все дневные кэши events-*.* в каталоге в формат to.
+    Уже существующие валидные файлы в целевом формате не перезаписываются.
+
+    Returns:
+        Число сконвертированных файлов
+    """
+    target = get_format(to)
+    converted = 0
+
+    for source in sorted(Path(cache_dir).glob('events-*')):
+        if source.suffix == target.suffix or source.name.startswith('.'):
+            continue
+        try:
+            source_format = format_for_path(source)
+        except ValueError:
+            continue
+
+        destination = source.with_suffix(target.suffix)
+        if destination.exists() and target.is_valid(destination):
+            print(f"{destination.name} уже существует")
+            continue
+
+        try:
+            events = source_format.read(source)
+        except (ValueError, IOError) as e:
+            print(f"Не удалось прочитать {source.name}: {e}")
+            continue
+
+        tmp_file = destination.with_name(f".{destination.name}.{os.getpid()}.tmp")
+        try:
+            target.write(tmp_file, events)
+            os.replace(tmp_file, destination)
+        finally:
+            if tmp_file.exists():
+                tmp_file.unlink()
+
+        if remove_source:
+            source.unlink()
+        converted += 1
+        print(f"{source.name} -> {destination.name}")
+
+    return converted
+
+
+def _to_int(value):
+    if value is None or value == '':
+        return NONE
+    return int(value)
+
+
+def _to_id(value):
+    return None if value == NONE else str(value)
+
+
+def _le_bytes(values):
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Конвертация дневных кэшей событий")
+    parser.add_argument('cache_dir', help="Каталог с events-YYYY-MM-DD.*")
+    parser.add_argument('--to', default='columnar', choices=sorted(FORMATS))
+    parser.add_argument('--remove-source', action='store_true', help="Удалять исходные файлы")
+    args = parser.parse_args()
+
+    count = convert_cache_dir(args.cache_dir, to=args.to, remove_source=args.remove_source)
+    print(f"Сконвертировано файлов: {count}")
@@ -0,0 +1,291 @@
+import gc
+import json
+import marshal
+import os
+import stat
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+
+from cache_format import ColumnarFormat, format_for_path
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Каталог рядом с исходными файлами, где лежит их разобранная форма (marshal:
+# в отличие от pickle, при загрузке не выполняет код)
+PARSED_DIR = '.parsed'
+PARSED_SUFFIX = '.marshal'
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def loads(data):
+    """Разбор JSON (bytes или str): orjson, если установлен, иначе json"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load_json_file(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    with gc_paused():
+        return loads(data)
+
+
+@contextmanager
+def gc_paused():
+    """
+    Отключает сборщик мусора на время разбора. Разбор создает миллионы контейнеров,
+    и сборщик многократно обходит их все, хотя мусора среди них нет: на дневных
+    файлах это в 2-3 раза замедляет загрузку.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def parsed_path(path):
+    path = Path(path)
+    return path.parent / PARSED_DIR / f"{path.name}{PARSED_SUFFIX}"
+
+
+def _signature(path):
+    info = path.stat()
+    return info.st_size, info.st_mtime_ns
+
+
+def _is_private(path):
+    #Файл или каталог принадлежит текущему пользователю и недоступен на запись другим
+    info = os.stat(path)
+    return info.st_uid == os.getuid() and not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _read_parsed(path, signature, data=True):
+    #Разобранная форма, если она есть и снята с того же исходника; иначе None.
+    #data=False - только проверить подпись (она записана отдельно, перед данными)
+    parsed = parsed_path(path)
+    try:
+        # marshal не рассчитан на подделанные данные - чужие файлы не читаем
+        if not (_is_private(parsed.parent) and _is_private(parsed)):
+            print(f"Разобранный кэш {parsed} доступен на запись другим пользователям, не используется")
+            return None
+        with open(parsed, 'rb') as f:
+            if marshal.load(f) != signature:
+                return None
+            if not data:
+                return True
+            with gc_paused():
+                return marshal.load(f)
+    except (IOError, EOFError, ValueError, TypeError):
+        return None
+
+
+def _write_parsed(path, signature, data):
+    parsed = parsed_path(path)
+    try:
+        parsed.parent.mkdir(mode=0o700, exist_ok=True)
+        if not _is_private(parsed.parent):
+            print(f"Каталог {parsed.parent} доступен на запись другим пользователям, разобранный кэш не сохраняется")
+            return
+        tmp_path = parsed.with_name(f".{parsed.name}.{os.getpid()}.tmp")
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+            marshal.dump(tuple(signature), f)
+            marshal.dump(data, f)
+        os.replace(tmp_path, parsed)
+    except (IOError, ValueError) as e:
+        # ValueError - в данных есть тип, который marshal не сохраняет
+        print(f"Не удалось сохранить разобранный кэш {parsed}: {e}")
+
+
+def load_file(path, parsed=True):
+    """
+    Содержимое кэш-файла: снимка структуры (JSON) или дневного файла событий.
+
+    При parsed=True разобранная форма JSON сохраняется в .parsed/<имя>.marshal рядом
+    с исходником и читается вместо него, пока у исходника те же размер и mtime.
+    Файлы в .parsed/ используются, только если они и каталог принадлежат текущему
+    пользователю и не доступны на запись группе и остальным.
+    Колоночный формат читается через mmap напрямую, разобранная форма ему не нужна.
+    """
+    path = Path(path)
+    if path.suffix == ColumnarFormat.suffix:
+        return format_for_path(path).read(path)
+
+    # Подпись до чтения: если файл подменят после нее, в следующий раз она не совпадет
+    signature = _signature(path)
+    if parsed:
+        data = _read_parsed(path, signature)
+        if data is not None:
+            return data
+
+    data = load_json_file(path)
+    if parsed:
+        _write_parsed(path, signature, data)
+    return data
+
+
+def prepare_file(path):
+    """
+    Разбирает JSON-файл и сохраняет разобранную форму, если ее нет или она устарела.
+    Выполняется в процессах CacheLoader: сами данные между процессами не передаются.
+    """
+    path = Path(path)
+    if path.suffix == ColumnarFormat.suffix:
+        return
+    signature = _signature(path)
+    if _read_parsed(path, signature, data=False) is None:
+        _write_parsed(path, signature, load_json_file(path))
+
+
+def prune_parsed(directory):
+    """Удаляет разобранные формы файлов, которых уже нет в directory, и файлы прежнего формата (pickle)"""
+    parsed_dir = Path(directory) / PARSED_DIR
+    if not parsed_dir.is_dir():
+        return 0
+    removed = 0
+    for parsed in parsed_dir.iterdir():
+        if parsed.suffix == PARSED_SUFFIX and (parsed_dir.parent / parsed.stem).exists():
+            continue
+        if parsed.suffix in (PARSED_SUFFIX, '.pickle'):
+            parsed.unlink()
+            removed += 1
+    return removed
+
+# -------------------------------------------------------------------------------------------
+
+
+class CacheLoader:
+    """
+    Загрузка кэш-файлов с разбором JSON в процессах-исполнителях.
+
+    Исполнители разбирают JSON и пишут разобранную форму в .parsed/, текущий
+    процесс читает уже ее: передавать разобранные данные через pipe дороже,
+    чем разбирать заново. Поэтому workers > 1 имеет смысл только вместе с
+    parsed и дает выигрыш на холодном кэше (первый запуск, новые дни),
+    особенно без orjson; иначе разбор идет в текущем процессе.
+
+    iter_files отдает файлы в исходном порядке, но готовит наперед не больше
+    workers + 1 файлов. Подготовка начинается сразу при вызове iter_files.
+
+    Пример:
+        with CacheLoader(workers=4) as loader:
+            structure = loader.submit(snapshot_path)
+            days = loader.iter_files(day_files)
+            cache = loader.load(snapshot_path, structure)
+            for path, events in days:
+                ...
+
+    Args:
+        workers: Число процессов (1 - разбор в текущем процессе)
+        parsed: Использовать разобранную форму в .parsed/ (см. load_file)
+    """
+
+    def __init__(self, workers=1, parsed=True):
+        self.workers = max(int(workers), 1) if parsed else 1
+        self.parsed = parsed
+        self._pool = None
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def submit(self, path):
+        """Future подготовки файла; содержимое - load(path, future)"""
+        if self.workers > 1:
+            return self._executor().submit(prepare_file, path)
+
+        future = Future()
+        future.set_result(None)
+        return future
+
+    def load(self, path, future=None):
+        """Содержимое файла (после подготовки future, если она была)"""
+        if future is not None:
+            future.result()
+        return load_file(path, self.parsed)
+
+    def iter_files(self, paths):
+        """
+        Генератор (путь, содержимое) в порядке paths. Файлы, которые не удалось
+        прочитать, пропускаются с сообщением.
+        """
+        paths = deque(paths)
+        pending = deque()
+        # В одном процессе разбор идет по мере чтения, иначе - с опережением
+        window = self.workers + 1 if self.workers > 1 else 0
+        while paths and len(pending) < window:
+            path = paths.popleft()
+            pending.append((path, self.submit(path)))
+        return self._drain(paths, pending, window)
+
+    def _drain(self, paths, pending, window):
+        while paths or pending:
+            if not pending:
+                path = paths.popleft()
+                pending.append((path, self.submit(path)))
+
+            path, future = pending.popleft()
+            while paths and len(pending) < window:
+                next_path = paths.popleft()
+                pending.append((next_path, self.submit(next_path)))
+
+            try:
+                data = self.load(path, future)
+            except (ValueError, IOError) as e:
+                print(f"Error loading {path}: {e}")
+                continue
+            yield path, data
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# -------------------------------------------------------------------------------------------
+
+
+class StructureIndex:
+    """
+    Индексы по снимку структуры (make_cache.py), строятся один раз при загрузке:
+    hostid -> группы, hostid -> имя, groupid -> имя, groupid -> хосты.
+    """
+
+    def __init__(self, cache):
+        hosts = cache.get('host', {}).get('all', {})
+        self.group_names = {groupid: group.get('name', groupid)
+                            for groupid, group in cache.get('hg_available', {}).get('hash', {}).items()}
+        self.host_groups = {hostid: tuple(host.get('groups', [])) for hostid, host in hosts.items()}
+        self.host_names = {hostid: host.get('name') or host.get('host') or hostid
+                           for hostid, host in hosts.items()}
+        self.group_hosts = {groupid: frozenset(group.get('host', {}))
+                            for groupid, group in cache.get('host', {}).get('hostgroup', {}).items()}
+
+    def hosts_in_groups(self, groupids):
+        hostids = set()
+        for groupid in groupids:
+            hostids.update(self.group_hosts.get(groupid, ()))
+        return hostids
+
+    def group_label(self, hostid):
+        """Имена групп хоста через запятую"""
+        return ", ".join(self.group_names.get(g, g) for g in self.host_groups.get(hostid, ()))
+
+    def host_name(self, hostid):
+        return self.host_names.get(hostid, hostid)
@@ -0,0 +1,114 @@
+import argparse
+import json
+import socket
+import sys
+
+
+# Клиент zabbix_daemon.py. Только стандартная библиотека: короткий скрипт не
+# импортирует zabbix_utils, openpyxl и numpy и не читает кэши сам.
+#
+# Протокол: по Unix-сокету JSON-строки, по одной на запрос и ответ:
+#   -> {"method": "hosts.select", "params": {"tags": {"env": "prod"}}}
+#   <- {"result": [...]} или {"error": "..."}
+
+DEFAULT_SOCKET = "/tmp/zabbix/zabbix_daemon.sock"
+
+
+class DaemonError(Exception):
+    """Демон вернул ошибку на запрос"""
+
+
+class DaemonClient:
+    """
+    Пример:
+        with DaemonClient("/tmp/zabbix/zabbix_daemon.sock") as daemon:
+            hostids = daemon.call("hosts.select", tags={"env": "prod"}, groups=["15"])
+            problems = daemon.api("get_problem", hosts=hostids)
+
+    Args:
+        path: Путь к сокету демона
+        timeout: Таймаут подключения и ответа, секунды (запросы к API через демон
+                 выполняются столько же, сколько и напрямую)
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET, timeout=60):
+        self.path = str(path)
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+
+    def connect(self):
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            self._sock = sock
+            self._file = sock.makefile('rwb')
+        return self
+
+    def close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = self._file = None
+
+    def call(self, method, **params):
+        """
+        Вызов метода демона (см. ZabbixDaemon.METHODS).
+
+        Raises:
+            DaemonError: Демон вернул ошибку
+            OSError: Демон не запущен или соединение оборвалось
+        """
+        self.connect()
+        self._file.write(json.dumps({'method': method, 'params': params}).encode('utf-8') + b'\n')
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            self.close()
+            raise ConnectionError("Демон закрыл соединение")
+
+        response = json.loads(line)
+        if 'error' in response:
+            raise DaemonError(response['error'])
+        return response.get('result')
+
+    def api(self, name, **params):
+        """Метод API (get_problem, get_hosts_bulk, ...) через подключение демона"""
+        return self.call('api', name=name, params=params)
+
+    def available(self):
+        """Запущен ли демон"""
+        try:
+            return self.call('ping') == 'pong'
+        except (OSError, DaemonError):
+            return False
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *args):
+        self.close()
+
+# -------------------------------------------------------------------------------------------
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Запрос к zabbix_daemon.py")
+    parser.add_argument('method', help="Метод демона: ping, stats, hosts.select, events, api, ...")
+    parser.add_argument('params', nargs='?', default='{}', help="Параметры JSON-объектом")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET)
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    try:
+        with DaemonClient(args.socket, timeout=args.timeout) as daemon:
+            result = daemon.call(args.method, **json.loads(args.params))
+    except (OSError, DaemonError) as e:
+        print(f"Ошибка запроса к демону: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
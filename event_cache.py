@@ -1,39 +1,99 @@
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from pathlib import Path
+from zabbix_api import RateLimiter
+from cache_format import get_format
+from snapshot import FileLock
 
 class ZabbixEventCache:
-    def __init__(self, api, cache_dir, days_to_cache=30):
+    def __init__(self, api, cache_dir, days_to_cache=30, recovery_chunk_size=1000, page_size=1000,
+                 cache_format='json', store=None, profile='report'):
         self.api = api
         self.cache_dir = Path(cache_dir)
         self.days_to_cache = days_to_cache
+        # Сколько eventids запрашивать за один event.get при поиске восстановлений
+        self.recovery_chunk_size = recovery_chunk_size
+        # Размер страницы event.get при выгрузке проблем за день
+        self.page_size = page_size
+        # Формат дневных файлов: 'json' или 'columnar' (см. cache_format.py)
+        self.cache_format = get_format(cache_format)
+        # Необязательное индексированное хранилище (event_store.EventStore)
+        self.store = store
+        # Поля event.get (projection.EVENT_PROFILES): 'report' - ровно то, что сохраняется в кэш
+        self.profile = profile
         self.cache_dir.mkdir(parents=True, exist_ok=True)
 
-    def run(self):
+    def run(self, workers=1, max_rps=None):
+        """
+        Кэширует дни 1..days_to_cache назад.
+
+        Args:
+            workers: Сколько дней обрабатывать параллельно (1 - по очереди)
+            max_rps: Общий для всех потоков предел запросов в секунду к Zabbix API
+                     на время прогона (None - оставить как настроено в API)
+        """
+        days = []
         for day in range(1, self.days_to_cache + 1):
             day_start = self._get_day_start(day)
             day_end = day_start + 86400  # Добавляем 24 часа
+            days.append((day_start, day_end))
+
+        previous_limiter = self.api.rate_limiter
+        if max_rps:
+            self.api.rate_limiter = RateLimiter(max_rps)
+
+        self._progress = {'done': 0, 'total': len(days), 'lock': threading.Lock()}
+
+        try:
+            if workers <= 1:
+                for day_start, day_end in days:
+                    self._run_day(day_start, day_end)
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    futures = [pool.submit(self._run_day, day_start, day_end)
+                               for day_start, day_end in days]
+                    for future in as_completed(futures):
+                        future.result()
+        finally:
+            self.api.rate_limiter = previous_limiter
+
+    #Обрабатывает один день и печатает общий прогресс
+    def _run_day(self, day_start, day_end):
+        date_str = datetime.fromtimestamp(day_start).strftime('%Y-%m-%d')
+        try:
             self._process_day(day_start, day_end)
+        except Exception as e:
+            print(f"Ошибка при обработке {date_str}: {e}")
+
+        with self._progress['lock']:
+            self._progress['done'] += 1
+            print(f"Обработано дней: {self._progress['done']}/{self._progress['total']} ({date_str})")
 
     #Возвращает начало дня (unixtime) для days_ago дней назад
-    def _get_day_start(self, days_ago):
+    @staticmethod
+    def _get_day_start(days_ago):
         day_date = datetime.now() - timedelta(days=days_ago)
         return int(datetime(day_date.year, day_date.month, day_date.day).timestamp())
     
     #брабатывает один день проверяет кэш и при необходимости создает
     def _process_day(self, day_start, day_end):
         date_str = datetime.fromtimestamp(day_start).strftime('%Y-%m-%d')
-        cache_file = self.cache_dir / f"events-{date_str}.json"
+        cache_file = self._day_file(date_str)
 
-        #Если файл уже существует и валиден - пропускаем
+        #Если файл уже существует и валиден - пропускаем. Файл, который писал follow(),
+        #содержит только события, пришедшие во время слежения, - пересоздаем его
+        partial = self._partial_marker(date_str)
         if cache_file.exists():
-            try:
-                with open(cache_file) as f:
-                    json.load(f)
+            if partial.exists():
+                print(f"Кэш за {date_str} записан слежением и может быть неполным, пересоздаем")
+            elif self.cache_format.is_valid(cache_file):
                 print(f"Кэш за {date_str} уже существует")
                 return
-            except (json.JSONDecodeError, IOError):
+            else:
                 print(f"Кэш за {date_str} поврежден, пересоздаем")
 
         #Получаем события из API
@@ -43,68 +103,347 @@ class ZabbixEventCache:
             print(f"Нет событий за {date_str}")
             return
 
-        # Сохраняем в файл
-        with open(cache_file, 'w') as f:
-            json.dump(events, f, indent=2)
+        self._write_day(date_str, events)
+        partial.unlink(missing_ok=True)
         print(f"Создан кэш за {date_str}")
+
+        if self.store is not None:
+            self.store.upsert_events(events)
+
+    def _day_file(self, date_str):
+        return self.cache_dir / f"events-{date_str}{self.cache_format.suffix}"
+
+    #Метка "файл дня писал follow() и он неполный". С точки в начале имени, чтобы
+    #не попадать в выборки events-*
+    def _partial_marker(self, date_str):
+        return self.cache_dir / f".events-{date_str}.partial"
+
+    #Сохраняет во временный файл и атомарно подменяет, чтобы читатели не увидели недописанный кэш
+    def _write_day(self, date_str, events):
+        cache_file = self._day_file(date_str)
+        tmp_file = cache_file.with_name(f".{cache_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.cache_format.write(tmp_file, events)
+            os.replace(tmp_file, cache_file)
+        finally:
+            if tmp_file.exists():
+                tmp_file.unlink()
         
     #Получаем события из Zabbix API за указанный период
     def _get_zabbix_events(self, time_from, time_till):
         try:
-            # Получаем события о проблемах
-            problems = self.api.get_events(
+            # Получаем события о проблемах постранично
+            problems = self.api.iter_events(
                 time_from=time_from,
                 time_till=time_till,
                 value=1,  # Проблемы
-                min_severity=1
+                min_severity=1,
+                page_size=self.page_size,
+                profile=self.profile
             )
 
-            if not problems:
-                return None
-
+            #Восстановления ищем пачками по мере чтения проблем
             result = []
+            batch = []
             for problem in problems:
-                #Преобразуем строки в числа для времени
-                problem_clock = int(problem.get('clock', 0))
-                
-                event_data = {
-                    'problem': {
-                        'eventid': problem.get('eventid'),
-                        'name': problem.get('name'),
-                        'clock': problem_clock,
-                        'objectid': problem.get('objectid'),
-                        'severity': problem.get('severity'),
-                        'r_eventid': problem.get('r_eventid')
-                    }
+                batch.append(problem)
+                if len(batch) >= self.recovery_chunk_size:
+                    result.extend(self._build_events(batch))
+                    batch = []
+            result.extend(self._build_events(batch))
+
+            return result or None
+
+        except Exception as e:
+            #День без части проблем или восстановлений не записываем: следующий run() повторит его
+            print(f"Ошибка при получении событий: {str(e)}")
+            raise
+
+    #Собирает записи кэша для пачки проблем вместе с их восстановлениями.
+    #known - уже полученные восстановления {eventid: событие}, их повторно не запрашиваем
+    def _build_events(self, problems, known=None):
+        known = known or {}
+        recoveries = self._get_recovery_events(
+            [problem['r_eventid'] for problem in problems
+             if problem.get('r_eventid') and problem['r_eventid'] not in known])
+        recoveries.update(known)
+
+        result = []
+        for problem in problems:
+            #Преобразуем строки в числа для времени
+            problem_clock = int(problem.get('clock', 0))
+
+            event_data = {
+                'problem': {
+                    'eventid': problem.get('eventid'),
+                    'name': problem.get('name'),
+                    'clock': problem_clock,
+                    'objectid': problem.get('objectid'),
+                    'severity': problem.get('severity'),
+                    'r_eventid': problem.get('r_eventid'),
+                    'acknowledged': problem.get('acknowledged'),
+                    'hosts': [host['hostid'] for host in problem.get('hosts', []) if 'hostid' in host],
+                    'tags': [{'tag': tag['tag'], 'value': tag.get('value', '')}
+                             for tag in problem.get('tags', []) if 'tag' in tag]
                 }
+            }
 
-                #Если есть событие восстановления
-                if 'r_eventid' in problem and problem['r_eventid']:
-                    recovery = self._get_recovery_event(problem['r_eventid'])
-                    if recovery:
-                        recovery_clock = int(recovery.get('clock', 0))
-                        event_data['recovery'] = {
-                            'eventid': recovery.get('eventid'),
-                            'clock': recovery_clock
-                        }
-                        #Вычисляем продолжительность
-                        event_data['duration'] = recovery_clock - problem_clock
+            #Если есть событие восстановления
+            recovery = recoveries.get(problem.get('r_eventid'))
+            if recovery:
+                self._set_recovery(event_data, recovery)
 
-                result.append(event_data)
+            result.append(event_data)
 
-            return result
+        return result
 
-        except Exception as e:
-            print(f"Ошибка при получении событий: {str(e)}")
-            return None
-        
-    #Получает одно событие восстановления по ID
-    def _get_recovery_event(self, event_id):
+    @staticmethod
+    def _set_recovery(event_data, recovery):
+        recovery_clock = int(recovery.get('clock', 0))
+        event_data['problem']['r_eventid'] = recovery.get('eventid')
+        event_data['recovery'] = {
+            'eventid': recovery.get('eventid'),
+            'clock': recovery_clock
+        }
+        #Вычисляем продолжительность
+        event_data['duration'] = recovery_clock - int(event_data['problem'].get('clock') or 0)
+
+    #Получает события восстановления по списку ID, возвращает {eventid: событие}.
+    #Ошибка любой пачки пробрасывается: без нее проблемы остались бы "открытыми"
+    def _get_recovery_events(self, event_ids):
+        #'0' - проблема еще не закрыта
+        event_ids = list(dict.fromkeys(eid for eid in event_ids if eid and eid != '0'))
+        recoveries = {}
+
+        for i in range(0, len(event_ids), self.recovery_chunk_size):
+            chunk = event_ids[i:i + self.recovery_chunk_size]
+            #eventids задает точную выборку, фильтр по severity не нужен:
+            #у событий восстановления своя severity и он мог их отбросить
+            events = self.api.get_events(
+                eventids=chunk,
+                value=0,  #Восстановления
+                min_severity=None,
+                output=['eventid', 'clock'],
+                details=False,
+                strict=True
+            )
+            for event in events:
+                recoveries[event['eventid']] = event
+
+        return recoveries
+
+    # ------------------------------------------------------------------ слежение за событиями
+
+    def follow(self, interval=30, checkpoint_file=None, max_polls=None, recheck_every=20, max_rps=None):
+        """
+        Непрерывно дописывает новые проблемы в файл текущего дня (и в store) и
+        проставляет восстановления по мере их появления, так что отчет за сегодня
+        не ходит в API.
+
+        Опрос - один event.get по курсору eventid_from (проблемы и восстановления
+        вместе). Восстановление сопоставляется с открытыми проблемами того же
+        триггера и подтверждается по их r_eventid; раз в recheck_every опросов
+        перепроверяются все открытые проблемы (закрытые вручную и т.п.).
+        Курсор и открытые проблемы сохраняются в checkpoint_file после записи
+        файлов, поэтому после перезапуска слежение продолжается без пропусков.
+        Без checkpoint первый опрос читает события с начала текущего дня.
+        Файлы, которые создал follow, помечаются неполными (.events-<дата>.partial):
+        слежение могло остановиться до конца дня, и run() пересоздает такой день
+        из API, когда он закончится.
+
+        Args:
+            interval: Пауза между опросами, секунды
+            checkpoint_file: Файл курсора (по умолчанию cache_dir/follow.checkpoint.json)
+            max_polls: Остановиться после стольких опросов (None - до stop() или Ctrl+C)
+            recheck_every: Раз в сколько опросов перепроверять все открытые проблемы
+            max_rps: Предел запросов в секунду к Zabbix API на время слежения
+
+        Returns:
+            False, если слежение уже запущено другим процессом, иначе True
+        """
+        lock = FileLock(self.cache_dir / "follow.lock")
+        if not lock.acquire():
+            print(f"Слежение уже запущено (PID {lock.holder()}), блокировка {lock.path}")
+            return False
+
+        self._checkpoint_file = Path(checkpoint_file or self.cache_dir / "follow.checkpoint.json")
+        self._stop_event = threading.Event()
+        self._days = {}
+        state = self._load_checkpoint()
+
+        previous_limiter = self.api.rate_limiter
+        if max_rps:
+            self.api.rate_limiter = RateLimiter(max_rps)
+
+        polls = 0
         try:
-            recoveries = self.api.get_events(
-                eventids=[event_id],
-                value=0  #Восстановления
+            while not self._stop_event.is_set():
+                try:
+                    changed = self._poll(state, recheck=polls % recheck_every == 0)
+                    if changed:
+                        print(f"Новых проблем: {changed['new']}, восстановлений: {changed['recovered']}, "
+                              f"открыто: {len(state['open'])}")
+                except Exception as e:
+                    # Курсор не сдвинут - следующий опрос повторит те же события
+                    print(f"Ошибка при опросе событий: {e}")
+
+                polls += 1
+                if max_polls is not None and polls >= max_polls:
+                    break
+                self._stop_event.wait(interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.api.rate_limiter = previous_limiter
+            self._days = {}
+            lock.release()
+        return True
+
+    def stop(self):
+        """Останавливает follow() из другого потока"""
+        if getattr(self, '_stop_event', None) is not None:
+            self._stop_event.set()
+
+    def _load_checkpoint(self):
+        #Состояние: курсор eventid (None - читать по времени с clock) и открытые проблемы
+        #{eventid: [дата файла, objectid]}
+        try:
+            with open(self._checkpoint_file) as f:
+                state = json.load(f)
+            if 'eventid' in state and 'open' in state:
+                print(f"Слежение продолжается с eventid {state['eventid']}")
+                return state
+        except (ValueError, IOError):
+            pass
+
+        state = {'eventid': None, 'clock': self._get_day_start(0), 'open': {}}
+        #Проблемы, которые run() сохранил еще открытыми, тоже ждут восстановления
+        for day in range(self.days_to_cache, 0, -1):
+            date_str = datetime.fromtimestamp(self._get_day_start(day)).strftime('%Y-%m-%d')
+            for eventid, event in self._read_day(date_str).items():
+                if self._is_open(event):
+                    state['open'][eventid] = [date_str, event['problem'].get('objectid')]
+        return state
+
+    def _save_checkpoint(self, state):
+        tmp_file = self._checkpoint_file.with_name(f".{self._checkpoint_file.name}.{os.getpid()}.tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_file, self._checkpoint_file)
+
+    @staticmethod
+    def _is_open(event):
+        return not event.get('recovery') and event['problem'].get('r_eventid') in (None, '', '0')
+
+    def _read_day(self, date_str):
+        #{eventid: запись} из дневного файла, пустой словарь если файла нет
+        cache_file = self._day_file(date_str)
+        if not cache_file.exists():
+            return {}
+        try:
+            events = self.cache_format.read(cache_file)
+        except (ValueError, IOError) as e:
+            print(f"Кэш {cache_file} не читается ({e}), будет перезаписан")
+            return {}
+        return {str(event['problem']['eventid']): event for event in events}
+
+    def _day(self, date_str):
+        if date_str not in self._days:
+            self._days[date_str] = self._read_day(date_str)
+        return self._days[date_str]
+
+    def _poll(self, state, recheck=False):
+        now = int(time.time())
+        if state['eventid'] is None:
+            events = self.api.iter_events(state['clock'], now, value=None, min_severity=None,
+                                          page_size=self.page_size, profile=self.profile)
+        else:
+            events = self.api.iter_events_since(state['eventid'], value=None, min_severity=None,
+                                                page_size=self.page_size, profile=self.profile)
+
+        problems, recoveries = [], {}
+        cursor = state['eventid']
+        for event in events:
+            if str(event.get('value')) == '1':
+                if int(event.get('severity') or 0) >= 1:
+                    problems.append(event)
+            else:
+                recoveries[event['eventid']] = event
+            cursor = max(cursor or 0, int(event['eventid']) + 1)
+
+        touched = set()
+        changed = []
+        for event_data in self._build_events(problems, known=recoveries):
+            problem = event_data['problem']
+            date_str = datetime.fromtimestamp(problem['clock']).strftime('%Y-%m-%d')
+            self._day(date_str)[str(problem['eventid'])] = event_data
+            touched.add(date_str)
+            changed.append(event_data)
+            if self._is_open(event_data):
+                state['open'][str(problem['eventid'])] = [date_str, problem.get('objectid')]
+
+        # Открытые проблемы тех триггеров, по которым пришли восстановления
+        if recheck:
+            candidates = list(state['open'])
+        else:
+            objectids = {event.get('objectid') for event in recoveries.values()}
+            candidates = [eventid for eventid, (_, objectid) in state['open'].items() if objectid in objectids]
+        recovered = self._patch_recoveries(candidates, state, recoveries, touched, changed)
+
+        for date_str in sorted(touched):
+            events = sorted(self._day(date_str).values(),
+                            key=lambda e: (int(e['problem']['clock']), int(e['problem']['eventid'])))
+            #Полный файл от run() после правки восстановлений остается полным, а новый
+            #файл (текущий день) - нет: метка ставится до записи, run() пересоздаст его
+            if not self._day_file(date_str).exists():
+                self._partial_marker(date_str).touch()
+            self._write_day(date_str, events)
+        if self.store is not None and changed:
+            self.store.upsert_events(changed)
+
+        # В памяти остается только текущий день
+        today = datetime.fromtimestamp(now).strftime('%Y-%m-%d')
+        self._days = {date_str: events for date_str, events in self._days.items() if date_str == today}
+
+        state['eventid'] = cursor
+        state['clock'] = now
+        self._save_checkpoint(state)
+
+        new = len(changed) - recovered
+        return {'new': new, 'recovered': recovered} if new or recovered else None
+
+    def _patch_recoveries(self, candidates, state, known, touched, changed):
+        #Проставляет восстановления закрывшимся проблемам из candidates, возвращает их число
+        closed = {}
+        for i in range(0, len(candidates), self.recovery_chunk_size):
+            events = self.api.get_events(
+                eventids=candidates[i:i + self.recovery_chunk_size],
+                value=1,
+                min_severity=None,
+                output=['eventid', 'r_eventid'],
+                details=False,
+                strict=True
             )
-            return recoveries[0] if recoveries else None
-        except Exception:
-            return None
+            for event in events:
+                if event.get('r_eventid') not in (None, '', '0'):
+                    closed[event['eventid']] = event['r_eventid']
+        if not closed:
+            return 0
+
+        recoveries = dict(known)
+        recoveries.update(self._get_recovery_events([r for r in closed.values() if r not in known]))
+
+        count = 0
+        for eventid, r_eventid in closed.items():
+            recovery = recoveries.get(r_eventid)
+            if recovery is None:
+                continue
+            date_str = state['open'].pop(eventid)[0]
+            event_data = self._day(date_str).get(eventid)
+            if event_data is None:
+                continue
+            self._set_recovery(event_data, recovery)
+            touched.add(date_str)
+            changed.append(event_data)
+            count += 1
+        return count
@@ -0,0 +1,475 @@
+from array import array
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from cache_format import ColumnarEvents, format_for_path
+
+
+# Открытая проблема: нет восстановления
+NONE = -1
+
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+
+
+class EventFrame:
+    """
+    События кэша ZabbixEventCache в виде колонок NumPy.
+
+    Колонки событий (длина - число событий):
+        eventid, clock, severity, acknowledged,
+        recovery_clock, duration (-1 у открытых проблем)
+    Пары событие-хост (событие может относиться к нескольким хостам):
+        host_event - индекс события, host_id - hostid
+    """
+
+    EVENT_COLUMNS = (
+        ('eventid', 'q'),
+        ('clock', 'q'),
+        ('severity', 'b'),
+        ('acknowledged', 'b'),
+        ('recovery_clock', 'q'),
+        ('duration', 'q'),
+    )
+
+    def __init__(self, columns, host_event, host_id):
+        for name, _ in self.EVENT_COLUMNS:
+            setattr(self, name, columns[name])
+        self.host_event = host_event
+        self.host_id = host_id
+
+    def __len__(self):
+        return len(self.clock)
+
+    @property
+    def recovered(self):
+        return self.duration >= 0
+
+    @classmethod
+    def empty(cls):
+        return EventFrameBuilder().build()
+
+    @classmethod
+    def from_events(cls, events):
+        """Из итерируемого событий в формате кэша (dict)"""
+        builder = EventFrameBuilder()
+        for event in events:
+            builder.add(event)
+        return builder.build()
+
+    @classmethod
+    def from_columnar(cls, path):
+        """Из .evc файла: колонки копируются из mmap без разбора событий"""
+        with ColumnarEvents(path) as events:
+            if events.version < 2:
+                return cls.from_events(iter(events))
+            columns = events.columns
+            recovered = np.array(columns['recovery_eventid'], dtype=np.int64) != NONE
+            frame = {
+                'eventid': np.array(columns['eventid'], dtype=np.int64),
+                'clock': np.array(columns['clock'], dtype=np.int64),
+                'severity': np.maximum(np.array(columns['severity'], dtype=np.int8), 0),
+                'acknowledged': np.maximum(np.array(columns['acknowledged'], dtype=np.int8), 0),
+                'recovery_clock': np.where(recovered, np.array(columns['recovery_clock'], dtype=np.int64), NONE),
+                'duration': np.where(recovered, np.array(columns['duration'], dtype=np.int64), NONE),
+            }
+            offsets = np.array(events.lists['hosts'], dtype=np.int64)
+            host_event = np.repeat(np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets))
+            host_id = np.array(columns['host_id'], dtype=np.int64)
+        return cls(frame, host_event, host_id)
+
+    @classmethod
+    def from_cache_dir(cls, cache_dir, time_from=None, time_till=None):
+        """
+        Из дневных файлов events-YYYY-MM-DD.* за период (границы по clock проблемы).
+        Если за день есть файлы разных форматов, берется первый по имени, как в отчете.
+        """
+        frames = []
+        seen = set()
+        for path in sorted(Path(cache_dir).glob('events-*')):
+            date_str = path.name[len('events-'):].split('.')[0]
+            if path.name.startswith('.') or date_str in seen:
+                continue
+            if not _day_in_range(date_str, time_from, time_till):
+                continue
+            seen.add(date_str)
+            try:
+                if path.suffix == '.evc':
+                    frames.append(cls.from_columnar(path))
+                else:
+                    frames.append(cls.from_events(format_for_path(path).read(path)))
+            except (ValueError, IOError) as e:
+                print(f"Не удалось прочитать {path.name}: {e}")
+
+        frame = cls.concat(frames)
+        if time_from is not None or time_till is not None:
+            lo = -np.inf if time_from is None else time_from
+            hi = np.inf if time_till is None else time_till
+            frame = frame.select((frame.clock >= lo) & (frame.clock <= hi))
+        return frame
+
+    @classmethod
+    def concat(cls, frames):
+        if not frames:
+            return cls.empty()
+        columns = {name: np.concatenate([getattr(f, name) for f in frames]) for name, _ in cls.EVENT_COLUMNS}
+        starts = np.cumsum([0] + [len(f) for f in frames[:-1]])
+        host_event = np.concatenate([f.host_event + start for f, start in zip(frames, starts)])
+        host_id = np.concatenate([f.host_id for f in frames])
+        return cls(columns, host_event, host_id)
+
+    def select(self, mask=None, min_severity=None, hostids=None):
+        """
+        Подмножество событий: по булевой маске, минимальной severity и/или хостам
+        """
+        keep = np.ones(len(self), dtype=bool) if mask is None else np.asarray(mask, dtype=bool).copy()
+        if min_severity is not None:
+            keep &= self.severity >= min_severity
+        if hostids is not None:
+            wanted = np.isin(self.host_id, np.array([int(h) for h in hostids], dtype=np.int64))
+            with_host = np.zeros(len(self), dtype=bool)
+            with_host[self.host_event[wanted]] = True
+            keep &= with_host
+
+        index = np.flatnonzero(keep)
+        # Новые номера событий для пар событие-хост
+        remap = np.full(len(self), -1, dtype=np.int64)
+        remap[index] = np.arange(len(index))
+        pairs = keep[self.host_event]
+
+        columns = {name: getattr(self, name)[index] for name, _ in self.EVENT_COLUMNS}
+        return EventFrame(columns, remap[self.host_event[pairs]], self.host_id[pairs])
+
+
+class EventFrameBuilder:
+    """
+    Накопление событий по одному (например, параллельно с записью отчета)
+    в компактные array.array, build() отдает EventFrame.
+    """
+
+    def __init__(self):
+        self._columns = {name: array(code) for name, code in EventFrame.EVENT_COLUMNS}
+        self._host_event = array('q')
+        self._host_id = array('q')
+
+    def add(self, event):
+        problem = event.get('problem', {})
+        recovery = event.get('recovery')
+        index = len(self._columns['clock'])
+        columns = self._columns
+
+        columns['eventid'].append(int(problem.get('eventid') or 0))
+        columns['clock'].append(int(problem.get('clock') or 0))
+        columns['severity'].append(int(problem.get('severity') or 0))
+        columns['acknowledged'].append(1 if str(problem.get('acknowledged')) == '1' else 0)
+        if recovery:
+            columns['recovery_clock'].append(int(recovery['clock']))
+            columns['duration'].append(int(event.get('duration') or 0))
+        else:
+            columns['recovery_clock'].append(NONE)
+            columns['duration'].append(NONE)
+
+        for hostid in problem.get('hosts', []):
+            self._host_event.append(index)
+            self._host_id.append(int(hostid))
+
+    def build(self):
+        columns = {name: np.array(values, dtype=np.dtype(code)) for (name, code), values
+                   in zip(EventFrame.EVENT_COLUMNS, self._columns.values())}
+        return EventFrame(columns, np.array(self._host_event, dtype=np.int64), np.array(self._host_id, dtype=np.int64))
+
+# -------------------------------------------------------------------------------------------
+
+
+class EventStats:
+    """
+    Сводная статистика по событиям за период [time_from, time_till]:
+    число проблем, восстановленных и открытых, простой, MTTR и перцентили
+    длительности, SLA. Группировки по severity, хостам и группам хостов,
+    дневной ряд со скользящим окном. Все расчеты - векторные.
+
+    Простой (downtime) - сумма длительностей проблем в пределах периода,
+    открытые проблемы считаются до time_till. SLA хоста считается по
+    объединению интервалов его проблем, чтобы пересекающиеся проблемы
+    не учитывались дважды.
+
+    Args:
+        frame: EventFrame
+        time_from, time_till: Период (unixtime), по умолчанию - по событиям
+        hostgroups: {groupid: {'name': ..., 'hosts': [hostid, ...]}} для группировки по группам
+        percentiles: Какие перцентили длительности считать
+    """
+
+    def __init__(self, frame, time_from=None, time_till=None, hostgroups=None,
+                 percentiles=DEFAULT_PERCENTILES):
+        self.frame = frame
+        self.time_from = int(time_from if time_from is not None else (frame.clock.min() if len(frame) else 0))
+        self.time_till = int(time_till if time_till is not None else (frame.clock.max() if len(frame) else 0))
+        self.hostgroups = hostgroups or {}
+        self.percentiles = tuple(percentiles)
+
+        # Интервалы проблем, обрезанные по периоду
+        end = np.where(frame.recovered, frame.recovery_clock, self.time_till)
+        self.start = np.clip(frame.clock, self.time_from, self.time_till)
+        self.end = np.clip(end, self.time_from, self.time_till)
+
+    @classmethod
+    def from_structure_cache(cls, frame, cache, **kwargs):
+        """hostgroups берутся из кэша ZabbixCache (cache['host']['hostgroup'], cache['hg_available'])"""
+        names = cache.get('hg_available', {}).get('hash', {})
+        hostgroups = {
+            groupid: {'name': names.get(groupid, {}).get('name', groupid), 'hosts': list(group.get('host', {}))}
+            for groupid, group in cache.get('host', {}).get('hostgroup', {}).items()
+        }
+        return cls(frame, hostgroups=hostgroups, **kwargs)
+
+    # ------------------------------------------------------------------ группировки
+
+    def summary(self):
+        """Итоговая строка по всем событиям"""
+        rows = self._aggregate(np.zeros(len(self.frame), dtype=np.int64), np.arange(len(self.frame)), 1)
+        row = rows[0]
+        row['hosts'] = int(len(np.unique(self.frame.host_id)))
+        return row
+
+    def by_severity(self):
+        severities = np.unique(self.frame.severity)
+        group = np.searchsorted(severities, self.frame.severity)
+        rows = self._aggregate(group, np.arange(len(self.frame)), len(severities))
+        for row, severity in zip(rows, severities):
+            row['severity'] = int(severity)
+        return rows
+
+    def by_host(self, sort='downtime', limit=None):
+        frame = self.frame
+        hosts, group = np.unique(frame.host_id, return_inverse=True)
+        rows = self._aggregate(group, frame.host_event, len(hosts))
+
+        union = self._union_downtime(group, frame.host_event, len(hosts))
+        period = max(self.time_till - self.time_from, 1)
+        for row, hostid, down in zip(rows, hosts, union):
+            row['hostid'] = str(hostid)
+            row['sla'] = 100.0 * (1 - down / period)
+        return _sorted(rows, sort, limit)
+
+    def by_hostgroup(self, sort='downtime', limit=None):
+        if not self.hostgroups:
+            return []
+        frame = self.frame
+        groupids = list(self.hostgroups)
+
+        # Пары хост-группа из структуры, затем пары событие-группа без повторов
+        member_host = []
+        member_group = []
+        for index, groupid in enumerate(groupids):
+            hosts = [int(h) for h in self.hostgroups[groupid].get('hosts', [])]
+            member_host.extend(hosts)
+            member_group.extend([index] * len(hosts))
+        member_host = np.array(member_host, dtype=np.int64)
+        member_group = np.array(member_group, dtype=np.int64)
+
+        event_index, group = _join(frame.host_event, frame.host_id, member_host, member_group)
+        pair = np.unique(event_index * len(groupids) + group)
+        rows = self._aggregate(pair % len(groupids), pair // len(groupids), len(groupids))
+
+        # SLA группы: простой хостов группы (по объединению интервалов) на число хостов группы
+        hosts, host_group = np.unique(frame.host_id, return_inverse=True)
+        host_down = self._union_downtime(host_group, frame.host_event, len(hosts))
+        member_down = np.zeros(len(member_host))
+        known = np.isin(member_host, hosts)
+        member_down[known] = host_down[np.searchsorted(hosts, member_host[known])]
+        group_down = np.bincount(member_group, weights=member_down, minlength=len(groupids))
+        group_size = np.bincount(member_group, minlength=len(groupids))
+
+        period = max(self.time_till - self.time_from, 1)
+        for index, row in enumerate(rows):
+            groupid = groupids[index]
+            row['groupid'] = groupid
+            row['name'] = self.hostgroups[groupid].get('name', groupid)
+            row['hosts'] = int(group_size[index])
+            row['sla'] = 100.0 * (1 - group_down[index] / (period * group_size[index])) if group_size[index] else 100.0
+        return _sorted(rows, sort, limit)
+
+    def _aggregate(self, group, event_index, groups):
+        """
+        Статистика по группам: group[i] - номер группы для события event_index[i]
+        """
+        frame = self.frame
+        duration = frame.duration[event_index]
+        recovered = duration >= 0
+        downtime = (self.end - self.start)[event_index]
+
+        count = np.bincount(group, minlength=groups)
+        recovered_count = np.bincount(group[recovered], minlength=groups)
+        duration_sum = np.bincount(group[recovered], weights=duration[recovered], minlength=groups)
+        downtime_sum = np.bincount(group, weights=downtime, minlength=groups)
+        acknowledged = np.bincount(group, weights=frame.acknowledged[event_index], minlength=groups)
+        percentiles = _grouped_percentiles(group[recovered], duration[recovered], groups, self.percentiles)
+
+        rows = []
+        for i in range(groups):
+            row = {
+                'problems': int(count[i]),
+                'recovered': int(recovered_count[i]),
+                'open': int(count[i] - recovered_count[i]),
+                'acknowledged': int(acknowledged[i]),
+                'downtime': int(downtime_sum[i]),
+                'mttr': float(duration_sum[i] / recovered_count[i]) if recovered_count[i] else None,
+            }
+            for q, values in percentiles.items():
+                row[f'p{q}'] = None if np.isnan(values[i]) else float(values[i])
+            rows.append(row)
+        return rows
+
+    def _union_downtime(self, group, event_index, groups):
+        """Длина объединения интервалов проблем для каждой группы (хоста)"""
+        if not len(group):
+            return np.zeros(groups)
+        start = self.start[event_index] - self.time_from
+        end = self.end[event_index] - self.time_from
+
+        # Сдвиг групп друг от друга, чтобы накопленный максимум не переходил между группами
+        span = self.time_till - self.time_from + 1
+        order = np.lexsort((start, group))
+        offset = group[order] * span
+        start = start[order] + offset
+        end = end[order] + offset
+
+        covered = np.maximum.accumulate(end)
+        previous = np.concatenate(([-1], covered[:-1]))
+        added = np.clip(covered - np.maximum(previous, start), 0, None)
+        return np.bincount(group[order], weights=added, minlength=groups)
+
+    # ------------------------------------------------------------------ дневной ряд
+
+    def daily(self, window=7):
+        """
+        Дневной ряд за период: проблемы (по дню начала), восстановленные,
+        простой за сутки (проблемные секунды внутри суток), MTTR
+        и скользящие суммы/средние за window дней.
+
+        Returns:
+            Список строк {'day', 'problems', 'recovered', 'downtime', 'mttr',
+            'rolling_problems', 'rolling_downtime', 'rolling_mttr'}
+        """
+        start_day = datetime.fromtimestamp(self.time_from).replace(hour=0, minute=0, second=0, microsecond=0)
+        bounds = []
+        day = start_day
+        while int(day.timestamp()) <= self.time_till:
+            bounds.append(int(day.timestamp()))
+            day += timedelta(days=1)
+        bounds.append(int(day.timestamp()))
+        bounds = np.array(bounds, dtype=np.int64)
+        days = len(bounds) - 1
+
+        frame = self.frame
+        day_index = np.clip(np.searchsorted(bounds, frame.clock, side='right') - 1, 0, days - 1)
+        recovered = frame.recovered
+
+        problems = np.bincount(day_index, minlength=days)
+        recovered_count = np.bincount(day_index[recovered], minlength=days)
+        duration_sum = np.bincount(day_index[recovered], weights=frame.duration[recovered], minlength=days)
+
+        # Проблемные секунды до момента t: F(t) = sum(clip(t - start, 0, end - start));
+        # простой за сутки - разность F на границах суток
+        covered = _coverage(self.start, self.end, np.clip(bounds, self.time_from, self.time_till))
+        downtime = np.diff(covered)
+
+        kernel = np.ones(window)
+        rolling_problems = np.convolve(problems, kernel)[:days]
+        rolling_downtime = np.convolve(downtime, kernel)[:days]
+        rolling_recovered = np.convolve(recovered_count, kernel)[:days]
+        rolling_duration = np.convolve(duration_sum, kernel)[:days]
+
+        rows = []
+        for i in range(days):
+            rows.append({
+                'day': datetime.fromtimestamp(int(bounds[i])).strftime('%Y-%m-%d'),
+                'problems': int(problems[i]),
+                'recovered': int(recovered_count[i]),
+                'downtime': int(downtime[i]),
+                'mttr': float(duration_sum[i] / recovered_count[i]) if recovered_count[i] else None,
+                'rolling_problems': int(rolling_problems[i]),
+                'rolling_downtime': int(rolling_downtime[i]),
+                'rolling_mttr': float(rolling_duration[i] / rolling_recovered[i]) if rolling_recovered[i] else None,
+            })
+        return rows
+
+
+def _join(left_index, left_key, right_key, right_value):
+    """
+    Соединение пар (left_index, left_key) с (right_key, right_value) по ключу.
+    Ключ справа может повторяться.
+
+    Returns:
+        (left_index, right_value) для всех совпадений
+    """
+    order = np.argsort(right_key, kind='stable')
+    right_key = right_key[order]
+    right_value = right_value[order]
+
+    lo = np.searchsorted(right_key, left_key, side='left')
+    hi = np.searchsorted(right_key, left_key, side='right')
+    counts = hi - lo
+    left = np.repeat(left_index, counts)
+    # Позиции совпадений справа: lo каждой пары + 0..count-1
+    starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+    positions = starts + np.arange(counts.sum())
+    return left, right_value[positions]
+
+
+def _grouped_percentiles(group, values, groups, percentiles):
+    """
+    Перцентили values в каждой группе (линейная интерполяция, как np.percentile).
+    Для пустых групп - nan.
+    """
+    result = {q: np.full(groups, np.nan) for q in percentiles}
+    if not len(values):
+        return result
+
+    order = np.lexsort((values, group))
+    values = values[order].astype(np.float64)
+    counts = np.bincount(group, minlength=groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    present = counts > 0
+
+    for q in percentiles:
+        position = (counts[present] - 1) * (q / 100.0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        fraction = position - lower
+        base = starts[present]
+        low_values = values[base + lower]
+        result[q][present] = low_values + (values[base + upper] - low_values) * fraction
+    return result
+
+
+def _coverage(start, end, points):
+    """Сумма по интервалам clip(t - start, 0, end - start) для каждой точки t"""
+    start = np.sort(start)
+    end = np.sort(end)
+    start_sum = np.concatenate(([0], np.cumsum(start)))
+    end_sum = np.concatenate(([0], np.cumsum(end)))
+
+    started = np.searchsorted(start, points, side='right')
+    ended = np.searchsorted(end, points, side='right')
+    return (started * points - start_sum[started]) - (ended * points - end_sum[ended])
+
+
+def _sorted(rows, key, limit):
+    if key:
+        rows = sorted(rows, key=lambda row: (row.get(key) is None, -(row.get(key) or 0)))
+    return rows[:limit] if limit else rows
+
+
+def _day_in_range(date_str, time_from, time_till):
+    try:
+        day_start = int(datetime.strptime(date_str, '%Y-%m-%d').timestamp())
+    except ValueError:
+        return False
+    if time_from is not None and day_start + 86400 <= time_from:
+        return False
+    if time_till is not None and day_start > time_till:
+        return False
+    return True
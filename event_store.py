@@ -0,0 +1,278 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+from cache_format import format_for_path
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    eventid INTEGER PRIMARY KEY,
+    clock INTEGER NOT NULL,
+    name TEXT,
+    objectid INTEGER,
+    severity INTEGER,
+    acknowledged INTEGER,
+    r_eventid INTEGER,
+    recovery_eventid INTEGER,
+    recovery_clock INTEGER,
+    duration INTEGER
+);
+CREATE INDEX IF NOT EXISTS events_clock ON events (clock);
+CREATE INDEX IF NOT EXISTS events_severity_clock ON events (severity, clock);
+
+CREATE TABLE IF NOT EXISTS event_hosts (
+    eventid INTEGER NOT NULL,
+    hostid INTEGER NOT NULL,
+    PRIMARY KEY (eventid, hostid)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS event_hosts_hostid ON event_hosts (hostid, eventid);
+
+CREATE TABLE IF NOT EXISTS event_tags (
+    eventid INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (eventid, tag, value)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS event_tags_tag ON event_tags (tag, value, eventid);
+"""
+
+UPSERT_EVENT = """
+INSERT INTO events (eventid, clock, name, objectid, severity, acknowledged,
+                    r_eventid, recovery_eventid, recovery_clock, duration)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (eventid) DO UPDATE SET
+    clock = excluded.clock,
+    name = excluded.name,
+    objectid = excluded.objectid,
+    severity = excluded.severity,
+    acknowledged = excluded.acknowledged,
+    r_eventid = excluded.r_eventid,
+    recovery_eventid = excluded.recovery_eventid,
+    recovery_clock = excluded.recovery_clock,
+    duration = excluded.duration
+"""
+
+
+class EventStore:
+    """
+    Индексированное хранилище событий в SQLite.
+
+    ZabbixEventCache пишет сюда те же записи, что и в дневные файлы, отчет
+    читает их запросами с фильтрами по времени, хостам, severity и тегам.
+    Запись идет через upsert, поэтому повторная обработка дня ничего не дублирует.
+    Объект можно использовать из нескольких потоков.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def upsert_events(self, events):
+        """
+        Записывает события в формате кэша ZabbixEventCache.
+        Хосты и теги события заменяются целиком.
+
+        Returns:
+            Число записанных событий
+        """
+        rows = []
+        hosts = []
+        tags = []
+
+        for event in events:
+            problem = event.get('problem', {})
+            recovery = event.get('recovery') or {}
+            eventid = _to_int(problem.get('eventid'))
+            if eventid is None:
+                continue
+
+            rows.append((
+                eventid,
+                _to_int(problem.get('clock')) or 0,
+                problem.get('name'),
+                _to_int(problem.get('objectid')),
+                _to_int(problem.get('severity')),
+                _to_int(problem.get('acknowledged')),
+                _to_int(problem.get('r_eventid')),
+                _to_int(recovery.get('eventid')),
+                _to_int(recovery.get('clock')),
+                _to_int(event.get('duration')),
+            ))
+            hosts.extend((eventid, int(hostid)) for hostid in problem.get('hosts', []))
+            tags.extend((eventid, tag.get('tag'), tag.get('value', ''))
+                        for tag in problem.get('tags', []) if tag.get('tag') is not None)
+
+        with self._lock, self._conn:
+            self._conn.executemany(UPSERT_EVENT, rows)
+            eventids = json.dumps([row[0] for row in rows])
+            self._conn.execute(
+                "DELETE FROM event_hosts WHERE eventid IN (SELECT value FROM json_each(?))", (eventids,))
+            self._conn.execute(
+                "DELETE FROM event_tags WHERE eventid IN (SELECT value FROM json_each(?))", (eventids,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO event_hosts (eventid, hostid) VALUES (?, ?)", hosts)
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO event_tags (eventid, tag, value) VALUES (?, ?, ?)", tags)
+
+        return len(rows)
+
+    def import_cache_dir(self, cache_dir):
+        """
+        Загружает в хранилище уже существующие дневные файлы events-*.
+
+        Returns:
+            Число загруженных событий
+        """
+        total = 0
+        for path in sorted(Path(cache_dir).glob('events-*')):
+            if path.name.startswith('.'):
+                continue
+            try:
+                events = format_for_path(path).read(path)
+            except (ValueError, IOError) as e:
+                print(f"Не удалось прочитать {path.name}: {e}")
+                continue
+            total += self.upsert_events(events)
+        return total
+
+    def _where(self, time_from, time_till, hostids, severities, min_severity, tags):
+        where = []
+        args = []
+
+        if time_from is not None:
+            where.append("e.clock >= ?")
+            args.append(int(time_from))
+        if time_till is not None:
+            where.append("e.clock <= ?")
+            args.append(int(time_till))
+        if min_severity is not None:
+            where.append("e.severity >= ?")
+            args.append(int(min_severity))
+        if severities:
+            where.append("e.severity IN (SELECT value FROM json_each(?))")
+            args.append(json.dumps([int(s) for s in severities]))
+        if hostids is not None:
+            where.append("e.eventid IN (SELECT eventid FROM event_hosts "
+                         "WHERE hostid IN (SELECT value FROM json_each(?)))")
+            args.append(json.dumps([int(h) for h in hostids]))
+
+        # Теги объединяются по И: {'DP': 'x', 'env': None} - DP=x и любой env
+        for tag, value in (tags or {}).items():
+            if value is None:
+                where.append("e.eventid IN (SELECT eventid FROM event_tags WHERE tag = ?)")
+                args.append(tag)
+            else:
+                where.append("e.eventid IN (SELECT eventid FROM event_tags WHERE tag = ? AND value = ?)")
+                args.extend((tag, value))
+
+        return (" WHERE " + " AND ".join(where)) if where else "", args
+
+    def query(self, time_from=None, time_till=None, hostids=None, severities=None,
+              min_severity=None, tags=None, batch_size=1000):
+        """
+        Генератор событий в формате кэша ZabbixEventCache, по возрастанию clock.
+
+        Args:
+            time_from, time_till: Границы по clock проблемы (включительно)
+            hostids: Только события этих хостов
+            severities: Только эти severity
+            min_severity: Severity не ниже
+            tags: {tag: value}, value=None - любой value
+            batch_size: Сколько событий читать за раз
+        """
+        where, args = self._where(time_from, time_till, hostids, severities, min_severity, tags)
+        sql = ("SELECT e.eventid, e.clock, e.name, e.objectid, e.severity, e.acknowledged, "
+               "e.r_eventid, e.recovery_eventid, e.recovery_clock, e.duration "
+               "FROM events e" + where + " ORDER BY e.clock, e.eventid")
+
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute(sql, args)
+
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                children = self._load_children([row[0] for row in rows])
+
+            for row in rows:
+                yield _row_to_event(row, *children.get(row[0], ([], [])))
+
+    def count(self, time_from=None, time_till=None, hostids=None, severities=None,
+              min_severity=None, tags=None):
+        where, args = self._where(time_from, time_till, hostids, severities, min_severity, tags)
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM events e" + where, args).fetchone()[0]
+
+    def _load_children(self, eventids):
+        result = {eventid: ([], []) for eventid in eventids}
+        ids = json.dumps(eventids)
+
+        for eventid, hostid in self._conn.execute(
+                "SELECT eventid, hostid FROM event_hosts "
+                "WHERE eventid IN (SELECT value FROM json_each(?))", (ids,)):
+            result[eventid][0].append(str(hostid))
+
+        for eventid, tag, value in self._conn.execute(
+                "SELECT eventid, tag, value FROM event_tags "
+                "WHERE eventid IN (SELECT value FROM json_each(?))", (ids,)):
+            result[eventid][1].append({'tag': tag, 'value': value})
+
+        return result
+
+
+def _to_int(value):
+    if value is None or value == '':
+        return None
+    return int(value)
+
+
+def _to_id(value):
+    return None if value is None else str(value)
+
+
+def _row_to_event(row, hosts, tags):
+    (eventid, clock, name, objectid, severity, acknowledged,
+     r_eventid, recovery_eventid, recovery_clock, duration) = row
+
+    event = {
+        'problem': {
+            'eventid': str(eventid),
+            'name': name,
+            'clock': clock,
+            'objectid': _to_id(objectid),
+            'severity': _to_id(severity),
+            'r_eventid': _to_id(r_eventid),
+            'acknowledged': _to_id(acknowledged),
+            'hosts': hosts,
+            'tags': tags
+        }
+    }
+
+    if recovery_eventid is not None:
+        event['recovery'] = {
+            'eventid': str(recovery_eventid),
+            'clock': recovery_clock
+        }
+        event['duration'] = duration
+
+    return event
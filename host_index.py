@@ -0,0 +1,236 @@
+import numpy as np
+
+
+# Обратные индексы по кэшу структуры (make_cache.py): тег -> значение -> хосты,
+# макрос -> значение -> хосты, группа -> хосты. Хранятся в снимке кэша
+# (work['index']) как отсортированные списки int hostid, в памяти - как
+# отсортированные массивы int64, над которыми выполняются AND/OR/NOT.
+
+
+def build_host_index(work):
+    """
+    Строит индексы по снимку кэша. Ничего не запрашивает у API.
+
+    Returns:
+        {'tag': {tag: {value: [hostid, ...]}}, 'macro': {macro: {value: [hostid, ...]}},
+         'hostgroup': {groupid: [hostid, ...]}, 'all': [hostid, ...]}
+        hostid - int, списки отсортированы
+    """
+    tags = {}
+    macros = {}
+    hosts = work.get('host', {}).get('all', {})
+
+    for hostid, host in hosts.items():
+        hostid = int(hostid)
+        for tag, data in (host.get('tags') or {}).items():
+            tags.setdefault(tag, {}).setdefault(data.get('value', ''), []).append(hostid)
+        for macro, data in (host.get('macro') or {}).items():
+            macros.setdefault(macro, {}).setdefault(data.get('value', ''), []).append(hostid)
+
+    groups = {groupid: sorted(int(hostid) for hostid in group.get('host', {}))
+              for groupid, group in work.get('host', {}).get('hostgroup', {}).items()}
+
+    return {
+        'tag': {tag: {value: sorted(ids) for value, ids in values.items()} for tag, values in tags.items()},
+        'macro': {macro: {value: sorted(ids) for value, ids in values.items()} for macro, values in macros.items()},
+        'hostgroup': groups,
+        'all': sorted(int(hostid) for hostid in hosts)
+    }
+
+# -------------------------------------------------------------------------------------------
+# Операции над отсортированными массивами уникальных id. В отличие от np.intersect1d
+# и np.union1d, повторно не сортируют: пересечение и разность - бинарным поиском
+# меньшего массива в большем, объединение - слиянием двух отсортированных участков.
+
+
+def _member_mask(a, b):
+    #Для каждого элемента a: есть ли он в b
+    if not len(b):
+        return np.zeros(len(a), dtype=bool)
+    pos = np.searchsorted(b, a)
+    pos[pos == len(b)] = 0
+    return b[pos] == a
+
+
+def _intersect(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return a[_member_mask(a, b)]
+
+
+def _difference(a, b):
+    return a[~_member_mask(a, b)]
+
+
+def _union(*arrays):
+    arrays = [a for a in arrays if len(a)]
+    if len(arrays) <= 1:
+        return arrays[0] if arrays else np.empty(0, dtype=np.int64)
+    merged = np.concatenate(arrays)
+    # Timsort находит отсортированные участки и сливает их за линейное время
+    merged.sort(kind='stable')
+    keep = np.empty(len(merged), dtype=bool)
+    keep[0] = True
+    np.not_equal(merged[1:], merged[:-1], out=keep[1:])
+    return merged[keep]
+
+# -------------------------------------------------------------------------------------------
+
+
+class HostSet:
+    """
+    Множество хостов - отсортированный массив уникальных hostid (int64).
+    Операции: & (AND), | (OR), - (без), ~ (дополнение до всех хостов кэша).
+    """
+    __slots__ = ('array', '_universe')
+
+    def __init__(self, array, universe=None):
+        self.array = array
+        self._universe = universe
+
+    def _make(self, array):
+        return HostSet(array, self._universe)
+
+    def __and__(self, other):
+        return self._make(_intersect(self.array, other.array))
+
+    def __or__(self, other):
+        return self._make(_union(self.array, other.array))
+
+    def __sub__(self, other):
+        return self._make(_difference(self.array, other.array))
+
+    def __invert__(self):
+        if self._universe is None:
+            raise ValueError("Дополнение доступно только для множеств из HostIndex")
+        return self._make(_difference(self._universe, self.array))
+
+    def __len__(self):
+        return len(self.array)
+
+    def __iter__(self):
+        return iter(self.hostids())
+
+    def __contains__(self, hostid):
+        return bool(_member_mask(np.array([int(hostid)], dtype=np.int64), self.array)[0])
+
+    def __eq__(self, other):
+        return isinstance(other, HostSet) and np.array_equal(self.array, other.array)
+
+    def __repr__(self):
+        return f"HostSet({len(self)} hosts)"
+
+    def hostids(self):
+        """hostid строками, как ключи кэша"""
+        return [str(hostid) for hostid in self.array.tolist()]
+
+
+class HostIndex:
+    """
+    Запросы к обратным индексам кэша структуры без обращения к API.
+
+    Пример:
+        index = HostIndex.from_cache(cache)
+        hosts = index.tag('env', 'prod') & (index.macro('{$OWNER}') | index.group('15'))
+        hosts.hostids()
+
+        # То же через select: внутри каждого условия - AND, mode='or' объединяет условия
+        index.select(tags={'env': 'prod', 'service': None}, groups=['15'])
+
+    Args:
+        index: Словарь build_host_index (work['index'] снимка)
+    """
+
+    def __init__(self, index):
+        def array(ids):
+            return np.asarray(ids, dtype=np.int64)
+
+        self._all = array(index.get('all', []))
+        self._tags = {tag: {value: array(ids) for value, ids in values.items()}
+                      for tag, values in index.get('tag', {}).items()}
+        self._macros = {macro: {value: array(ids) for value, ids in values.items()}
+                        for macro, values in index.get('macro', {}).items()}
+        self._groups = {groupid: array(ids) for groupid, ids in index.get('hostgroup', {}).items()}
+        # Объединение по всем значениям тега/макроса считается при первом запросе
+        self._any_value = {}
+
+    @classmethod
+    def from_cache(cls, cache):
+        """Индекс из снимка кэша; если снимок старый и индекса в нем нет - строится на месте"""
+        return cls(cache.get('index') or build_host_index(cache))
+
+    def _set(self, array):
+        return HostSet(array, self._all)
+
+    def _values(self, kind, table, name, value):
+        values = table.get(name)
+        if not values:
+            return self._set(self._all[:0])
+        if value is not None:
+            return self._set(values.get(value, self._all[:0]))
+        key = (kind, name)
+        if key not in self._any_value:
+            self._any_value[key] = _union(*values.values())
+        return self._set(self._any_value[key])
+
+    def all(self):
+        return self._set(self._all)
+
+    def tag(self, tag, value=None):
+        """Хосты с тегом tag (value=None - с любым значением)"""
+        return self._values('tag', self._tags, tag, value)
+
+    def macro(self, macro, value=None):
+        """Хосты, где задан макрос (value=None - с любым значением)"""
+        return self._values('macro', self._macros, macro, value)
+
+    def group(self, groupid):
+        return self._set(self._groups.get(str(groupid), self._all[:0]))
+
+    def tag_values(self, tag):
+        """{значение: число хостов}"""
+        return {value: len(ids) for value, ids in self._tags.get(tag, {}).items()}
+
+    def macro_values(self, macro):
+        return {value: len(ids) for value, ids in self._macros.get(macro, {}).items()}
+
+    def all_of(self, *sets):
+        """AND нескольких множеств, начиная с самого маленького"""
+        if not sets:
+            return self.all()
+        sets = sorted(sets, key=len)
+        result = sets[0]
+        for other in sets[1:]:
+            if not len(result):
+                break
+            result = result & other
+        return result
+
+    def any_of(self, *sets):
+        """OR нескольких множеств"""
+        if not sets:
+            return self._set(self._all[:0])
+        return self._set(_union(*(s.array for s in sets)))
+
+    def select(self, tags=None, macros=None, groups=None, mode='and'):
+        """
+        Args:
+            tags: {tag: value или None} - теги (None - любое значение)
+            macros: {macro: value или None} или список макросов
+            groups: Список groupid
+            mode: 'and' - все условия, 'or' - любое
+
+        Returns:
+            HostSet
+        """
+        if isinstance(macros, (list, tuple, set)):
+            macros = dict.fromkeys(macros)
+        conditions = [self.tag(tag, value) for tag, value in (tags or {}).items()]
+        conditions += [self.macro(macro, value) for macro, value in (macros or {}).items()]
+        conditions += [self.group(groupid) for groupid in groups or ()]
+
+        if mode == 'or':
+            return self.any_of(*conditions)
+        if mode != 'and':
+            raise ValueError(f"Неизвестный режим: {mode}")
+        return self.all_of(*conditions)
@@ -0,0 +1,191 @@
+import copy
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import records
+
+
+# TTL по умолчанию (секунды) для методов API, которые можно кэшировать
+DEFAULT_TTL = {
+    'get_template_id_by_name': 3600,
+    'get_hosts_by_template_id': 300,
+    'get_hostgroup_id': 600,
+    'get_hostgroup_list_v64': 300,
+    'get_hostgroup_hosts_v64': 300,
+    'get_host_group_map': 300,
+    'get_usergroup': 300,
+}
+
+
+class LookupCache:
+    """
+    Кэш результатов методов API: TTL на метод, LRU с ограничением размера,
+    счетчики попаданий/промахов. Потокобезопасный.
+
+    Ошибки запросов не кэшируются: методы API сообщают о них декоратору
+    _memoized (zabbix_api.py), и он не вызывает set(). Пустой, но успешный
+    результат (шаблон не найден) кэшируется как обычный.
+
+    Ключ включает область (scope) - URL сервера и пользователя: объекты API
+    разных серверов и учетных записей с общим backend не видят результаты
+    друг друга.
+
+    Args:
+        ttl: {имя метода: секунды}, дополняет DEFAULT_TTL. 0 - не кэшировать метод
+        maxsize: Максимум записей в памяти
+        backend: Общее хранилище на диске (SqliteCacheBackend) или None
+    """
+
+    def __init__(self, ttl=None, maxsize=1024, backend=None):
+        self.ttl = dict(DEFAULT_TTL)
+        self.ttl.update(ttl or {})
+        self.maxsize = maxsize
+        self.backend = backend
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @staticmethod
+    def make_key(method, args, kwargs, scope=None):
+        """
+        Args:
+            scope: Чей это результат, например (url, user); по нему ключи разных
+                   серверов и пользователей не совпадают
+        """
+        return json.dumps([method, scope, args, kwargs], sort_keys=True, default=str)
+
+    def enabled(self, method):
+        return self.ttl.get(method, 0) > 0
+
+    def get(self, method, key):
+        """
+        Returns:
+            (True, значение) при попадании, (False, None) при промахе
+        """
+        now = time.time()
+
+        with self._lock:
+            stats = self._stats.setdefault(method, {'hits': 0, 'misses': 0})
+            item = self._data.get(key)
+            if item is not None:
+                expires, value = item
+                if expires > now:
+                    self._data.move_to_end(key)
+                    stats['hits'] += 1
+                    return True, copy.deepcopy(value)
+                del self._data[key]
+
+        if self.backend is not None:
+            item = self.backend.get(key, now)
+            if item is not None:
+                expires, value = item
+                with self._lock:
+                    self._store(key, expires, value)
+                    stats['hits'] += 1
+                return True, copy.deepcopy(value)
+
+        with self._lock:
+            stats['misses'] += 1
+        return False, None
+
+    def set(self, method, key, value):
+        expires = time.time() + self.ttl.get(method, 0)
+        value = copy.deepcopy(value)
+
+        with self._lock:
+            self._store(key, expires, value)
+        if self.backend is not None:
+            self.backend.set(key, method, expires, value)
+
+    def _store(self, key, expires, value):
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, method=None):
+        """Сбрасывает кэш одного метода или весь"""
+        with self._lock:
+            if method is None:
+                self._data.clear()
+            else:
+                prefix = json.dumps([method])[:-1] + ","
+                for key in [key for key in self._data if key.startswith(prefix)]:
+                    del self._data[key]
+        if self.backend is not None:
+            self.backend.invalidate(method)
+
+    def stats(self):
+        with self._lock:
+            result = {method: dict(stats) for method, stats in self._stats.items()}
+            for stats in result.values():
+                total = stats['hits'] + stats['misses']
+                stats['hit_rate'] = round(stats['hits'] / total, 3) if total else 0.0
+            return {'size': len(self._data), 'maxsize': self.maxsize, 'methods': result}
+
+# -------------------------------------------------------------------------------------------
+
+
+class SqliteCacheBackend:
+    """
+    Общее хранилище кэша на диске (SQLite): процессы с одним файлом видят
+    результаты друг друга. Значения хранятся в JSON, typed-записи (records.Map)
+    на диск не попадают.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS lookup_cache ("
+            "key TEXT PRIMARY KEY, method TEXT NOT NULL, expires REAL NOT NULL, value TEXT NOT NULL)")
+        self._conn.commit()
+
+    def get(self, key, now):
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT expires, value FROM lookup_cache WHERE key = ? AND expires > ?",
+                    (key, now)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Ошибка чтения кэша {self.path}: {e}")
+            return None
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def set(self, key, method, expires, value):
+        # typed-записи (records.py) из JSON вернулись бы обычными dict - храним их только в памяти
+        if isinstance(value, records.Map):
+            return
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO lookup_cache (key, method, expires, value) VALUES (?, ?, ?, ?)",
+                    (key, method, expires, json.dumps(value)))
+                self._conn.execute("DELETE FROM lookup_cache WHERE expires <= ?", (time.time(),))
+        except (TypeError, ValueError):
+            # Значение не сериализуется в JSON - хранится только в памяти
+            pass
+        except sqlite3.Error as e:
+            print(f"Ошибка записи кэша {self.path}: {e}")
+
+    def invalidate(self, method=None):
+        with self._lock, self._conn:
+            if method is None:
+                self._conn.execute("DELETE FROM lookup_cache")
+            else:
+                self._conn.execute("DELETE FROM lookup_cache WHERE method = ?", (method,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,63 +1,83 @@
 from zabbix_api import API
+from snapshot import FileLock, SnapshotStore
+from host_index import HostIndex, build_host_index
 from pathlib import Path
-import os
+import hashlib
 import json
 import time
 
 
+# Типы ресурсов журнала аудита Zabbix
+AUDIT_HOST = 4
+AUDIT_HOSTGROUP = 14
+
+
 class ZabbixCache:
     def __init__(self, api, cache_dir="/Users/whoami?/Documents/_zabbix/cache_structure", 
-                 pid_dir="/Users/whoami?/Documents/_zabbix/pid"):
+                 pid_dir="/Users/whoami?/Documents/_zabbix/pid", chunk_size=500, with_macros=False,
+                 keep_snapshots=5, profile='report', host_map='host', fingerprint_every=24):
 
         self.api = api
+        # Сколько хостов запрашивать в одном host.get
+        self.chunk_size = chunk_size
+        # Добавлять ли в кэш макросы хостов
+        self.with_macros = with_macros
+        # Поля хостов в hostgroup.get (projection.HOSTGROUP_PROFILES): 'report' - ровно то, что хранит кэш
+        self.profile = profile
+        # Откуда брать состав групп: 'host' - один host.get (API.get_host_group_map),
+        # 'hostgroup' - hostgroup.get с хостами внутри каждой группы (get_hostgroup_hosts_v64)
+        if host_map not in ('host', 'hostgroup'):
+            raise ValueError(f"Неизвестный host_map: {host_map}")
+        self.host_map = host_map
+        # Каждое fingerprint_every-е инкрементальное обновление сверяет все хосты,
+        # даже если аудит доступен (0 - только когда аудит недоступен или не ведется)
+        self.fingerprint_every = fingerprint_every
         self.cache_dir = Path(cache_dir)
         self.pid_dir = Path(pid_dir)
-        self.cache_file = self.cache_dir / "zabbix_local.cache"
-        self.pid_file = self.pid_dir / "cron_make_cache.pid"
+        # Версионные снимки в cache_dir/snapshots, zabbix_local.cache - ссылка на последний
+        self.snapshots = SnapshotStore(self.cache_dir, "zabbix_local", ".cache", keep=keep_snapshots)
+        self.cache_file = self.snapshots.link
+        # Журнал изменений инкрементальных обновлений (JSON-строка на запуск)
+        self.changes_file = self.cache_dir / "zabbix_local.changes.log"
+        # Снимается ядром при завершении процесса, упавший запуск не блокирует следующие
+        self.lock = FileLock(self.pid_dir / "cron_make_cache.lock")
         
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         self.pid_dir.mkdir(parents=True, exist_ok=True)
         
-    def _check_proc(self):
-        if self.pid_file.exists():
-            print(f"Процесс уже запущен, файл {self.pid_file} уже существует")
-            return True
-        return False
-    
-    def _create_pid(self):
-        with open(self.pid_file, 'w') as f:
-            f.write(str(os.getpid()))
-            
-    def _remove_pid(self):
-        if self.pid_file.exists():
-            self.pid_file.unlink()
-            
-    def make_cache(self):
-        if self._check_proc():
+    def make_cache(self, incremental=False):
+        """
+        Args:
+            incremental: Обновить предыдущий снимок вместо полной пересборки.
+                         Если снимка нет или он старого формата - полная сборка.
+                         Изменения, не попавшие в журнал аудита, находятся
+                         только сверкой всех хостов (см. _build_incremental).
+        """
+        if not self.lock.acquire():
+            print(f"Процесс уже запущен (PID {self.lock.holder()}), блокировка {self.lock.path}")
             return False
         
         try:
-            self._create_pid()
             start_time = time.time()
             
-            work = {
-                'users': {},
-                'hg_available': {},
-                'host': {}
-            }
-            
             try:
-                work['users'] = self.api.get_usergroup()
-                work['hg_available'] = self.api.get_hostgroup_list_v64()
-                work['host'] = self.api.get_hostgroup_hosts_v64(groups=work['hg_available'])
+                # Кэш справочных методов API (если включен) не должен подмешивать старые данные
+                self.api.invalidate_cache()
+                previous = self._load_previous() if incremental else None
                 
-                if 'array' in work['host']:
-                    for hostid in work['host']['all'].keys():
-                        tags = self.api.get_host_tags([hostid])
-                        if tags and 'host' in tags and hostid in tags['host']:
-                            work['host']['all'][hostid]['tags'] = tags['host'][hostid]('tags', {})
+                if previous is None:
+                    work = self._build_full()
+                else:
+                    work, changes = self._build_incremental(previous)
+                    with open(self.changes_file, 'a') as f:
+                        f.write(json.dumps(changes) + "\n")
+                    print(f"Изменения: {self._summary(changes)}")
                              
-                with open(self.cache_file, 'w') as f:
+                # Обратные индексы тег/макрос/группа -> хосты, строятся заново по итоговому снимку
+                work['index'] = build_host_index(work)
+                
+                # Читатели видят прежний снимок, пока новый не записан целиком
+                with self.snapshots.writer() as f:
                     json.dump(work, f, indent=2)
                     
                 exec_time = time.time() - start_time
@@ -69,12 +89,213 @@ class ZabbixCache:
                 return False
             
         finally:
-            self._remove_pid()
-            print("PID-файл удален")
+            self.lock.release()
 
-           
- 
-            
+    def load_index(self):
+        """
+        HostIndex по последнему снимку (см. host_index.py) или None, если снимка нет.
+
+        Пример:
+            index = cache.load_index()
+            index.select(tags={'env': 'prod'}, macros=['{$OWNER}']).hostids()
+        """
+        try:
+            work = self.snapshots.load_json()
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Кэш не читается: {e}")
+            return None
+        return HostIndex.from_cache(work) if work is not None else None
+
+    def _build_full(self):
+        work = {
+            'users': {},
+            'hg_available': {},
+            'host': {}
+        }
+        # Время начала сборки - от него считается следующее инкрементальное обновление
+        work['meta'] = {'clock': int(time.time())}
+        
+        work['users'] = self.api.get_usergroup()
+        # Методы API при ошибке возвращают пустые значения - пустой снимок публиковать нельзя
+        if not work['users']:
+            raise ConnectionError("не удалось получить группы пользователей")
+        work['hg_available'] = self.api.get_hostgroup_list_v64()
+        if 'hash' not in work['hg_available'] or 'array' not in work['hg_available']:
+            raise ConnectionError("не удалось получить список групп")
+        if self.host_map == 'host':
+            work['host'] = self.api.get_host_group_map(groups=work['hg_available']['array'], profile=self.profile)
+            # Группы хоста и так попадут в host['groups'] из get_hosts_bulk и обновляются инкрементально
+            work['host'].pop('host_groups', None)
+        else:
+            work['host'] = self.api.get_hostgroup_hosts_v64(groups=work['hg_available']['array'], profile=self.profile)
+        if work['hg_available']['array'] and not work['host']['all']:
+            raise ConnectionError("не удалось получить хосты групп")
+        
+        # Теги, группы и макросы всех хостов пачками по chunk_size
+        details = self.api.get_hosts_bulk(
+            list(work['host']['all'].keys()),
+            chunk_size=self.chunk_size,
+            macros=self.with_macros,
+            strict=True
+        )
+        for hostid, host in work['host']['all'].items():
+            if hostid in details:
+                host.update(details[hostid])
+        
+        return work
+
+    def _load_previous(self):
+        #Предыдущий снимок, если по нему можно сделать инкрементальное обновление
+        try:
+            work = self.snapshots.load_json()
+            if work is None:
+                return None
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Предыдущий кэш не читается ({e}), полная сборка")
+            return None
+        
+        if 'clock' not in work.get('meta', {}) or not all(
+                'groups' in host for host in work.get('host', {}).get('all', {}).values()):
+            print("Предыдущий кэш старого формата, полная сборка")
+            return None
+        if bool(self.with_macros) != all(
+                'macro' in host for host in work['host']['all'].values()):
+            print("Настройка with_macros изменилась, полная сборка")
+            return None
+        return work
+
+    def _build_incremental(self, work):
+        """
+        Обновляет предыдущий снимок на месте.
+
+        Добавленные и удаленные хосты и группы определяются по наборам id.
+        Кандидаты на изменение берутся из журнала аудита с момента прошлого
+        снимка; пустой аудит за период при работающем журнале (API.has_audit_log)
+        значит, что изменений не было. Все хосты становятся кандидатами (режим
+        fingerprint, узкий запрос без selectHosts="extend"), если аудит недоступен
+        или не ведется, и на каждом fingerprint_every-м обновлении подряд:
+        изменения, которые аудит не записывает (шаблоны, LLD, прямые правки
+        в базе), иначе не попали бы в кэш до полной пересборки. Измененными
+        считаются кандидаты, у которых отличается хэш содержимого записи.
+
+        Returns:
+            (work, changes) - обновленный снимок и журнал изменений
+        """
+        now = int(time.time())
+        since = work['meta']['clock']
+        hosts = work['host']['all']
+        hostgroups = work['host']['hostgroup']
+        
+        # Пользователи и список групп небольшие - берем целиком
+        users = self.api.get_usergroup()
+        if users:
+            work['users'] = users
+        elif work.get('users'):
+            # Пустой ответ - ошибка запроса: оставляем пользователей из прошлого снимка
+            print("Группы пользователей не получены, оставлены из предыдущего снимка")
+        else:
+            raise ConnectionError("не удалось получить группы пользователей")
+        
+        groups = self.api.get_hostgroup_list_v64()
+        if 'hash' not in groups:
+            raise ConnectionError("не удалось получить список групп")
+        old_groups = work['hg_available'].get('hash', {})
+        group_changes = {
+            'added': sorted(set(groups['hash']) - set(old_groups)),
+            'removed': sorted(set(old_groups) - set(groups['hash'])),
+            'modified': sorted(groupid for groupid in set(groups['hash']) & set(old_groups)
+                               if groups['hash'][groupid] != old_groups[groupid])
+        }
+        work['hg_available'] = groups
+        
+        host_ids = self.api.get_host_ids()
+        if host_ids is None:
+            raise ConnectionError("не удалось получить список хостов")
+        current = set(host_ids)
+        added = current - set(hosts)
+        removed = set(hosts) - current
+        
+        # Запас в минуту на расхождение часов с сервером
+        audit = self.api.get_audit_resources(since - 60, [AUDIT_HOST, AUDIT_HOSTGROUP])
+        if audit is not None and not any(audit.values()) and not self.api.has_audit_log():
+            # Пустой журнал целиком - аудит отключен, изменения по нему не найти
+            audit = None
+        audit_runs = work['meta'].get('audit_runs', 0)
+        if audit is None or (self.fingerprint_every and audit_runs + 1 >= self.fingerprint_every):
+            mode = 'fingerprint'
+            candidates = current - added
+            audit_runs = 0
+        else:
+            audit_runs += 1
+            mode = 'audit'
+            candidates = set(audit[AUDIT_HOST])
+            # Изменение группы (например, удаление) меняет состав групп ее хостов
+            for groupid in audit[AUDIT_HOSTGROUP] | set(group_changes['removed']):
+                candidates.update(hostgroups.get(groupid, {}).get('host', {}))
+            candidates = (candidates & current) - added
+        
+        fetched = self.api.get_hosts_bulk(
+            sorted(added | candidates),
+            chunk_size=self.chunk_size,
+            macros=self.with_macros,
+            fields=True,
+            strict=True
+        ) if added or candidates else {}
         
+        # Сравниваем только общие поля: снимок мог быть собран с другим профилем (minimal, full)
+        modified = {hostid for hostid in candidates
+                    if hostid in fetched and _differs(fetched[hostid], hosts[hostid])}
+        added &= set(fetched)
         
+        # Патчим снимок: удаляем хосты из всех их групп, затем кладем новые версии
+        for hostid in removed | modified:
+            for groupid in hosts[hostid].get('groups', []):
+                hostgroups.get(groupid, {}).get('host', {}).pop(hostid, None)
+            if hostid in removed:
+                del hosts[hostid]
         
+        for hostid in added | modified:
+            # Поля профиля, которых нет в ответе get_hosts_bulk, сохраняются
+            hosts[hostid] = dict(hosts.get(hostid, {}), **fetched[hostid])
+            for groupid in fetched[hostid]['groups']:
+                hostgroups.setdefault(groupid, {'host': {}})['host'][hostid] = {
+                    'host': fetched[hostid]['host']
+                }
+        
+        for groupid in list(hostgroups):
+            if not hostgroups[groupid]['host'] or groupid in group_changes['removed']:
+                del hostgroups[groupid]
+        
+        work['meta'] = {'clock': now, 'audit_runs': audit_runs}
+        
+        changes = {
+            'clock': now,
+            'since': since,
+            'mode': mode,
+            'host': {
+                'added': sorted(added),
+                'removed': sorted(removed),
+                'modified': sorted(modified)
+            },
+            'hostgroup': group_changes
+        }
+        return work, changes
+
+    @staticmethod
+    def _summary(changes):
+        return ", ".join(
+            f"{kind} +{len(diff['added'])} -{len(diff['removed'])} ~{len(diff['modified'])}"
+            for kind, diff in (('hosts', changes['host']), ('hostgroups', changes['hostgroup']))
+        ) + f" ({changes['mode']})"
+
+
+def _content_hash(record, keys):
+    #Хэш полей keys записи хоста, не зависящий от порядка ключей
+    projected = {key: record.get(key) for key in keys}
+    return hashlib.sha1(json.dumps(projected, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _differs(fetched, stored):
+    #Изменился ли хост по полям, которые есть и в ответе get_hosts_bulk, и в снимке
+    keys = fetched.keys() & stored.keys()
+    return _content_hash(fetched, keys) != _content_hash(stored, keys)
@@ -1,15 +1,59 @@
 from pathlib import Path
-import json
 import time
 from datetime import datetime, timedelta
 import sys
 import os
+import csv
 from openpyxl import Workbook
-from openpyxl.styles import Font, Border, Side, PatternFill, Alignment
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Border, Side, PatternFill, Alignment, NamedStyle
 from openpyxl.utils import get_column_letter
 from openpyxl.comments import Comment
 from configparser import ConfigParser
 from zabbix_api import API
+from event_store import EventStore
+from event_stats import EventFrameBuilder, EventStats
+from snapshot import FileLock, SnapshotStore
+from cache_loader import CacheLoader, StructureIndex, prune_parsed
+
+
+#Заголовки 
+REPORT_HEADERS = [
+    "Time", "Severity", "Recovery Time", "Status", "HostGroup",
+    "Host", "Problem", "Ack", "Duration", "Tags DP", "Tags 2"
+]
+
+# Ширина столбцов
+REPORT_COLUMN_WIDTHS = [16, 15, 16, 13, 44, 37, 62, 5, 10, 11, 70]
+
+# Ширина столбцов листа Summary
+SUMMARY_COLUMN_WIDTHS = [37, 44, 12, 10, 10, 10, 14, 14, 14, 14, 14, 14, 14]
+
+# Формат отчета -> разделитель (None - xlsx)
+REPORT_FORMATS = {'xlsx': None, 'csv': ',', 'tsv': '\t'}
+
+TIME_FORMAT = '%Y-%m-%d %H:%M'
+
+SEVERITY_NAMES = {
+    0: "Not classified",
+    1: "Information",
+    2: "Warning",
+    3: "Average",
+    4: "High",
+    5: "Disaster"
+}
+
+SEVERITY_LEVELS = {name: severity for severity, name in SEVERITY_NAMES.items()}
+
+#Цвета для severity
+SEVERITY_COLORS = {0: "FFFFFF", 1: "ADD8E6", 2: "FFFF00", 3: "FFA500", 4: "FF0000", 5: "FF00FF"}
+
+#Цвета для статуса
+STATUS_COLORS = {'PROBLEM': "FF0000", 'RESOLVED': "00FF00"}
+
+# Сколько хостов помнит кэш колонок HostGroup/Host (старые вытесняются)
+HOST_INFO_CACHE_SIZE = 4096
+
 
 class ZabbixEventReport:
     def __init__(self, api, config_path):
@@ -23,47 +67,69 @@ class ZabbixEventReport:
         self.report_dir = Path(self.config.get('paths', 'folder_report', fallback='/tmp/zabbix/report'))
         
         self.report_event_day = self.config.getint('settings', 'report_event_day', fallback=14)
+        # xlsx, csv или tsv
+        self.report_format = self.config.get('settings', 'report_format', fallback='xlsx')
+        # Лист Summary (xlsx): SLA, MTTR, перцентили по severity/группам/хостам и дневной ряд
+        self.summary_sheet = self.config.getboolean('settings', 'summary_sheet', fallback=False)
+        self.summary_window = self.config.getint('settings', 'summary_window', fallback=7)
+        self.summary_top_hosts = self.config.getint('settings', 'summary_top_hosts', fallback=50)
+        # Процессов для разбора кэша структуры и дневных файлов; разобранная форма в .parsed/
+        self.loader_workers = self.config.getint('settings', 'loader_workers', fallback=min(4, os.cpu_count() or 1))
+        self.parsed_cache = self.config.getboolean('settings', 'parsed_cache', fallback=True)
         self.mail_server = self.config.get('mail', 'server', fallback='localhost')
         self.mail_from = self.config.get('mail', 'from', fallback='zabbix@example.com')
         
+        # Фильтры отчета: группы (groupid через запятую), минимальная severity, теги tag=value
+        self.filter_hostgroups = [g.strip() for g in self.config.get('filter', 'hostgroups', fallback='').split(',') if g.strip()]
+        self.filter_min_severity = self.config.getint('filter', 'min_severity', fallback=None)
+        self.filter_tags = self._parse_tags(self.config.get('filter', 'tags', fallback=''))
+        
+        # Необязательное SQLite-хранилище событий (см. event_store.py)
+        event_db = self.config.get('paths', 'event_db', fallback=None)
+        self.store = EventStore(event_db) if event_db else None
+        
         
         self.pid_dir.mkdir(parents=True, exist_ok=True)
         self.report_dir.mkdir(parents=True, exist_ok=True)
         
-        self.pid_file = self.pid_dir / "event_report.pid"
+        self.lock = FileLock(self.pid_dir / "event_report.lock")
+        # Последний полностью записанный снимок структуры (пишет make_cache.py)
+        self.snapshots = SnapshotStore(self.cache_dir, "zabbix_local", ".cache")
+        
+        self.loader = CacheLoader(self.loader_workers, parsed=self.parsed_cache)
         
         # Кэш данных
         self.cache = {}
         self.cache_event = {'day': {}}
+        # Индексы по кэшу структуры (hostid -> группы, имя и т.д.)
+        self.index = StructureIndex({})
+        # hostid -> (группы, имя хоста) для колонок отчета, не больше HOST_INFO_CACHE_SIZE
+        self._host_info = {}
+        # Дневные файлы, разбор которых начат при загрузке кэша структуры
+        self._prefetch = None
+        # События для листа Summary, собираются при записи строк
+        self._stats_builder = None
         
     def _load_config(self, config_path):
         config = ConfigParser()
         config.read(config_path)
         return config
     
-    def _check_proc(self):
-        if self.pid_file.exists():
-            print(f"Process already running, PID file exists: {self.pid_file}")
-            return True
-        return False
-    
-    def _create_pid(self):
-        with open(self.pid_file, 'w') as f:
-            f.write(str(os.getpid()))
-            
-    def _remove_pid(self):
-        if self.pid_file.exists():
-            self.pid_file.unlink()
-    
     def _load_cache(self):
-        cache_file = self.cache_dir / "zabbix_svp.cache"
-        if not cache_file.exists():
-            print(f"Cache file not found: {cache_file}")
+        # Снимок читается целиком по одному пути, пересборка кэша на него не влияет
+        cache_file = self.snapshots.latest()
+        if cache_file is None:
+            print(f"Cache file not found: {self.snapshots.link}")
             return False
         
         try:
-            with open(cache_file, 'r') as f:
-                self.cache = json.load(f)
+            # Снимок и первые дни отчета разбираются параллельно
+            structure = self.loader.submit(cache_file)
+            if self.store is None:
+                self._prefetch = self.loader.iter_files(self._day_files(self._report_period()[0]))
+            self.cache = self.loader.load(cache_file, structure)
+            self.index = StructureIndex(self.cache)
+            self._host_info = {}
             print(f"Cache loaded successfully from {cache_file}")
             return True
         except Exception as e:
@@ -72,62 +138,318 @@ class ZabbixEventReport:
 
 
 
-     def _generate_report(self):
+    @staticmethod
+    def _parse_tags(value):
+        #"DP=x, env" -> {'DP': 'x', 'env': None}
+        tags = {}
+        for item in value.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            tag, sep, tag_value = item.partition('=')
+            tags[tag.strip()] = tag_value.strip() if sep else None
+        return tags
+    
+    def _filter_hostids(self):
+        #hostid выбранных групп по кэшу структуры, None - без фильтра
+        if not self.filter_hostgroups:
+            return None
+        return self.index.hosts_in_groups(self.filter_hostgroups)
+    
+    def _report_period(self):
+        day_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        time_from = int((day_start - timedelta(days=self.report_event_day)).timestamp())
+        return day_start, time_from, int(time.time())
+
+    def _iter_events(self):
+        #События за report_event_day дней с учетом фильтров.
+        #Из хранилища - индексированным запросом, иначе - чтением дневных файлов.
+        day_start, time_from, time_till = self._report_period()
+        hostids = self._filter_hostids()
+        
+        if self.store is not None:
+            yield from self.store.query(
+                time_from=time_from,
+                time_till=time_till,
+                hostids=hostids,
+                min_severity=self.filter_min_severity,
+                tags=self.filter_tags
+            )
+            return
+        
+        days = self._prefetch or self.loader.iter_files(self._day_files(day_start))
+        self._prefetch = None
+        for cache_file, events in days:
+            for event in events:
+                if self._match_event(event, time_from, time_till, hostids):
+                    yield event
+    
+    def _day_files(self, day_start):
+        #Дневные файлы периода отчета по порядку, по одному на день
+        files = []
+        for day in range(self.report_event_day, -1, -1):
+            date_str = (day_start - timedelta(days=day)).strftime('%Y-%m-%d')
+            for cache_file in sorted(self.event_cache_dir.glob(f"events-{date_str}.*")):
+                files.append(cache_file)
+                break
+        return files
+    
+    def _match_event(self, event, time_from, time_till, hostids):
+        problem = event.get('problem', {})
+        if not time_from <= int(problem.get('clock') or 0) <= time_till:
+            return False
+        if self.filter_min_severity is not None and int(problem.get('severity') or 0) < self.filter_min_severity:
+            return False
+        if hostids is not None and not hostids.intersection(problem.get('hosts', [])):
+            return False
+        for tag, value in self.filter_tags.items():
+            if not any(t.get('tag') == tag and (value is None or t.get('value') == value)
+                       for t in problem.get('tags', [])):
+                return False
+        return True
+
+    def _host_columns(self, hostids):
+        #Колонки HostGroup и Host по кэшу структуры, результат запоминается на хост
+        groups, names = [], []
+        for hostid in hostids:
+            info = self._host_info.get(hostid)
+            if info is None:
+                info = self._host_info[hostid] = (self.index.group_label(hostid), self.index.host_name(hostid))
+                if len(self._host_info) > HOST_INFO_CACHE_SIZE:
+                    # dict хранит порядок вставки: вытесняется самый старый хост
+                    del self._host_info[next(iter(self._host_info))]
+            group, name = info
+            groups.append(group)
+            names.append(name)
+        return ", ".join(g for g in groups if g), ", ".join(names)
+
+    @staticmethod
+    def _format_duration(seconds):
+        if seconds is None:
+            return ""
+        seconds = int(seconds)
+        days, seconds = divmod(seconds, 86400)
+        hours, seconds = divmod(seconds, 3600)
+        minutes = seconds // 60
+        if days:
+            return f"{days}d {hours}h {minutes}m"
+        if hours:
+            return f"{hours}h {minutes}m"
+        return f"{minutes}m"
+
+    def _iter_rows(self):
+        #Строки отчета (по колонкам REPORT_HEADERS) из генератора событий, по одной.
+        #События идут по (clock, eventid), а соседние дневные файлы пересекаются только
+        #событиями ровно на границе суток - повтор ищется среди событий той же секунды
+        last_clock, same_clock = None, set()
+        for event in self._iter_events():
+            problem = event.get('problem', {})
+            clock = int(problem.get('clock') or 0)
+            eventid = problem.get('eventid')
+            if clock != last_clock:
+                last_clock, same_clock = clock, set()
+            elif eventid in same_clock:
+                continue
+            same_clock.add(eventid)
+            if self._stats_builder is not None:
+                self._stats_builder.add(event)
+            recovery = event.get('recovery')
+            severity = int(problem.get('severity') or 0)
+            hostgroup, host = self._host_columns(problem.get('hosts', []))
+            tags = problem.get('tags', [])
+
+            yield (
+                datetime.fromtimestamp(clock).strftime(TIME_FORMAT),
+                SEVERITY_NAMES.get(severity, str(severity)),
+                datetime.fromtimestamp(int(recovery['clock'])).strftime(TIME_FORMAT) if recovery else "",
+                'RESOLVED' if recovery else 'PROBLEM',
+                hostgroup,
+                host,
+                problem.get('name', ''),
+                'Yes' if str(problem.get('acknowledged')) == '1' else 'No',
+                self._format_duration(event.get('duration')),
+                ", ".join(t.get('value', '') for t in tags if t.get('tag') == 'DP'),
+                ", ".join(f"{t.get('tag')}: {t.get('value', '')}" for t in tags if t.get('tag') != 'DP')
+            )
+
+    def _generate_report(self, report_format=None):
+        """
+        Пишет отчет потоково: строки идут из генератора событий и сразу уходят
+        в файл, поэтому память не растет с размером отчета.
+
+        Args:
+            report_format: 'xlsx' (по умолчанию), 'csv' или 'tsv' - быстрый
+                           вариант без стилей для очень больших выгрузок
+
+        Returns:
+            Путь к файлу отчета или None при ошибке
+        """
+        report_format = report_format or self.report_format
+        if report_format not in REPORT_FORMATS:
+            print(f"Unknown report format: {report_format}")
+            return None
+
         #Содаем имя файла 
         now = datetime.now()
-        report_filename = f"{now.strftime('%Y-%m-%d')}-report-event-{now.strftime('%H-%M-%S')}.xlsx"
+        report_filename = f"{now.strftime('%Y-%m-%d')}-report-event-{now.strftime('%H-%M-%S')}.{report_format}"
         report_path = self.report_dir / report_filename
-        
-        #Новая книга Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Events Report"
-        
-        #Стили для заголовков
-        header_fill = PatternFill(start_color="DDDDDD", end_color="DDDDDD", fill_type="solid")
-        header_font = Font(bold=True)
-        header_alignment = Alignment(horizontal='center', vertical='center')
-        header_border = Border(left=Side(style='thin'), 
-                             right=Side(style='thin'), 
-                             top=Side(style='thin'), 
-                             bottom=Side(style='thin'))
-        
-        #Стили для ячеек
-        cell_border = Border(left=Side(style='thin'), 
-                           right=Side(style='thin'), 
-                           top=Side(style='thin'), 
-                           bottom=Side(style='thin'))
-        
-        #Цвета для severity
-        severity_styles = {
-            0: PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid"),  #Not classified
-            1: PatternFill(start_color="ADD8E6", end_color="ADD8E6", fill_type="solid"),  #Information
-            2: PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid"),  #Warning
-            3: PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid"),  #Average
-            4: PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid"),  #High
-            5: PatternFill(start_color="FF00FF", end_color="FF00FF", fill_type="solid")   #Disaster
-        }
-        
-        #Цвета для статуса
-        status_styles = {
-            'PROBLEM': PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid"),
-            'RESOLVED': PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        }
-        
-        #Заголовки 
-        headers = [
-            "Time", "Severity", "Recovery Time", "Status", "HostGroup", 
-            "Host", "Problem", "Ack", "Duration", "Tags DP", "Tags 2"
-        ]
-        
+        tmp_path = self.report_dir / f".{report_filename}.tmp"
+        self._host_info = {}
+
+        try:
+            if report_format == 'xlsx':
+                rows = self._write_xlsx(tmp_path)
+            else:
+                rows = self._write_csv(tmp_path, delimiter=REPORT_FORMATS[report_format])
+            os.replace(tmp_path, report_path)
+        except Exception as e:
+            print(f"Error generating report: {e}")
+            if tmp_path.exists():
+                tmp_path.unlink()
+            return None
+
+        print(f"Report saved: {report_path} ({rows} events)")
+        return report_path
+
+    def _write_csv(self, path, delimiter):
+        rows = 0
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, delimiter=delimiter)
+            writer.writerow(REPORT_HEADERS)
+            for row in self._iter_rows():
+                writer.writerow(row)
+                rows += 1
+        return rows
+
+    def _write_xlsx(self, path):
+        #write-only книга: строки сразу сбрасываются во временный файл openpyxl
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Events Report")
+        for style in _report_styles():
+            wb.add_named_style(style)
+
         # Ширина столбцов
-        column_widths = [16, 15, 16, 13, 44, 37, 62, 5, 10, 11, 70]
-        
-        # Записываем заголовки
-        for col_num, (header, width) in enumerate(zip(headers, column_widths), 1):
-            cell = ws.cell(row=1, column=col_num, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = header_alignment
-            cell.border = header_border
+        for col_num, width in enumerate(REPORT_COLUMN_WIDTHS, 1):
             ws.column_dimensions[get_column_letter(col_num)].width = width
+        ws.freeze_panes = 'A2'
+
+        ws.append([_styled_cell(ws, header, 'report_header') for header in REPORT_HEADERS])
+
+        #Ячейки со стилями создаются один раз и переиспользуются в каждой строке:
+        #write-only лист сериализует строку сразу при append
+        cells = [_styled_cell(ws, None, 'report_cell') for _ in REPORT_HEADERS]
+        severity_cells = {severity: _styled_cell(ws, name, f'report_severity_{severity}')
+                          for severity, name in SEVERITY_NAMES.items()}
+        status_cells = {status: _styled_cell(ws, status, f'report_status_{status}')
+                        for status in STATUS_COLORS}
+
+        if self.summary_sheet:
+            self._stats_builder = EventFrameBuilder()
+
+        rows = 0
+        for row in self._iter_rows():
+            for cell, value in zip(cells, row):
+                cell.value = value
+            cells[1] = severity_cells.get(SEVERITY_LEVELS.get(row[1]), severity_cells[0])
+            cells[1].value = row[1]
+            cells[3] = status_cells[row[3]]
+            ws.append(cells)
+            rows += 1
+
+        if self._stats_builder is not None:
+            _, time_from, time_till = self._report_period()
+            stats = EventStats.from_structure_cache(
+                self._stats_builder.build(), self.cache, time_from=time_from, time_till=time_till)
+            self._stats_builder = None
+            self._write_summary(wb.create_sheet("Summary", 0), stats)
+
+        wb.save(path)
+        return rows
+
+    def _write_summary(self, ws, stats):
+        #Лист Summary: итоги, разрезы по severity, группам и хостам, дневной ряд
+        for col_num, width in enumerate(SUMMARY_COLUMN_WIDTHS, 1):
+            ws.column_dimensions[get_column_letter(col_num)].width = width
+        duration = self._format_duration
+
+        def section(title, headers, rows):
+            ws.append([_styled_cell(ws, title, 'report_header')])
+            ws.append([_styled_cell(ws, header, 'report_header') for header in headers])
+            for row in rows:
+                ws.append([_styled_cell(ws, value, 'report_cell') for value in row])
+            ws.append([])
+
+        def metrics(row):
+            return [row['problems'], row['recovered'], row['open'], row['acknowledged'],
+                    duration(row['downtime']), duration(row['mttr'])] + \
+                   [duration(row[f'p{q}']) for q in stats.percentiles]
+
+        columns = ["Problems", "Recovered", "Open", "Ack", "Downtime", "MTTR"] + \
+                  [f"P{q}" for q in stats.percentiles]
+
+        period = f"{datetime.fromtimestamp(stats.time_from).strftime(TIME_FORMAT)} - " \
+                 f"{datetime.fromtimestamp(stats.time_till).strftime(TIME_FORMAT)}"
+        section("Total", ["Period", "Hosts"] + columns,
+                [[period, stats.summary()['hosts']] + metrics(stats.summary())])
+
+        section("By severity", ["Severity"] + columns,
+                [[SEVERITY_NAMES.get(row['severity'], str(row['severity']))] + metrics(row)
+                 for row in stats.by_severity()])
+
+        section("By hostgroup", ["HostGroup", "Hosts", "SLA, %"] + columns,
+                [[row['name'], row['hosts'], round(row['sla'], 3)] + metrics(row)
+                 for row in stats.by_hostgroup()])
+
+        section(f"Top {self.summary_top_hosts} hosts by downtime", ["Host", "HostGroup", "SLA, %"] + columns,
+                [list(reversed(self._host_columns([row['hostid']]))) + [round(row['sla'], 3)] + metrics(row)
+                 for row in stats.by_host(limit=self.summary_top_hosts)])
+
+        section(f"Daily (rolling {self.summary_window} days)",
+                ["Day", "Problems", "Recovered", "Downtime", "MTTR",
+                 "Rolling problems", "Rolling downtime", "Rolling MTTR"],
+                [[row['day'], row['problems'], row['recovered'], duration(row['downtime']), duration(row['mttr']),
+                  row['rolling_problems'], duration(row['rolling_downtime']), duration(row['rolling_mttr'])]
+                 for row in stats.daily(window=self.summary_window)])
+
+    def run(self, report_format=None):
+        if not self.lock.acquire():
+            print(f"Process already running (PID {self.lock.holder()}), lock file: {self.lock.path}")
+            return None
+        try:
+            if not self._load_cache():
+                return None
+            report_path = self._generate_report(report_format)
+            # Разобранные формы удаленных снимков и дней больше не нужны
+            prune_parsed(self.snapshots.snapshot_dir)
+            prune_parsed(self.event_cache_dir)
+            return report_path
+        finally:
+            self._prefetch = None
+            self.loader.close()
+            self.lock.release()
+
+
+def _styled_cell(ws, value, style):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+
+def _report_styles():
+    #Именованные стили отчета: регистрируются в книге один раз
+    thin = Side(style='thin')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+
+    def solid(color):
+        return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+    styles = [
+        NamedStyle(name='report_header', font=Font(bold=True), border=border, fill=solid("DDDDDD"),
+                   alignment=Alignment(horizontal='center', vertical='center')),
+        NamedStyle(name='report_cell', border=border),
+    ]
+    for severity, color in SEVERITY_COLORS.items():
+        styles.append(NamedStyle(name=f'report_severity_{severity}', border=border, fill=solid(color)))
+    for status, color in STATUS_COLORS.items():
+        styles.append(NamedStyle(name=f'report_status_{status}', border=border, fill=solid(color)))
+    return styles
@@ -0,0 +1,692 @@
+import argparse
+import json
+import random
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+PROBLEM_NAMES = [
+    "High CPU utilization",
+    "Load average is too high",
+    "Low free disk space on /",
+    "Zabbix agent is not available",
+    "Host has been restarted",
+    "High memory utilization",
+    "Interface eth0: Link down",
+    "Service is down",
+    "Too many processes",
+    "MySQL: Replication lag is too high",
+]
+
+TEMPLATE_NAMES = [
+    "Linux by Zabbix agent",
+    "Windows by Zabbix agent",
+    "ICMP Ping",
+    "MySQL by Zabbix agent 2",
+    "Nginx by HTTP",
+]
+
+# Типы ресурсов журнала аудита: пользователь и хост
+AUDIT_USER = 0
+AUDIT_HOST = 4
+
+# Вес severity 0..5 при генерации событий
+SEVERITY_WEIGHTS = [5, 25, 30, 25, 10, 5]
+
+
+class MockDataset:
+    """
+    Синтетический набор данных Zabbix: хосты, группы, шаблоны, теги, макросы,
+    группы пользователей и события за несколько дней до текущего момента.
+
+    Записи хранятся в том виде, в котором их отдает Zabbix API (id и clock - строки).
+    Генерация детерминирована при одинаковом seed.
+
+    Args:
+        hosts: Число хостов
+        groups: Число групп хостов
+        events_per_day: Событий о проблемах в сутки
+        days: За сколько полных дней до сегодняшнего генерировать события
+        ack_ratio: Доля подтвержденных проблем
+        recovery_ratio: Доля проблем, которые закрылись
+        seed: Начальное значение генератора
+    """
+
+    def __init__(self, hosts=1000, groups=50, events_per_day=5000, days=3,
+                 ack_ratio=0.2, recovery_ratio=0.8, seed=1):
+        self.random = random.Random(seed)
+        self.now = int(time.time())
+
+        self._make_groups(groups)
+        self._make_hosts(hosts)
+        self._make_templates()
+        self._make_usergroups()
+        self._make_events(events_per_day, days, ack_ratio, recovery_ratio)
+        # Журнал аудита (auditlog.get): вход администратора при "установке" и правки
+        # хостов через update_host/add_host/remove_host
+        self.audit = []
+        self._log(AUDIT_USER, '1', clock=self.now - days * 86400)
+
+    def _make_groups(self, count):
+        self.groups = [{'groupid': str(100 + i), 'name': f"Group {i:03d}", 'flags': '0', 'uuid': ''}
+                       for i in range(count)]
+        self.groups_by_id = {group['groupid']: group for group in self.groups}
+
+    def _make_hosts(self, count):
+        self.hosts = [self._new_host(i) for i in range(count)]
+        self.hosts_by_id = {host['hostid']: host for host in self.hosts}
+
+    def _new_host(self, i):
+        rnd = self.random
+        hostid = str(10001 + i)
+        return {
+            'hostid': hostid,
+            'host': f"host-{i:05d}",
+            'name': f"Host {i:05d}",
+            'status': '1' if rnd.random() < 0.05 else '0',
+            'flags': '0',
+            'proxy_hostid': '0',
+            'description': '',
+            '_groups': sorted({g['groupid'] for g in rnd.sample(self.groups, min(len(self.groups), rnd.randint(1, 3)))}),
+            '_tags': [
+                {'tag': 'DP', 'value': f"dp{rnd.randint(1, 20):02d}"},
+                {'tag': 'env', 'value': rnd.choice(['prod', 'stage', 'dev'])},
+                {'tag': 'service', 'value': rnd.choice(['web', 'db', 'cache', 'queue'])},
+            ],
+            '_macros': [
+                {'hostmacroid': str(50000 + 2 * i), 'macro': '{$CPU.UTIL.CRIT}', 'value': str(rnd.randint(80, 95)), 'type': '0'},
+                {'hostmacroid': str(50001 + 2 * i), 'macro': '{$OWNER}', 'value': f"team{rnd.randint(1, 9)}", 'type': '0'},
+            ],
+        }
+
+    def _make_templates(self):
+        self.templates = []
+        for i, name in enumerate(TEMPLATE_NAMES):
+            hostids = [h['hostid'] for h in self.hosts if int(h['hostid']) % len(TEMPLATE_NAMES) == i]
+            self.templates.append({'templateid': str(1000 + i), 'host': name, 'name': name, '_hosts': hostids})
+
+    def _make_usergroups(self):
+        self.usergroups = [
+            {'usrgrpid': str(7 + i), 'name': name, 'users': [{'userid': str(1 + i * 10 + j)} for j in range(i + 1)]}
+            for i, name in enumerate(["Zabbix administrators", "Operators", "Guests"])
+        ]
+
+    def _make_events(self, per_day, days, ack_ratio, recovery_ratio):
+        rnd = self.random
+        day_start = int(datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+        start = day_start - days * 86400
+        total = int(per_day * (self.now - start) / 86400)
+
+        # (clock, порядок, событие): id выдаются по возрастанию clock, как в Zabbix
+        raw = []
+        for i in range(total):
+            clock = rnd.randint(start, self.now - 1)
+            problem = self._problem_event(clock, ack_ratio)
+            raw.append((clock, 2 * i, problem))
+
+            recovery_clock = clock + rnd.randint(60, 4 * 3600)
+            if rnd.random() < recovery_ratio and recovery_clock < self.now:
+                recovery = self._recovery_event(problem, recovery_clock)
+                recovery['_problem'] = problem
+                raw.append((recovery_clock, 2 * i + 1, recovery))
+
+        raw.sort(key=lambda item: (item[0], item[1]))
+
+        self.events = []
+        for eventid, (clock, _, event) in enumerate(raw, 1):
+            event['eventid'] = str(eventid)
+            event['clock'] = str(clock)
+            event['r_eventid'] = '0'
+            event['_acknowledges'] = []
+            self.events.append(event)
+
+        for event in self.events:
+            problem = event.pop('_problem', None)
+            if problem is not None:
+                problem['r_eventid'] = event['eventid']
+            elif event['acknowledged'] == '1':
+                event['_acknowledges'] = self._acknowledges(event)
+
+        # Индексы для выборок по времени и по id
+        self.event_clocks = [int(event['clock']) for event in self.events]
+        self.events_by_id = {event['eventid']: event for event in self.events}
+        self.problems = [e for e in self.events if e['value'] == '1' and e['r_eventid'] == '0']
+
+    def _problem_event(self, clock, ack_ratio):
+        rnd = self.random
+        host = rnd.choice(self.hosts)
+        return {
+            'source': '0', 'object': '0', 'value': '1',
+            'clock': clock, 'ns': '0',
+            'objectid': str(20000 + rnd.randint(0, len(self.hosts) * 10)),
+            'name': rnd.choice(PROBLEM_NAMES),
+            'severity': str(rnd.choices(range(6), SEVERITY_WEIGHTS)[0]),
+            'acknowledged': '1' if rnd.random() < ack_ratio else '0',
+            '_hosts': [host['hostid']],
+            '_tags': host['_tags'][:1] + [{'tag': 'scope', 'value': rnd.choice(['availability', 'performance', 'capacity'])}],
+        }
+
+    @staticmethod
+    def _recovery_event(problem, clock):
+        return {
+            'source': '0', 'object': '0', 'value': '0',
+            'clock': clock, 'ns': '0',
+            'objectid': problem['objectid'],
+            'name': problem['name'],
+            'severity': '0',
+            'acknowledged': '0',
+            '_hosts': problem['_hosts'],
+            '_tags': problem['_tags'],
+        }
+
+    @staticmethod
+    def _acknowledges(event):
+        return [{
+            'acknowledgeid': event['eventid'], 'userid': '1', 'clock': str(int(event['clock']) + 300),
+            'message': 'Взято в работу', 'action': '6', 'old_severity': '0', 'new_severity': '0'
+        }]
+
+    def add_events(self, problems=10, recoveries=5, ack_ratio=0.2):
+        """
+        Дописывает события с текущим временем: problems новых проблем и восстановления
+        для recoveries случайных открытых проблем. Для проверки слежения за потоком событий.
+
+        Returns:
+            (новые проблемы, закрытые проблемы)
+        """
+        self.now = int(time.time())
+        next_id = int(self.events[-1]['eventid']) + 1 if self.events else 1
+
+        def append(event):
+            nonlocal next_id
+            event.update(eventid=str(next_id), clock=str(self.now), r_eventid='0', _acknowledges=[])
+            next_id += 1
+            self.events.append(event)
+            self.event_clocks.append(self.now)
+            self.events_by_id[event['eventid']] = event
+
+        closed = self.random.sample(self.problems, min(recoveries, len(self.problems)))
+        for problem in closed:
+            recovery = self._recovery_event(problem, self.now)
+            append(recovery)
+            problem['r_eventid'] = recovery['eventid']
+
+        added = []
+        for _ in range(problems):
+            problem = self._problem_event(self.now, ack_ratio)
+            append(problem)
+            if problem['acknowledged'] == '1':
+                problem['_acknowledges'] = self._acknowledges(problem)
+            added.append(problem)
+
+        closed_ids = {id(problem) for problem in closed}
+        self.problems = [e for e in self.problems if id(e) not in closed_ids] + added
+        return added, closed
+
+    def _log(self, resourcetype, resourceid, clock=None):
+        self.audit.append({
+            'auditid': str(len(self.audit) + 1),
+            'clock': str(int(time.time()) if clock is None else clock),
+            'resourcetype': str(resourcetype),
+            'resourceid': str(resourceid),
+        })
+
+    def update_host(self, hostid, audit=True, **fields):
+        """
+        Меняет поля хоста (name, status, _tags, _groups, ...); audit=False - правка
+        мимо журнала аудита (LLD, шаблон, прямая правка базы)
+        """
+        self.hosts_by_id[hostid].update(fields)
+        if audit:
+            self._log(AUDIT_HOST, hostid)
+
+    def add_host(self, audit=True):
+        """Добавляет хост, возвращает его hostid"""
+        host = self._new_host(max(int(h['hostid']) for h in self.hosts) - 10000 if self.hosts else 0)
+        self.hosts.append(host)
+        self.hosts_by_id[host['hostid']] = host
+        if audit:
+            self._log(AUDIT_HOST, host['hostid'])
+        return host['hostid']
+
+    def remove_host(self, hostid, audit=True):
+        host = self.hosts_by_id.pop(hostid)
+        self.hosts.remove(host)
+        if audit:
+            self._log(AUDIT_HOST, hostid)
+
+    def summary(self):
+        return {
+            'hosts': len(self.hosts),
+            'groups': len(self.groups),
+            'events': len(self.events),
+            'problem_events': sum(1 for e in self.events if e['value'] == '1'),
+            'open_problems': len(self.problems),
+        }
+
+# -------------------------------------------------------------------------------------------
+
+
+def _as_list(value):
+    if value is None:
+        return None
+    return [str(v) for v in (value if isinstance(value, (list, tuple)) else [value])]
+
+
+def _project(obj, output):
+    #Поля записи по output ('extend', список полей); служебные поля с '_' не отдаются
+    if output in (None, 'extend'):
+        return {key: value for key, value in obj.items() if not key.startswith('_')}
+    if isinstance(output, str):
+        output = [output]
+    return {key: obj[key] for key in output if key in obj and not key.startswith('_')}
+
+
+class MockZabbix:
+    """
+    Обработчик методов JSON-RPC поверх MockDataset.
+
+    Поддерживает методы и параметры, которыми пользуются API, ZabbixCache,
+    ZabbixEventCache и ZabbixEventReport.
+
+    Args:
+        dataset: MockDataset
+        latency: Задержка ответа на каждый запрос, секунды
+        latency_per_item: Дополнительная задержка на каждый возвращенный объект
+        page_limit: Максимум объектов в одном ответе (как ограничение на стороне сервера)
+        version: Версия, которую отдает apiinfo.version
+        capacity: Сколько запросов сервер обрабатывает одновременно без замедления:
+                  сверх него latency растет пропорционально очереди, а при вдвое
+                  большей нагрузке сервер отвечает 503 (None - без ограничения)
+    """
+
+    def __init__(self, dataset, latency=0.0, latency_per_item=0.0, page_limit=None, version='7.0.0',
+                 capacity=None):
+        self.dataset = dataset
+        self.latency = latency
+        self.latency_per_item = latency_per_item
+        self.page_limit = page_limit
+        self.version = version
+        self.capacity = capacity
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.reset_stats()
+
+    def enter(self):
+        """Начало обработки запроса; False - сервер перегружен (ответить 503)"""
+        with self._lock:
+            self._in_flight += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self._in_flight)
+            return not self.capacity or self._in_flight <= 2 * self.capacity
+
+    def leave(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _slowdown(self):
+        if not self.capacity:
+            return 1
+        return max(1, self._in_flight / self.capacity)
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {'requests': 0, 'errors': 0, 'bytes': 0, 'methods': {}, 'rejected': 0, 'max_in_flight': 0}
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self.stats))
+
+    def _count(self, method, size, error):
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['bytes'] += size
+            self.stats['errors'] += int(error)
+            self.stats['methods'][method] = self.stats['methods'].get(method, 0) + 1
+
+    def handle(self, request):
+        """
+        Обрабатывает разобранный JSON-RPC запрос, возвращает ответ (dict)
+        """
+        method = request.get('method', '')
+        params = request.get('params') or {}
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+
+        handler = getattr(self, '_' + method.replace('.', '_'), None)
+        if handler is None:
+            response['error'] = {'code': -32601, 'message': 'Method not found.',
+                                 'data': f'Incorrect API "{method}".'}
+        else:
+            try:
+                result = handler(params)
+                if isinstance(result, list):
+                    if self.page_limit:
+                        result = result[:self.page_limit]
+                    if self.latency_per_item:
+                        time.sleep(self.latency_per_item * len(result))
+                response['result'] = result
+            except (KeyError, ValueError, TypeError) as e:
+                response['error'] = {'code': -32602, 'message': 'Invalid params.', 'data': str(e)}
+
+        if self.latency:
+            time.sleep(self.latency * self._slowdown())
+        return response
+
+    @staticmethod
+    def _limit(result, params):
+        limit = params.get('limit')
+        return result[:int(limit)] if limit else result
+
+    # ------------------------------------------------------------------ служебные методы
+
+    def _apiinfo_version(self, params):
+        return self.version
+
+    def _user_login(self, params):
+        return f"{random.getrandbits(128):032x}"
+
+    def _user_logout(self, params):
+        return True
+
+    def _user_checkAuthentication(self, params):
+        return {'userid': '1', 'username': 'Admin', 'sessionid': params.get('sessionid', '')}
+
+    def _auditlog_get(self, params):
+        entries = self.dataset.audit
+        if params.get('time_from') is not None:
+            entries = [e for e in entries if int(e['clock']) >= int(params['time_from'])]
+        resourcetypes = _as_list((params.get('filter') or {}).get('resourcetype'))
+        if resourcetypes is not None:
+            entries = [e for e in entries if e['resourcetype'] in [str(t) for t in resourcetypes]]
+        return [_project(e, params.get('output', 'extend')) for e in self._limit(entries, params)]
+
+    # ------------------------------------------------------------------ справочники
+
+    def _host_get(self, params):
+        data = self.dataset
+        hosts = data.hosts
+
+        hostids = _as_list(params.get('hostids'))
+        if hostids is not None:
+            hosts = [data.hosts_by_id[h] for h in hostids if h in data.hosts_by_id]
+
+        groupids = _as_list(params.get('groupids'))
+        if groupids is not None:
+            groupids = set(groupids)
+            hosts = [h for h in hosts if groupids.intersection(h['_groups'])]
+
+        templateids = _as_list(params.get('templateids'))
+        if templateids is not None:
+            allowed = {hostid for t in data.templates if t['templateid'] in templateids for hostid in t['_hosts']}
+            hosts = [h for h in hosts if h['hostid'] in allowed]
+
+        names = _as_list((params.get('filter') or {}).get('host'))
+        if names is not None:
+            hosts = [h for h in hosts if h['host'] in names]
+
+        result = []
+        for host in self._limit(hosts, params):
+            item = _project(host, params.get('output', 'extend'))
+            item['hostid'] = host['hostid']
+            if params.get('selectTags'):
+                item['tags'] = [_project(t, params['selectTags']) for t in host['_tags']]
+            for select in ('selectHostGroups', 'selectGroups'):
+                if params.get(select):
+                    key = 'hostgroups' if select == 'selectHostGroups' else 'groups'
+                    item[key] = [_project(data.groups_by_id[g], params[select]) for g in host['_groups']]
+            if params.get('selectMacros'):
+                item['macros'] = [_project(m, params['selectMacros']) for m in host['_macros']]
+            result.append(item)
+        return result
+
+    def _hostgroup_get(self, params):
+        data = self.dataset
+        groups = data.groups
+
+        groupids = _as_list(params.get('groupids'))
+        if groupids is not None:
+            groups = [data.groups_by_id[g] for g in groupids if g in data.groups_by_id]
+
+        names = _as_list((params.get('filter') or {}).get('name'))
+        if names is not None:
+            groups = [g for g in groups if g['name'] in names]
+
+        members = {}
+        if params.get('selectHosts'):
+            for host in data.hosts:
+                for groupid in host['_groups']:
+                    members.setdefault(groupid, []).append(host)
+
+        result = []
+        for group in self._limit(groups, params):
+            item = _project(group, params.get('output', 'extend'))
+            item['groupid'] = group['groupid']
+            if params.get('selectHosts'):
+                item['hosts'] = [_project(h, params['selectHosts']) for h in members.get(group['groupid'], [])]
+            result.append(item)
+        return result
+
+    def _template_get(self, params):
+        templates = self.dataset.templates
+
+        templateids = _as_list(params.get('templateids'))
+        if templateids is not None:
+            templates = [t for t in templates if t['templateid'] in templateids]
+
+        names = _as_list((params.get('filter') or {}).get('host'))
+        if names is not None:
+            templates = [t for t in templates if t['host'] in names]
+
+        result = []
+        for template in self._limit(templates, params):
+            item = _project(template, params.get('output', 'extend'))
+            item['templateid'] = template['templateid']
+            if params.get('selectHosts'):
+                item['hosts'] = [{'hostid': hostid} for hostid in template['_hosts']]
+            result.append(item)
+        return result
+
+    def _usermacro_get(self, params):
+        data = self.dataset
+        hostids = _as_list(params.get('hostids'))
+        hosts = data.hosts if hostids is None else [data.hosts_by_id[h] for h in hostids if h in data.hosts_by_id]
+        result = [dict(_project(m, params.get('output', 'extend')), hostid=h['hostid'])
+                  for h in hosts for m in h['_macros']]
+        return self._limit(result, params)
+
+    def _usergroup_get(self, params):
+        result = []
+        for group in self.dataset.usergroups:
+            item = {'usrgrpid': group['usrgrpid'], 'name': group['name']}
+            if params.get('selectUsers'):
+                item['users'] = [dict(u) for u in group['users']]
+            result.append(item)
+        return result
+
+    # ------------------------------------------------------------------ события
+
+    def _event_view(self, event, params):
+        item = _project(event, params.get('output', 'extend'))
+        if params.get('selectHosts'):
+            item['hosts'] = [_project(self.dataset.hosts_by_id[h], params['selectHosts']) for h in event['_hosts']]
+        if params.get('selectTags'):
+            item['tags'] = [_project(t, params['selectTags']) for t in event['_tags']]
+        if params.get('selectAcknowledges'):
+            item['acknowledges'] = [_project(a, params['selectAcknowledges']) for a in event['_acknowledges']]
+        return item
+
+    def _filter_events(self, events, params):
+        value = params.get('value')
+        if value is not None:
+            events = [e for e in events if e['value'] == str(value)]
+
+        eventid_from = params.get('eventid_from')
+        if eventid_from is not None:
+            events = [e for e in events if int(e['eventid']) >= int(eventid_from)]
+        eventid_till = params.get('eventid_till')
+        if eventid_till is not None:
+            events = [e for e in events if int(e['eventid']) <= int(eventid_till)]
+
+        min_severity = params.get('min_severity')
+        if min_severity is not None:
+            events = [e for e in events if int(e['severity']) >= int(min_severity)]
+        severities = _as_list(params.get('severities'))
+        if severities is not None:
+            events = [e for e in events if e['severity'] in severities]
+
+        hostids = _as_list(params.get('hostids'))
+        if hostids is not None:
+            hostids = set(hostids)
+            events = [e for e in events if hostids.intersection(e['_hosts'])]
+
+        groupids = _as_list(params.get('groupids'))
+        if groupids is not None:
+            groupids = set(groupids)
+            hosts = self.dataset.hosts_by_id
+            events = [e for e in events if any(groupids.intersection(hosts[h]['_groups']) for h in e['_hosts'])]
+
+        return events
+
+    def _event_get(self, params):
+        data = self.dataset
+
+        eventids = _as_list(params.get('eventids'))
+        if eventids is not None:
+            events = sorted((data.events_by_id[e] for e in eventids if e in data.events_by_id),
+                            key=lambda e: int(e['eventid']))
+            time_from, time_till = params.get('time_from'), params.get('time_till')
+            if time_from is not None:
+                events = [e for e in events if int(e['clock']) >= int(time_from)]
+            if time_till is not None:
+                events = [e for e in events if int(e['clock']) <= int(time_till)]
+        else:
+            # События упорядочены по (clock, eventid): диапазон по времени - бинарным поиском
+            lo = 0 if params.get('time_from') is None else bisect_left(data.event_clocks, int(params['time_from']))
+            hi = len(data.events) if params.get('time_till') is None else bisect_right(data.event_clocks, int(params['time_till']))
+            events = data.events[lo:hi]
+
+        events = self._filter_events(events, params)
+        # Порядок по eventid совпадает с порядком по clock
+        if params.get('sortorder') == 'DESC':
+            events = events[::-1]
+
+        return [self._event_view(e, params) for e in self._limit(events, params)]
+
+    def _problem_get(self, params):
+        events = self._filter_events(self.dataset.problems, params)
+        return [self._event_view(e, params) for e in self._limit(events, params)]
+
+# -------------------------------------------------------------------------------------------
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        mock = self.server.mock
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            request = json.loads(body)
+        except ValueError:
+            request = None
+
+        try:
+            if not mock.enter():
+                with mock._lock:
+                    mock.stats['rejected'] += 1
+                self.send_error(503, 'Service Unavailable')
+                return
+            if isinstance(request, dict):
+                method = request.get('method', '')
+                response = mock.handle(request)
+            else:
+                method = 'invalid'
+                response = {'jsonrpc': '2.0', 'id': None,
+                            'error': {'code': -32700, 'message': 'Parse error.', 'data': 'Invalid JSON.'}}
+        finally:
+            mock.leave()
+
+        data = json.dumps(response).encode()
+        mock._count(method, len(data), 'error' in response)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class MockZabbixServer:
+    """
+    Локальный HTTP-сервер Zabbix JSON-RPC для замеров и отладки без продакшена.
+
+    Пример:
+        with MockZabbixServer(MockDataset(hosts=5000), latency=0.02) as server:
+            api = API(url=server.url, user="Admin", password="zabbix")
+            ...
+            print(server.mock.snapshot())
+
+    Args:
+        dataset: MockDataset (по умолчанию - с параметрами по умолчанию)
+        host, port: Адрес; port=0 - любой свободный
+        остальные - как у MockZabbix
+    """
+
+    def __init__(self, dataset=None, host='127.0.0.1', port=0, **options):
+        self.mock = MockZabbix(dataset or MockDataset(), **options)
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self.mock
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api_jsonrpc.php"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Локальный mock-сервер Zabbix API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--hosts', type=int, default=1000)
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--events-per-day', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0, help="Задержка ответа, секунды")
+    parser.add_argument('--page-limit', type=int, default=None, help="Максимум объектов в ответе")
+    parser.add_argument('--capacity', type=int, default=None,
+                        help="Одновременных запросов без замедления (сверх вдвое большего - 503)")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    dataset = MockDataset(hosts=args.hosts, groups=args.groups, events_per_day=args.events_per_day,
+                          days=args.days, seed=args.seed)
+    server = MockZabbixServer(dataset, host=args.host, port=args.port,
+                              latency=args.latency, page_limit=args.page_limit, capacity=args.capacity)
+    print(f"Mock Zabbix API: {server.url} {dataset.summary()}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,125 @@
+import copy
+import time
+
+from api_metrics import ApiMetrics
+
+
+# Профили полей (output/select*) для тяжелых запросов: сервер отдает только то,
+# что читает потребитель, а не "extend". Профиль - имя из таблицы ниже или свой
+# словарь с ключами output/select*.
+
+# Поля event.get, которые читает ZabbixEventCache (value - для follow)
+_EVENT_FIELDS = ['eventid', 'clock', 'value', 'severity', 'objectid', 'r_eventid']
+
+EVENT_PROFILES = {
+    # Время, severity и хосты: SLA, простой, MTTR (event_stats.py)
+    'minimal': {
+        'output': _EVENT_FIELDS,
+        'selectHosts': ['hostid']
+    },
+    # Все, что сохраняет кэш событий и выводит отчет
+    'report': {
+        'output': _EVENT_FIELDS + ['name', 'acknowledged'],
+        'selectHosts': ['hostid'],
+        'selectTags': ['tag', 'value']
+    },
+    # Прежнее поведение get_events(details=True)
+    'full': {
+        'output': 'extend',
+        'selectHosts': 'extend',
+        'selectTags': 'extend',
+        'selectAcknowledges': 'extend'
+    }
+}
+
+HOSTGROUP_PROFILES = {
+    # Только состав групп
+    'minimal': {
+        'output': ['groupid'],
+        'selectHosts': ['hostid']
+    },
+    # Поля хоста, которые хранит кэш структуры (make_cache.py)
+    'report': {
+        'output': ['groupid'],
+        'selectHosts': ['hostid', 'host', 'name', 'status', 'flags', 'proxy_hostid']
+    },
+    # Прежнее поведение get_hostgroup_hosts_v64
+    'full': {
+        'selectHosts': 'extend'
+    }
+}
+
+PROFILES = {
+    'event.get': EVENT_PROFILES,
+    'hostgroup.get': HOSTGROUP_PROFILES
+}
+
+
+def projection(method, profile):
+    """
+    Параметры output/select* для method по профилю.
+
+    Args:
+        method: 'event.get' или 'hostgroup.get'
+        profile: Имя профиля ('minimal', 'report', 'full') или свой словарь,
+                 например {'output': ['eventid', 'clock'], 'selectHosts': ['hostid']}
+
+    Returns:
+        Новый словарь параметров (его можно менять)
+    """
+    if isinstance(profile, dict):
+        unknown = [key for key in profile if key != 'output' and not key.startswith('select')]
+        if unknown:
+            raise ValueError(f"В профиле допустимы только output и select*: {', '.join(unknown)}")
+        return copy.deepcopy(profile)
+
+    profiles = PROFILES.get(method, {})
+    if profile not in profiles:
+        raise ValueError(f"Неизвестный профиль {profile!r} для {method}, есть: {', '.join(profiles)}")
+    return copy.deepcopy(profiles[profile])
+
+# -------------------------------------------------------------------------------------------
+
+
+def measure_profiles(api, kind, profiles=None, **query):
+    """
+    Выполняет один и тот же запрос с каждым профилем и сравнивает объем ответов.
+
+    Args:
+        api: API
+        kind: 'events' (get_events) или 'hostgroup_hosts' (get_hostgroup_hosts_v64)
+        profiles: Список имен профилей и/или {имя: свой словарь} (по умолчанию все стандартные)
+        query: Остальные параметры метода (time_from/time_till, groups и т.п.)
+
+    С включенным api.enable_cache() get_hostgroup_hosts_v64 может ответить из кэша
+    и показать 0 байт - замерять лучше без него.
+
+    Returns:
+        {профиль: {'bytes': ..., 'items': ..., 'seconds': ..., 'saved': доля байт,
+                   сэкономленная относительно 'full' (None, если full не замерялся)}}
+    """
+    if kind == 'events':
+        method, call = 'event.get', api.get_events
+    elif kind == 'hostgroup_hosts':
+        method, call = 'hostgroup.get', api.get_hostgroup_hosts_v64
+    else:
+        raise ValueError(f"Неизвестный тип запроса: {kind}")
+
+    if profiles is None:
+        profiles = list(PROFILES[method])
+    if not isinstance(profiles, dict):
+        profiles = {name: name for name in profiles}
+
+    result = {}
+    for name, profile in profiles.items():
+        with ApiMetrics(api, measure_bytes=True) as metrics:
+            start = time.perf_counter()
+            call(profile=profile, **query)
+            seconds = time.perf_counter() - start
+        stats = metrics.stats()['methods'].get(method, {})
+        result[name] = {'bytes': stats.get('bytes', 0), 'items': stats.get('items', 0), 'seconds': seconds}
+
+    full = result.get('full', {}).get('bytes')
+    for stats in result.values():
+        stats['saved'] = 1 - stats['bytes'] / full if full else None
+    return result
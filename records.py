@@ -0,0 +1,277 @@
+import sys
+
+
+# Компактные типизированные результаты методов API (режим typed=True).
+# id, clock и severity хранятся как int, повторяющиеся строки (имена проблем,
+# теги, макросы) интернируются. Контейнеры - обычные dict с int-ключами,
+# to_dict() возвращает прежнюю вложенную структуру со строками.
+
+
+def _int(value, default=0):
+    if value is None or value == '':
+        return default
+    return int(value)
+
+
+def _str(value):
+    return '' if value is None else str(value)
+
+
+class _Record:
+    __slots__ = ()
+
+    def _asdict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._asdict() == other._asdict()
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+# -------------------------------------------------------------------------------------------
+
+
+class Acknowledge(_Record):
+    __slots__ = ('acknowledgeid', 'userid', 'clock', 'action', 'message', 'old_severity', 'new_severity')
+
+    def __init__(self, acknowledgeid, userid, clock, action, message, old_severity=None, new_severity=None):
+        self.acknowledgeid = acknowledgeid
+        self.userid = userid
+        self.clock = clock
+        self.action = action
+        self.message = message
+        self.old_severity = old_severity
+        self.new_severity = new_severity
+
+    def to_dict(self):
+        return {
+            'message': self.message,
+            'clock': str(self.clock),
+            'userid': str(self.userid),
+            'action': str(self.action),
+            'old_severity': _str(self.old_severity),
+            'new_severity': _str(self.new_severity)
+        }
+
+
+class Problem(_Record):
+    __slots__ = ('eventid', 'objectid', 'clock', 'severity', 'name', 'acknowledged', 'acknowledges')
+
+    def __init__(self, eventid, objectid, clock, severity, name, acknowledged=False, acknowledges=()):
+        self.eventid = eventid
+        self.objectid = objectid
+        self.clock = clock
+        self.severity = severity
+        self.name = name
+        self.acknowledged = acknowledged
+        self.acknowledges = acknowledges
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'clock': str(self.clock),
+            'severity': str(self.severity),
+            'objectid': str(self.objectid),
+            'acknowledged': '1' if self.acknowledged else '0',
+            'acknowledges': {str(ack.acknowledgeid): ack.to_dict() for ack in self.acknowledges}
+        }
+
+
+class HostTagSet(_Record):
+    """Теги хоста: кортеж пар (tag, value)"""
+    __slots__ = ('hostid', 'tags')
+
+    def __init__(self, hostid, tags=()):
+        self.hostid = hostid
+        self.tags = tags
+
+    def get(self, tag, default=None):
+        for name, value in self.tags:
+            if name == tag:
+                return value
+        return default
+
+    def to_dict(self):
+        return {'tags': {tag: {'value': value} for tag, value in self.tags}}
+
+
+class HostMacroSet(_Record):
+    """Макросы хоста: кортеж пар (macro, value)"""
+    __slots__ = ('hostid', 'macros')
+
+    def __init__(self, hostid, macros=()):
+        self.hostid = hostid
+        self.macros = macros
+
+    def get(self, macro, default=None):
+        for name, value in self.macros:
+            if name == macro:
+                return value
+        return default
+
+    def to_dict(self):
+        return {'macro': {macro: {'value': value} for macro, value in self.macros}}
+
+
+class UserGroup(_Record):
+    __slots__ = ('usrgrpid', 'name', 'userids')
+
+    def __init__(self, usrgrpid, name, userids=()):
+        self.usrgrpid = usrgrpid
+        self.name = name
+        self.userids = userids
+
+# -------------------------------------------------------------------------------------------
+
+
+class Map(dict):
+    """Контейнер типизированных записей; to_dict() у наследников - прежняя структура"""
+    __slots__ = ()
+
+
+class ProblemMap(Map):
+    """{eventid: Problem}"""
+    __slots__ = ()
+
+    def to_dict(self):
+        return {str(eventid): problem.to_dict() for eventid, problem in self.items()}
+
+
+class HostTagMap(Map):
+    """{hostid: HostTagSet}"""
+    __slots__ = ()
+
+    def to_dict(self):
+        if not self:
+            return {}
+        return {'host': {str(hostid): tags.to_dict() for hostid, tags in self.items()}}
+
+
+class HostMacroMap(Map):
+    """{hostid: HostMacroSet}"""
+    __slots__ = ()
+
+    def to_dict(self):
+        if not self:
+            return {}
+        return {'host': {str(hostid): macros.to_dict() for hostid, macros in self.items()}}
+
+
+class UserGroupMap(Map):
+    """{usrgrpid: UserGroup}"""
+    __slots__ = ()
+
+    def groups_of(self, userid):
+        """usrgrpid групп, в которые входит пользователь"""
+        return [group.usrgrpid for group in self.values() if userid in group.userids]
+
+    def to_dict(self):
+        result = {'usrgrp': {}, 'users': {}}
+        for usrgrpid, group in self.items():
+            groupid = str(usrgrpid)
+            result['usrgrp'][groupid] = {
+                'name': group.name,
+                'users': {str(userid): {'exist': True} for userid in group.userids}
+            }
+            for userid in group.userids:
+                result['users'].setdefault(str(userid), {'usrgrp': {}})['usrgrp'][groupid] = {'exist': True}
+        return result
+
+# -------------------------------------------------------------------------------------------
+# Разбор ответов Zabbix API в типизированные записи.
+# Отбор записей тот же, что у _parse_* в zabbix_api.py.
+
+
+PROBLEM_FIELDS = frozenset(['name', 'clock', 'severity', 'eventid', 'objectid'])
+ACKNOWLEDGE_FIELDS = frozenset(['acknowledgeid', 'message', 'clock', 'userid', 'action'])
+
+
+def parse_problems(problems):
+    result = ProblemMap()
+    intern = sys.intern
+
+    for problem in problems:
+        if not PROBLEM_FIELDS <= problem.keys():
+            continue
+
+        acknowledges = []
+        for acknowledge in problem.get('acknowledges') or ():
+            if ACKNOWLEDGE_FIELDS <= acknowledge.keys():
+                acknowledges.append(Acknowledge(
+                    int(acknowledge['acknowledgeid']),
+                    int(acknowledge['userid']),
+                    int(acknowledge['clock']),
+                    int(acknowledge['action']),
+                    acknowledge['message'],
+                    _int(acknowledge.get('old_severity'), None),
+                    _int(acknowledge.get('new_severity'), None)
+                ))
+
+        eventid = int(problem['eventid'])
+        result[eventid] = Problem(
+            eventid,
+            int(problem['objectid']),
+            int(problem['clock']),
+            int(problem['severity']),
+            intern(problem['name']),
+            str(problem.get('acknowledged')) == '1',
+            tuple(acknowledges)
+        )
+
+    return result
+
+
+def parse_host_tags(host_data):
+    result = HostTagMap()
+    intern = sys.intern
+
+    for host in host_data:
+        if 'hostid' in host and 'tags' in host:
+            hostid = int(host['hostid'])
+            result[hostid] = HostTagSet(hostid, tuple(
+                (intern(tag['tag']), intern(tag['value']))
+                for tag in host['tags'] if 'tag' in tag and 'value' in tag
+            ))
+
+    return result
+
+
+def parse_usermacro(macros):
+    pairs = {}
+    intern = sys.intern
+
+    for macro in macros:
+        if 'hostid' in macro and 'macro' in macro and 'value' in macro:
+            pairs.setdefault(int(macro['hostid']), []).append((intern(macro['macro']), intern(macro['value'])))
+
+    return HostMacroMap((hostid, HostMacroSet(hostid, tuple(items))) for hostid, items in pairs.items())
+
+
+def parse_usergroup(usergroups):
+    result = UserGroupMap()
+
+    for usergroup in usergroups:
+        if not all(key in usergroup for key in ['usrgrpid', 'name', 'users']):
+            continue
+
+        usrgrpid = int(usergroup['usrgrpid'])
+        users = usergroup['users'] if isinstance(usergroup['users'], list) else []
+        userids = tuple(dict.fromkeys(int(user['userid']) for user in users
+                                      if isinstance(user, dict) and 'userid' in user))
+
+        if usrgrpid in result:
+            userids = tuple(dict.fromkeys(result[usrgrpid].userids + userids))
+        else:
+            result[usrgrpid] = UserGroup(usrgrpid, sys.intern(usergroup['name']))
+        result[usrgrpid].userids = userids
+
+    return result
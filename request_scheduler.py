@@ -0,0 +1,156 @@
+import random
+import socket
+import threading
+from http.client import HTTPException
+from urllib.error import HTTPError, URLError
+
+from zabbix_utils import APIRequestError, ProcessingError
+
+
+# Управление нагрузкой на Zabbix API: адаптивный предел числа одновременных
+# запросов (AIMD) и повторы временных ошибок с экспоненциальной задержкой
+# и случайным разбросом. Предел частоты (запросов в секунду) - RateLimiter
+# в zabbix_api.py, они применяются вместе. Повторы выполняются только в
+# API._attempt: каждая попытка занимает место в пределе и учитывается в нем один раз.
+
+# HTTP-коды, при которых запрос имеет смысл повторить
+TRANSIENT_HTTP_CODES = {429, 500, 502, 503, 504}
+
+# Ошибки Zabbix API, вызванные нагрузкой на базу, а не самим запросом
+TRANSIENT_API_ERRORS = ('sql statement execution has failed', 'deadlock', 'lock wait timeout')
+
+
+def is_transient(error):
+    """
+    Временная ли ошибка: обрыв или отказ соединения, таймаут, 429/5xx от веб-сервера,
+    не-JSON ответ (страница ошибки прокси), перегрузка базы Zabbix.
+    """
+    if isinstance(error, APIRequestError):
+        message = str(error).lower()
+        return any(marker in message for marker in TRANSIENT_API_ERRORS)
+
+    if isinstance(error, ProcessingError):
+        # zabbix_utils оборачивает URLError и ошибку разбора JSON через "raise ... from None":
+        # исходная ошибка остается в __context__
+        error = error.__context__
+        if isinstance(error, ValueError):
+            return True
+
+    if isinstance(error, HTTPError):
+        return error.code in TRANSIENT_HTTP_CODES
+    return isinstance(error, (URLError, socket.timeout, TimeoutError, ConnectionError, HTTPException))
+
+
+def backoff_delay(attempt, base=0.5, cap=10.0):
+    """
+    Задержка перед повтором attempt (0, 1, ...): случайная в [0, base * 2**attempt],
+    но не больше cap. Разброс не дает потокам и процессам повторять одновременно.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+# -------------------------------------------------------------------------------------------
+
+
+class AdaptiveConcurrency:
+    """
+    Предел одновременных запросов, подстраиваемый по задержке и ошибкам (AIMD).
+
+    Пока ответы приходят быстро, предел растет примерно на 1 за каждый "круг"
+    из limit запросов (и только если он действительно выбран). Временная ошибка
+    или ответ дольше порога уменьшают предел в backoff раз. Порог - tolerance
+    минимальных задержек метода (они разные у apiinfo.version и host.get на 1000
+    хостов) или latency_target, если он задан. После снижения ответы на запросы,
+    отправленные до него, предел повторно не снижают.
+
+    Пример:
+        limiter = AdaptiveConcurrency(max_limit=16)
+        token = limiter.acquire()
+        start = time.perf_counter()
+        ... запрос ...
+        limiter.release(token, 'host.get', time.perf_counter() - start, overloaded=False)
+
+    Args:
+        initial: Начальный предел
+        min_limit, max_limit: Границы предела
+        latency_target: Задержка (сек), выше которой сервер считается перегруженным
+        tolerance: Во сколько раз задержка может превысить минимальную для метода
+        backoff: Множитель предела при перегрузке
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=32, latency_target=None, tolerance=3.0, backoff=0.5):
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError("Нужно 1 <= min_limit <= max_limit")
+
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self._limit = float(min(max(initial, min_limit), max_limit))
+        self._in_flight = 0
+        self._epoch = 0
+        # Минимальная задержка по методам, медленно "всплывает" к текущей
+        self._baseline = {}
+        self._cond = threading.Condition()
+        self._stats = {'requests': 0, 'overloaded': 0, 'increases': 0, 'decreases': 0,
+                       'max_in_flight': 0, 'waits': 0}
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def acquire(self):
+        """Ждет свободного места; возвращает метку для release()"""
+        with self._cond:
+            if self._in_flight >= int(self._limit):
+                self._stats['waits'] += 1
+                while self._in_flight >= int(self._limit):
+                    self._cond.wait()
+            self._in_flight += 1
+            self._stats['max_in_flight'] = max(self._stats['max_in_flight'], self._in_flight)
+            # Запрос "выбрал" предел, если вместе с ним занято все место
+            return self._epoch, self._in_flight >= int(self._limit)
+
+    def release(self, token, method, elapsed, overloaded=False):
+        """
+        Args:
+            token: Результат acquire()
+            elapsed: Время ответа, сек (None - не учитывать задержку)
+            overloaded: Запрос завершился временной ошибкой
+        """
+        epoch, saturated = token
+        with self._cond:
+            self._in_flight -= 1
+            self._stats['requests'] += 1
+
+            if not overloaded and elapsed is not None:
+                overloaded = self._slow(method, elapsed)
+
+            if overloaded:
+                self._stats['overloaded'] += 1
+                if epoch == self._epoch:
+                    self._limit = max(float(self.min_limit), self._limit * self.backoff)
+                    self._epoch += 1
+                    self._stats['decreases'] += 1
+            elif saturated and self._limit < self.max_limit:
+                self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+                self._stats['increases'] += 1
+
+            self._cond.notify_all()
+
+    def _slow(self, method, elapsed):
+        baseline = self._baseline.get(method)
+        if baseline is None or elapsed < baseline:
+            self._baseline[method] = elapsed
+        else:
+            self._baseline[method] = baseline + (elapsed - baseline) * 0.01
+
+        if self.latency_target is not None and elapsed > self.latency_target:
+            return True
+        # Для быстрых методов кратное превышение - это еще шум, нужен и абсолютный запас
+        return baseline is not None and elapsed > max(baseline * self.tolerance, baseline + 0.05)
+
+    def stats(self):
+        """{'limit', 'in_flight', 'requests', 'overloaded', 'increases', 'decreases', 'max_in_flight', 'waits'}"""
+        with self._cond:
+            return dict(self._stats, limit=self.limit, in_flight=self._in_flight)
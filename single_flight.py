@@ -0,0 +1,174 @@
+import asyncio
+import copy
+import json
+import threading
+
+
+# Объединение одновременных одинаковых запросов (single-flight): пока запрос
+# с тем же методом и параметрами выполняется, повторные не уходят в Zabbix,
+# а ждут его и получают тот же результат (или то же исключение).
+# Объединяются только чтения: *.get и apiinfo.version.
+
+
+def is_coalescable(method):
+    return method.endswith('.get') or method == 'apiinfo.version'
+
+
+def make_key(method, params):
+    """Ключ запроса: метод и параметры с упорядоченными ключами словарей"""
+    return json.dumps([method, params], sort_keys=True, default=str)
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self, done):
+        self.done = done
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class _Counters:
+    #Счетчики по методам: calls - ушло в Zabbix, coalesced - получили чужой результат
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._methods = {}
+
+    def add(self, method, key):
+        with self._lock:
+            stats = self._methods.setdefault(method, {'calls': 0, 'coalesced': 0})
+            stats[key] += 1
+
+    def stats(self):
+        with self._lock:
+            methods = {method: dict(stats) for method, stats in self._methods.items()}
+        return {
+            'calls': sum(stats['calls'] for stats in methods.values()),
+            'coalesced': sum(stats['coalesced'] for stats in methods.values()),
+            'methods': methods
+        }
+
+    def reset(self):
+        with self._lock:
+            self._methods = {}
+
+
+class SingleFlight:
+    """
+    Single-flight для потоков.
+
+    Ожидающие получают копию результата: вызывающий код может менять
+    полученные списки и словари, не затрагивая других.
+
+    Пример:
+        flights = SingleFlight()
+        result = flights.do('host.get', params, lambda: send('host.get', params))
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._counters = _Counters()
+
+    def do(self, method, params, call):
+        key = make_key(method, params)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight(threading.Event())
+            else:
+                flight.waiters += 1
+
+        if not leader:
+            self._counters.add(method, 'coalesced')
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+
+        self._counters.add(method, 'calls')
+        try:
+            flight.result = call()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                # Копия для ожидающих снимается до того, как лидер вернет результат наверх
+                if flight.waiters and flight.error is None:
+                    flight.result = copy.deepcopy(flight.result)
+            flight.done.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+    def stats(self):
+        """{'calls': ..., 'coalesced': ..., 'methods': {метод: {'calls', 'coalesced'}}}"""
+        return self._counters.stats()
+
+    def reset_stats(self):
+        self._counters.reset()
+
+
+class AsyncSingleFlight:
+    """
+    Single-flight для asyncio (в пределах одного event loop).
+
+    Пример:
+        result = await flights.do('host.get', params, lambda: send('host.get', params))
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._counters = _Counters()
+
+    async def do(self, method, params, call):
+        key = make_key(method, params)
+        flight = self._flights.get(key)
+        while flight is not None:
+            flight.waiters += 1
+            self._counters.add(method, 'coalesced')
+            try:
+                # shield: отмена одного ожидающего не отменяет общий запрос
+                result = await asyncio.shield(flight.done)
+            except asyncio.CancelledError:
+                if not flight.done.cancelled():
+                    raise
+                # Отменен лидер, а не этот вызов: первый проснувшийся становится
+                # новым лидером, остальные ждут уже его
+                flight = self._flights.get(key)
+            else:
+                return copy.deepcopy(result)
+
+        flight = self._flights[key] = _Flight(asyncio.get_running_loop().create_future())
+        self._counters.add(method, 'calls')
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            flight.done.cancel()
+            raise
+        except BaseException as e:
+            flight.done.set_exception(e)
+            # Исключение получат ожидающие; если их нет - не предупреждать о нем
+            flight.done.exception()
+            raise
+        else:
+            flight.done.set_result(copy.deepcopy(result) if flight.waiters else result)
+            return result
+        finally:
+            del self._flights[key]
+
+    def in_flight(self):
+        return len(self._flights)
+
+    def stats(self):
+        return self._counters.stats()
+
+    def reset_stats(self):
+        self._counters.reset()
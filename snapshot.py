@@ -0,0 +1,214 @@
+import fcntl
+import json
+import os
+import re
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class FileLock:
+    """
+    Advisory-блокировка файла (flock). Ядро снимает ее само, когда процесс-владелец
+    завершается, поэтому упавший запуск не блокирует следующие, в отличие от PID-файла.
+    В файл пишется PID владельца - только для диагностики.
+
+    Пример:
+        with FileLock("/tmp/zabbix/pid/cron_make_cache.lock") as lock:
+            if not lock:
+                return  # уже выполняется
+    """
+
+    def __init__(self, path, blocking=False):
+        self.path = Path(path)
+        self.blocking = blocking
+        self._fd = None
+
+    def acquire(self, blocking=None):
+        """
+        Returns:
+            True, если блокировка получена; False, если ее держит другой процесс
+        """
+        if self._fd is not None:
+            return True
+        blocking = self.blocking if blocking is None else blocking
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        except Exception:
+            os.close(fd)
+            raise
+
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    @property
+    def locked(self):
+        return self._fd is not None
+
+    def holder(self):
+        """PID последнего владельца (по содержимому файла) или None"""
+        try:
+            return int(self.path.read_text().strip() or 0) or None
+        except (IOError, ValueError):
+            return None
+
+    def __bool__(self):
+        return self.locked
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+# -------------------------------------------------------------------------------------------
+
+
+class SnapshotStore:
+    """
+    Версионные снимки файла с атомарной публикацией.
+
+    Писатель пишет во временный файл, после fsync переименовывает его в
+    directory/snapshots/<name>.<версия><suffix> и атомарно переставляет
+    ссылку directory/<name><suffix> на новую версию. Читатель в любой момент
+    открывает последний полностью записанный снимок и не ждет пересборки;
+    уже открытый снимок остается доступен, даже если его удалят при очистке.
+
+    Args:
+        directory: Каталог (ссылка на последний снимок лежит в нем)
+        name: Имя снимка, например 'zabbix_local'
+        suffix: Расширение, например '.cache'
+        keep: Сколько последних версий хранить
+    """
+
+    VERSION_DIGITS = 6
+
+    def __init__(self, directory, name, suffix='', keep=5):
+        self.directory = Path(directory)
+        self.name = name
+        self.suffix = suffix
+        self.keep = max(int(keep), 1)
+        self.snapshot_dir = self.directory / 'snapshots'
+        self.link = self.directory / f"{name}{suffix}"
+        self._pattern = re.compile(rf"^{re.escape(name)}\.(\d+){re.escape(suffix)}$")
+
+    def versions(self):
+        """Список (версия, путь) по возрастанию версии"""
+        if not self.snapshot_dir.is_dir():
+            return []
+        result = []
+        for path in self.snapshot_dir.iterdir():
+            match = self._pattern.match(path.name)
+            if match:
+                result.append((int(match.group(1)), path))
+        return sorted(result)
+
+    def latest(self):
+        """
+        Путь к последнему опубликованному снимку или None.
+        Если каталог еще в старом виде (обычный файл без snapshots/) - этот файл.
+        """
+        if self.link.is_symlink():
+            target = self.link.resolve()
+            if target.exists():
+                return target
+        elif self.link.is_file():
+            return self.link
+
+        versions = self.versions()
+        return versions[-1][1] if versions else None
+
+    def load_json(self):
+        """Содержимое последнего снимка (JSON) или None, если снимка нет"""
+        path = self.latest()
+        if path is None:
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    @contextmanager
+    def writer(self, mode='w'):
+        """
+        Файл для записи новой версии. Публикуется только при выходе из with без
+        исключения; при ошибке временный файл удаляется, прежний снимок не меняется.
+
+        Пример:
+            with store.writer() as f:
+                json.dump(data, f)
+        """
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.snapshot_dir / f".{self.name}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, mode) as f:
+                yield f
+                f.flush()
+                os.fsync(f.fileno())
+            self.publish(tmp_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def publish(self, source):
+        """
+        Публикует готовый файл source как новую версию (source переименовывается).
+
+        Returns:
+            Путь к новой версии
+        """
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        versions = self.versions()
+        version = versions[-1][0] + 1 if versions else 1
+        target = self.snapshot_dir / f"{self.name}.{version:0{self.VERSION_DIGITS}d}{self.suffix}"
+        os.replace(source, target)
+
+        # Ссылка относительная, чтобы каталог можно было переносить целиком
+        tmp_link = self.directory / f".{self.name}{self.suffix}.{os.getpid()}.link"
+        if tmp_link.is_symlink() or tmp_link.exists():
+            tmp_link.unlink()
+        os.symlink(os.path.relpath(target, self.directory), tmp_link)
+        os.replace(tmp_link, self.link)
+        _fsync_dir(self.snapshot_dir)
+        _fsync_dir(self.directory)
+
+        self.prune()
+        return target
+
+    def prune(self):
+        """Удаляет старые версии, кроме keep последних и текущей"""
+        current = self.latest()
+        for _, path in self.versions()[:-self.keep]:
+            if path != current:
+                try:
+                    path.unlink()
+                except OSError as e:
+                    print(f"Не удалось удалить старый снимок {path}: {e}")
+
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
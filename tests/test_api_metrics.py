@@ -0,0 +1,33 @@
+import json
+import unittest
+
+from api_metrics import ApiMetrics
+
+
+class ApiMetricsTest(unittest.TestCase):
+
+    def test_counters_and_histogram(self):
+        metrics = ApiMetrics(buckets=(0.1, 1.0))
+        metrics('host.get', 0.05, [{'hostid': '1'}, {'hostid': '2'}], None, False)
+        metrics('host.get', 0.5, None, ConnectionError("down"), True)
+
+        stats = metrics.stats()['methods']['host.get']
+        self.assertEqual({key: stats[key] for key in ('calls', 'errors', 'retries', 'items', 'bytes')},
+                         {'calls': 2, 'errors': 1, 'retries': 1, 'items': 2, 'bytes': 0})
+        self.assertEqual(stats['latency_max'], 0.5)
+
+    def test_bytes_are_utf8_size(self):
+        metrics = ApiMetrics(measure_bytes=True)
+        result = [{'hostid': '1', 'name': "Сервер базы данных"}]
+        metrics('host.get', 0.01, result, None, False)
+        metrics('event.get', 0.01, None, ConnectionError("down"), False)
+
+        methods = metrics.stats()['methods']
+        expected = len(json.dumps(result, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        self.assertEqual(methods['host.get']['bytes'], expected)
+        self.assertLess(methods['host.get']['bytes'], len(json.dumps(result, separators=(',', ':'))))
+        self.assertEqual(methods['event.get']['bytes'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
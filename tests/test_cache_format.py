@@ -0,0 +1,90 @@
+import contextlib
+import io
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from cache_format import ColumnarFormat, JsonFormat, convert_cache_dir, read_events
+
+
+EVENTS = [
+    {
+        'problem': {
+            'eventid': '101', 'name': "High CPU on host", 'clock': 1700000000, 'objectid': '501',
+            'severity': '4', 'r_eventid': '102', 'acknowledged': '1',
+            'hosts': ['10001', '10002'],
+            'tags': [{'tag': 'env', 'value': 'prod'}, {'tag': 'service', 'value': 'Сервис'}]
+        },
+        'recovery': {'eventid': '102', 'clock': 1700000600},
+        'duration': 600
+    },
+    {
+        'problem': {
+            'eventid': '103', 'name': None, 'clock': 1700000100, 'objectid': '502',
+            'severity': None, 'r_eventid': None, 'acknowledged': '0',
+            'hosts': [], 'tags': []
+        }
+    },
+]
+
+
+class ColumnarFormatTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = Path(tempfile.mkdtemp(prefix='zabbix-test-'))
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        self.path = self.workdir / 'events-2023-11-14.evc'
+        ColumnarFormat().write(self.path, EVENTS)
+
+    def test_round_trip(self):
+        self.assertEqual(ColumnarFormat().read(self.path), EVENTS)
+        self.assertEqual(read_events(self.path), EVENTS)
+
+    def test_columns_without_copy(self):
+        with ColumnarFormat().open(self.path) as events:
+            self.assertEqual(len(events), 2)
+            self.assertEqual(list(events.columns['clock']), [1700000000, 1700000100])
+            self.assertEqual(events.event(1), EVENTS[1])
+
+    def test_empty_file(self):
+        path = self.workdir / 'events-2023-11-15.evc'
+        ColumnarFormat().write(path, [])
+        self.assertTrue(ColumnarFormat().is_valid(path))
+        self.assertEqual(read_events(path), [])
+
+    def test_crc_detects_corruption(self):
+        fmt = ColumnarFormat()
+        self.assertTrue(fmt.is_valid(self.path))
+
+        data = bytearray(self.path.read_bytes())
+        data[fmt.HEADER.size + 3] ^= 0xFF
+        self.path.write_bytes(bytes(data))
+
+        self.assertFalse(fmt.is_valid(self.path))
+        # Без checksum проверяются только заголовок и размер
+        self.assertTrue(fmt.is_valid(self.path, checksum=False))
+
+    def test_truncated_file_is_invalid(self):
+        data = self.path.read_bytes()
+        self.path.write_bytes(data[:-1])
+        self.assertFalse(ColumnarFormat().is_valid(self.path, checksum=False))
+
+        self.path.write_bytes(data[:5])
+        self.assertFalse(ColumnarFormat().is_valid(self.path))
+        with self.assertRaises(ValueError):
+            ColumnarFormat().open(self.path)
+
+    def test_convert_cache_dir(self):
+        self.path.unlink()
+        JsonFormat().write(self.workdir / 'events-2023-11-14.json', EVENTS)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(convert_cache_dir(self.workdir), 1)
+            self.assertEqual(convert_cache_dir(self.workdir), 0)
+
+        self.assertEqual(read_events(self.path), EVENTS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import contextlib
+import io
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from cache_loader import CacheLoader, load_file, parsed_path, prune_parsed
+
+
+def _quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+class ParsedCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = Path(tempfile.mkdtemp(prefix='zabbix-test-'))
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        self.path = self.workdir / 'zabbix_local.cache'
+        self.data = {'host': {'all': {'10001': {'name': "Хост", 'groups': ['1']}}}, 'n': [1, 2.5, None, True]}
+        self.path.write_text(json.dumps(self.data))
+
+    def test_parsed_form_is_reused(self):
+        self.assertEqual(load_file(self.path), self.data)
+        parsed = parsed_path(self.path)
+        self.assertEqual(parsed.suffix, '.marshal')
+        self.assertEqual(os.stat(parsed).st_mode & 0o777, 0o600)
+
+        # Пока подпись исходника та же, читается разобранная форма
+        stat = self.path.stat()
+        self.path.write_text(json.dumps({'changed': 1}).ljust(stat.st_size))
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(load_file(self.path), self.data)
+
+        self.path.write_text(json.dumps({'changed': 2}))
+        self.assertEqual(load_file(self.path), {'changed': 2})
+
+    def test_writable_parsed_file_is_ignored(self):
+        load_file(self.path)
+        parsed = parsed_path(self.path)
+        stat = self.path.stat()
+        self.path.write_text(json.dumps({'changed': 1}).ljust(stat.st_size))
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        for target, mode in ((parsed, 0o622), (parsed.parent, 0o777)):
+            with self.subTest(target=target.name):
+                os.chmod(target, mode)
+                with _quiet() as output:
+                    self.assertEqual(load_file(self.path), {'changed': 1})
+                self.assertIn("другим пользователям", output.getvalue())
+                os.chmod(target, 0o600 if target == parsed else 0o700)
+
+    def test_pickle_is_never_loaded(self):
+        class Exploit:
+            def __reduce__(self):
+                return (Path(self.workdir / 'owned').touch, ())
+
+        Exploit.workdir = self.workdir
+        legacy = self.workdir / '.parsed' / f"{self.path.name}.pickle"
+        legacy.parent.mkdir()
+        legacy.write_bytes(pickle.dumps(Exploit()))
+
+        self.assertEqual(load_file(self.path), self.data)
+        self.assertFalse((self.workdir / 'owned').exists())
+        self.assertEqual(prune_parsed(self.workdir), 1)
+        self.assertFalse(legacy.exists())
+        self.assertTrue(parsed_path(self.path).exists())
+
+    def test_loader_workers(self):
+        paths = []
+        for i in range(3):
+            path = self.workdir / f"events-2024-01-0{i + 1}.json"
+            path.write_text(json.dumps([{'problem': {'eventid': str(i)}}]))
+            paths.append(path)
+
+        with CacheLoader(workers=2) as loader:
+            loaded = list(loader.iter_files(paths))
+        self.assertEqual([(path, events[0]['problem']['eventid']) for path, events in loaded],
+                         [(path, str(i)) for i, path in enumerate(paths)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import contextlib
+import io
+import json
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+from event_cache import ZabbixEventCache
+from mock_zabbix import MockDataset, MockZabbixServer
+from zabbix_api import API
+
+
+def _quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def _date(days_ago):
+    return datetime.fromtimestamp(ZabbixEventCache._get_day_start(days_ago)).strftime('%Y-%m-%d')
+
+
+class FollowPartialTest(unittest.TestCase):
+    """Дни, записанные слежением, помечаются неполными и пересоздаются run()"""
+
+    def setUp(self):
+        self.dataset = MockDataset(hosts=30, groups=3, days=2, events_per_day=200)
+        self.server = MockZabbixServer(self.dataset).start()
+        self.addCleanup(self.server.stop)
+        self.workdir = Path(tempfile.mkdtemp(prefix='zabbix-test-'))
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        with _quiet():
+            self.api = API(url=self.server.url, user="Admin", password="zabbix")
+
+    def _cache(self, name):
+        return ZabbixEventCache(self.api, self.workdir / name, days_to_cache=2)
+
+    def _follow_from(self, cache, clock):
+        # Курсор по времени: слежение начинается с clock, а не с начала сегодняшнего дня
+        checkpoint = cache.cache_dir / "follow.checkpoint.json"
+        checkpoint.write_text(json.dumps({'eventid': None, 'clock': clock, 'open': {}}))
+        with _quiet():
+            self.assertTrue(cache.follow(interval=0, max_polls=1))
+
+    def test_follow_marks_new_days_and_run_rebuilds_them(self):
+        cache = self._cache('follow')
+        self._follow_from(cache, ZabbixEventCache._get_day_start(1) + 43200)
+
+        yesterday = _date(1)
+        self.assertTrue(cache._day_file(yesterday).exists())
+        self.assertTrue(cache._partial_marker(yesterday).exists())
+        # Метки не попадают в выборки дневных файлов
+        self.assertEqual([p for p in cache.cache_dir.glob('events-*') if 'partial' in p.name], [])
+
+        with _quiet():
+            cache.run()
+            self._cache('clean').run()
+
+        self.assertFalse(cache._partial_marker(yesterday).exists())
+        self.assertEqual(cache._day_file(yesterday).read_text(),
+                         (self.workdir / 'clean' / cache._day_file(yesterday).name).read_text())
+
+    def test_follow_does_not_mark_complete_day(self):
+        cache = self._cache('follow')
+        with _quiet():
+            cache.run()
+        self.assertTrue(cache._day_file(_date(1)).exists())
+
+        self._follow_from(cache, ZabbixEventCache._get_day_start(1))
+
+        self.assertFalse(cache._partial_marker(_date(1)).exists())
+        self.assertFalse(cache._partial_marker(_date(2)).exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
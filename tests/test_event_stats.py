@@ -0,0 +1,87 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from cache_format import ColumnarFormat
+from event_stats import EventFrame, EventStats
+
+
+T = 1700000000
+
+
+def _event(eventid, clock, severity, hosts, recovery_clock=None, acknowledged='0'):
+    event = {'problem': {'eventid': str(eventid), 'clock': T + clock, 'severity': str(severity),
+                         'acknowledged': acknowledged, 'hosts': hosts, 'tags': []}}
+    if recovery_clock is not None:
+        event['recovery'] = {'eventid': str(eventid + 1), 'clock': T + recovery_clock}
+        event['duration'] = recovery_clock - clock
+    return event
+
+
+# Хост 10001: [0, 100] и [50, 250], хост 10002: [50, 250] и открытая с 500
+EVENTS = [
+    _event(1, 0, 2, ['10001'], recovery_clock=100, acknowledged='1'),
+    _event(3, 50, 4, ['10001', '10002'], recovery_clock=250),
+    _event(5, 500, 4, ['10002']),
+]
+
+HOSTGROUPS = {
+    '1': {'name': "All", 'hosts': ['10001', '10002']},
+    '2': {'name': "Second", 'hosts': ['10002']},
+}
+
+
+class EventStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.frame = EventFrame.from_events(EVENTS)
+        self.stats = EventStats(self.frame, time_from=T, time_till=T + 1000, hostgroups=HOSTGROUPS)
+
+    def test_summary(self):
+        summary = self.stats.summary()
+        self.assertEqual(
+            {key: summary[key] for key in ('problems', 'recovered', 'open', 'acknowledged', 'downtime', 'mttr', 'hosts')},
+            {'problems': 3, 'recovered': 2, 'open': 1, 'acknowledged': 1, 'downtime': 800, 'mttr': 150.0, 'hosts': 2})
+        self.assertEqual(summary['p50'], 150.0)
+        self.assertEqual(summary['p90'], np.percentile([100, 200], 90))
+
+    def test_by_severity(self):
+        self.assertEqual([(row['severity'], row['problems']) for row in self.stats.by_severity()], [(2, 1), (4, 2)])
+
+    def test_by_host_sla_uses_union_of_intervals(self):
+        rows = self.stats.by_host()
+        self.assertEqual([(row['hostid'], row['downtime']) for row in rows], [('10002', 700), ('10001', 300)])
+        self.assertAlmostEqual(rows[0]['sla'], 30.0)
+        self.assertAlmostEqual(rows[1]['sla'], 75.0)
+
+    def test_by_hostgroup_counts_event_once(self):
+        rows = {row['groupid']: row for row in self.stats.by_hostgroup()}
+        self.assertEqual((rows['1']['problems'], rows['1']['hosts'], rows['2']['problems']), (3, 2, 2))
+        self.assertAlmostEqual(rows['1']['sla'], 52.5)
+        self.assertAlmostEqual(rows['2']['sla'], 30.0)
+
+    def test_select(self):
+        self.assertEqual(list(self.frame.select(min_severity=4).eventid), [3, 5])
+        selected = self.frame.select(hostids=['10001'])
+        self.assertEqual(list(selected.eventid), [1, 3])
+        self.assertEqual(list(zip(selected.host_event, selected.host_id)), [(0, 10001), (1, 10001), (1, 10002)])
+
+    def test_daily_downtime_matches_summary(self):
+        rows = self.stats.daily(window=2)
+        self.assertEqual(sum(row['downtime'] for row in rows), 800)
+        self.assertEqual(sum(row['problems'] for row in rows), 3)
+
+    def test_from_columnar_matches_from_events(self):
+        workdir = Path(tempfile.mkdtemp(prefix='zabbix-test-'))
+        self.addCleanup(shutil.rmtree, workdir, True)
+        ColumnarFormat().write(workdir / 'events-2023-11-14.evc', EVENTS)
+        frame = EventFrame.from_cache_dir(workdir)
+        for name, _ in EventFrame.EVENT_COLUMNS + (('host_event', ''), ('host_id', '')):
+            self.assertEqual(list(getattr(frame, name)), list(getattr(self.frame, name)), name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from cache_format import ColumnarFormat
+from event_store import EventStore
+
+
+def _event(eventid, clock, severity, hosts, tags, recovery_clock=None):
+    event = {
+        'problem': {
+            'eventid': str(eventid), 'name': f"Problem {eventid}", 'clock': clock,
+            'objectid': str(eventid + 1000), 'severity': str(severity), 'r_eventid': None,
+            'acknowledged': '0', 'hosts': hosts,
+            'tags': [{'tag': tag, 'value': value} for tag, value in tags]
+        }
+    }
+    if recovery_clock is not None:
+        event['problem']['r_eventid'] = str(eventid + 1)
+        event['recovery'] = {'eventid': str(eventid + 1), 'clock': recovery_clock}
+        event['duration'] = recovery_clock - clock
+    return event
+
+
+# Теги - в порядке (tag, value): так их возвращает хранилище
+EVENTS = [
+    _event(1, 100, 2, ['10001'], [('env', 'prod')], recovery_clock=160),
+    _event(3, 200, 4, ['10001', '10002'], [('DP', 'dp01'), ('env', 'prod')]),
+    _event(5, 300, 5, ['10003'], [('env', 'dev')], recovery_clock=900),
+]
+
+
+class EventStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = Path(tempfile.mkdtemp(prefix='zabbix-test-'))
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        self.store = EventStore(self.workdir / 'events.sqlite')
+        self.addCleanup(self.store.close)
+        self.store.upsert_events(EVENTS)
+
+    def _ids(self, **filters):
+        return [event['problem']['eventid'] for event in self.store.query(**filters)]
+
+    def test_round_trip(self):
+        self.assertEqual(list(self.store.query(batch_size=2)), EVENTS)
+
+    def test_filters(self):
+        self.assertEqual(self._ids(time_from=150, time_till=300), ['3', '5'])
+        self.assertEqual(self._ids(hostids=['10001']), ['1', '3'])
+        self.assertEqual(self._ids(min_severity=4), ['3', '5'])
+        self.assertEqual(self._ids(severities=[2, 5]), ['1', '5'])
+        self.assertEqual(self._ids(tags={'env': 'prod', 'DP': None}), ['3'])
+        self.assertEqual(self.store.count(tags={'env': None}), 3)
+
+    def test_upsert_replaces_hosts_and_tags(self):
+        changed = _event(3, 200, 4, ['10004'], [('env', 'stage')], recovery_clock=260)
+        self.assertEqual(self.store.upsert_events([changed, {'problem': {}}]), 1)
+
+        self.assertEqual(self.store.count(), 3)
+        self.assertEqual(self._ids(hostids=['10002']), [])
+        self.assertEqual(list(self.store.query(hostids=['10004'])), [changed])
+
+    def test_import_cache_dir(self):
+        ColumnarFormat().write(self.workdir / 'events-2023-11-14.evc', EVENTS)
+        with EventStore(self.workdir / 'imported.sqlite') as store:
+            self.assertEqual(store.import_cache_dir(self.workdir), 3)
+            self.assertEqual(list(store.query()), EVENTS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import random
+import unittest
+
+from host_index import HostIndex, build_host_index
+
+
+def _snapshot(hosts=300, seed=7):
+    rnd = random.Random(seed)
+    work = {'host': {'all': {}, 'hostgroup': {}}}
+    for i in range(hosts):
+        hostid = str(10001 + i)
+        host = {
+            'tags': {tag: {'value': rnd.choice(values)}
+                     for tag, values in (('env', ['prod', 'stage', 'dev']), ('service', ['web', 'db']))
+                     if rnd.random() < 0.8},
+            'macro': {'{$OWNER}': {'value': f"team{rnd.randint(1, 3)}"}} if rnd.random() < 0.5 else {},
+        }
+        work['host']['all'][hostid] = host
+        for groupid in rnd.sample(['1', '2', '3', '4'], rnd.randint(1, 2)):
+            work['host']['hostgroup'].setdefault(groupid, {'host': {}})['host'][hostid] = {}
+    return work
+
+
+class HostIndexTest(unittest.TestCase):
+    """Запросы к индексу совпадают с прямым перебором хостов"""
+
+    def setUp(self):
+        self.work = _snapshot()
+        self.hosts = self.work['host']['all']
+        self.index = HostIndex.from_cache(self.work)
+
+    def _where(self, predicate):
+        return sorted(hostid for hostid, host in self.hosts.items() if predicate(hostid, host))
+
+    def _tag(self, tag, value=None):
+        return lambda hostid, host: tag in host['tags'] and value in (None, host['tags'][tag]['value'])
+
+    def _group(self, groupid):
+        return lambda hostid, host: hostid in self.work['host']['hostgroup'][groupid]['host']
+
+    def test_single_conditions(self):
+        self.assertEqual(self.index.tag('env', 'prod').hostids(), self._where(self._tag('env', 'prod')))
+        self.assertEqual(self.index.tag('env').hostids(), self._where(self._tag('env')))
+        self.assertEqual(self.index.group('2').hostids(), self._where(self._group('2')))
+        self.assertEqual(self.index.macro('{$OWNER}', 'team1').hostids(),
+                         self._where(lambda h, host: host['macro'].get('{$OWNER}', {}).get('value') == 'team1'))
+        self.assertEqual(len(self.index.tag('missing')), 0)
+
+    def test_set_operations(self):
+        prod, web, group = self._tag('env', 'prod'), self._tag('service', 'web'), self._group('1')
+
+        self.assertEqual((self.index.tag('env', 'prod') & self.index.tag('service', 'web')).hostids(),
+                         self._where(lambda h, host: prod(h, host) and web(h, host)))
+        self.assertEqual((self.index.tag('env', 'prod') | self.index.group('1')).hostids(),
+                         self._where(lambda h, host: prod(h, host) or group(h, host)))
+        self.assertEqual((self.index.group('1') - self.index.tag('service', 'web')).hostids(),
+                         self._where(lambda h, host: group(h, host) and not web(h, host)))
+        self.assertEqual((~self.index.tag('env')).hostids(), self._where(lambda h, host: 'env' not in host['tags']))
+
+    def test_select(self):
+        self.assertEqual(self.index.select(tags={'env': 'dev', 'service': None}, groups=['3']).hostids(),
+                         self._where(lambda h, host: self._tag('env', 'dev')(h, host)
+                                     and self._tag('service')(h, host) and self._group('3')(h, host)))
+        self.assertEqual(self.index.select(macros=['{$OWNER}'], groups=['4'], mode='or').hostids(),
+                         self._where(lambda h, host: '{$OWNER}' in host['macro'] or self._group('4')(h, host)))
+        self.assertEqual(self.index.select(), self.index.all())
+        with self.assertRaises(ValueError):
+            self.index.select(tags={'env': None}, mode='xor')
+
+    def test_stored_index_matches_rebuilt(self):
+        self.work['index'] = build_host_index(self.work)
+        stored = HostIndex.from_cache(self.work)
+        self.assertEqual(stored.tag('env', 'stage'), self.index.tag('env', 'stage'))
+        self.assertIn('10001', stored.all())
+        self.assertEqual(stored.tag_values('service'),
+                         {value: len(self._where(self._tag('service', value))) for value in ('web', 'db')})
+
+
+if __name__ == '__main__':
+    unittest.main()
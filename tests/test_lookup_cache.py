@@ -0,0 +1,107 @@
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import records
+from lookup_cache import LookupCache, SqliteCacheBackend
+
+
+class LookupCacheTest(unittest.TestCase):
+
+    def test_hit_miss_and_copy(self):
+        cache = LookupCache()
+        key = LookupCache.make_key('get_hostgroup_id', ['Linux'], {})
+        self.assertEqual(cache.get('get_hostgroup_id', key), (False, None))
+
+        value = ['15']
+        cache.set('get_hostgroup_id', key, value)
+        value.append('changed')
+        found, cached = cache.get('get_hostgroup_id', key)
+        cached.append('changed too')
+
+        self.assertEqual((found, cache.get('get_hostgroup_id', key)[1]), (True, ['15']))
+        self.assertEqual(cache.stats()['methods']['get_hostgroup_id'],
+                         {'hits': 2, 'misses': 1, 'hit_rate': 0.667})
+
+    def test_ttl(self):
+        cache = LookupCache(ttl={'get_hostgroup_id': 0.05, 'get_usergroup': 0})
+        self.assertFalse(cache.enabled('get_usergroup'))
+        self.assertFalse(cache.enabled('get_problem'))
+
+        key = LookupCache.make_key('get_hostgroup_id', ['Linux'], {})
+        cache.set('get_hostgroup_id', key, '15')
+        self.assertTrue(cache.get('get_hostgroup_id', key)[0])
+        time.sleep(0.06)
+        self.assertFalse(cache.get('get_hostgroup_id', key)[0])
+
+    def test_lru_limit(self):
+        cache = LookupCache(maxsize=2)
+        keys = [LookupCache.make_key('get_hostgroup_id', [name], {}) for name in ('a', 'b', 'c')]
+        cache.set('get_hostgroup_id', keys[0], '1')
+        cache.set('get_hostgroup_id', keys[1], '2')
+        cache.get('get_hostgroup_id', keys[0])
+        cache.set('get_hostgroup_id', keys[2], '3')
+
+        self.assertEqual([cache.get('get_hostgroup_id', key)[0] for key in keys], [True, False, True])
+        self.assertEqual(cache.stats()['size'], 2)
+
+    def test_scope_and_argument_order(self):
+        make_key = LookupCache.make_key
+        self.assertEqual(make_key('m', [], {'a': 1, 'b': 2}, scope=('url', 'user')),
+                         make_key('m', [], {'b': 2, 'a': 1}, scope=('url', 'user')))
+        self.assertNotEqual(make_key('m', [], {}, scope=('url', 'user')),
+                            make_key('m', [], {}, scope=('url', 'other')))
+
+    def test_invalidate_method(self):
+        cache = LookupCache()
+        group = LookupCache.make_key('get_hostgroup_id', ['Linux'], {})
+        users = LookupCache.make_key('get_usergroup', [], {})
+        cache.set('get_hostgroup_id', group, '15')
+        cache.set('get_usergroup', users, {})
+
+        cache.invalidate('get_hostgroup_id')
+        self.assertEqual((cache.get('get_hostgroup_id', group)[0], cache.get('get_usergroup', users)[0]),
+                         (False, True))
+        cache.invalidate()
+        self.assertEqual(cache.stats()['size'], 0)
+
+
+class SqliteBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        workdir = Path(tempfile.mkdtemp(prefix='zabbix-test-'))
+        self.addCleanup(shutil.rmtree, workdir, True)
+        self.backend = SqliteCacheBackend(workdir / 'lookup.sqlite')
+        self.addCleanup(self.backend.close)
+
+    def _cache(self):
+        return LookupCache(backend=self.backend)
+
+    def test_typed_value_stays_in_memory(self):
+        # typed-записи не должны возвращаться из общего хранилища обычными dict
+        writer = self._cache()
+        for value in (records.UserGroupMap(), records.parse_usergroup(
+                [{'usrgrpid': '7', 'name': "Admins", 'users': [{'userid': '1'}]}])):
+            with self.subTest(size=len(value)):
+                key = LookupCache.make_key('get_usergroup', [], {'typed': True})
+                writer.set('get_usergroup', key, value)
+
+                found, cached = writer.get('get_usergroup', key)
+                self.assertTrue(found)
+                self.assertIs(type(cached), records.UserGroupMap)
+                self.assertEqual(self._cache().get('get_usergroup', key), (False, None))
+
+    def test_plain_value_shared_through_backend(self):
+        key = LookupCache.make_key('get_usergroup', [], {})
+        value = {'usrgrp': {'7': {'name': "Admins", 'users': {}}}, 'users': {}}
+        self._cache().set('get_usergroup', key, value)
+        self.assertEqual(self._cache().get('get_usergroup', key), (True, value))
+
+        self._cache().invalidate('get_usergroup')
+        self.assertEqual(self._cache().get('get_usergroup', key), (False, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
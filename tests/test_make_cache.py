@@ -0,0 +1,138 @@
+import contextlib
+import io
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from make_cache import ZabbixCache
+from mock_zabbix import MockDataset, MockZabbixServer
+from zabbix_api import API
+
+
+def _quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def _down(params):
+    raise ValueError("database is down")
+
+
+class IncrementalCacheTest(unittest.TestCase):
+    """Инкрементальное обновление кэша структуры против mock-сервера"""
+
+    def setUp(self):
+        self.dataset = MockDataset(hosts=60, groups=5, days=1, events_per_day=10)
+        self.server = MockZabbixServer(self.dataset).start()
+        self.addCleanup(self.server.stop)
+        self.workdir = Path(tempfile.mkdtemp(prefix='zabbix-test-'))
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        with _quiet():
+            self.api = API(url=self.server.url, user="Admin", password="zabbix")
+
+    def _cache(self, **options):
+        return ZabbixCache(self.api, cache_dir=self.workdir / 'cache', pid_dir=self.workdir / 'pid', **options)
+
+    def _refresh(self, cache):
+        self.server.mock.reset_stats()
+        with _quiet():
+            self.assertTrue(cache.make_cache(incremental=True))
+        with open(cache.changes_file) as f:
+            return json.loads(f.readlines()[-1])
+
+    def _snapshot(self, cache):
+        with open(cache.cache_file) as f:
+            return json.load(f)
+
+    def test_quiet_fleet_does_not_refetch_hosts(self):
+        cache = self._cache()
+        with _quiet():
+            self.assertTrue(cache.make_cache())
+
+        changes = self._refresh(cache)
+
+        self.assertEqual(changes['mode'], 'audit')
+        self.assertEqual(changes['host'], {'added': [], 'removed': [], 'modified': []})
+        # Только список hostid, данные хостов не запрашиваются
+        self.assertEqual(self.server.mock.snapshot()['methods']['host.get'], 1)
+
+    def test_added_removed_modified(self):
+        cache = self._cache()
+        with _quiet():
+            cache.make_cache()
+
+        self.dataset.update_host('10005', name="Renamed host")
+        self.dataset.remove_host('10007')
+        added = self.dataset.add_host()
+        changes = self._refresh(cache)
+
+        self.assertEqual(changes['mode'], 'audit')
+        self.assertEqual(changes['host'], {'added': [added], 'removed': ['10007'], 'modified': ['10005']})
+        hosts = self._snapshot(cache)['host']['all']
+        self.assertEqual(hosts['10005']['name'], "Renamed host")
+        self.assertNotIn('10007', hosts)
+        self.assertIn(added, hosts)
+
+    def test_unaudited_change_found_on_fingerprint_schedule(self):
+        cache = self._cache(fingerprint_every=2)
+        with _quiet():
+            cache.make_cache()
+
+        self.dataset.update_host('10003', audit=False, status='1' if self.dataset.hosts_by_id['10003']['status'] == '0' else '0')
+        first = self._refresh(cache)
+        second = self._refresh(cache)
+
+        self.assertEqual((first['mode'], first['host']['modified']), ('audit', []))
+        self.assertEqual((second['mode'], second['host']['modified']), ('fingerprint', ['10003']))
+
+    def test_disabled_audit_falls_back_to_fingerprint(self):
+        self.dataset.audit.clear()
+        cache = self._cache()
+        with _quiet():
+            cache.make_cache()
+
+        self.dataset.update_host('10004', audit=False, name="Changed")
+        changes = self._refresh(cache)
+
+        self.assertEqual(changes['mode'], 'fingerprint')
+        self.assertEqual(changes['host']['modified'], ['10004'])
+
+    def test_fingerprint_ignores_snapshot_profile(self):
+        for profile in ('minimal', 'report'):
+            with self.subTest(profile=profile):
+                cache = self._cache(profile=profile, fingerprint_every=1)
+                with _quiet():
+                    cache.make_cache()
+                self.assertEqual(self._refresh(cache)['host']['modified'], [])
+
+                tags = [{'tag': 'env', 'value': profile}]
+                self.dataset.update_host('10002', audit=False, _tags=tags)
+                changes = self._refresh(cache)
+
+                self.assertEqual((changes['mode'], changes['host']['modified']), ('fingerprint', ['10002']))
+                host = self._snapshot(cache)['host']['all']['10002']
+                self.assertEqual(host['tags'], {'env': {'value': profile}})
+
+    def test_full_build_fails_without_users(self):
+        cache = self._cache()
+        self.server.mock._usergroup_get = _down
+        with _quiet():
+            self.assertFalse(cache.make_cache())
+        self.assertFalse(cache.cache_file.exists())
+
+    def test_incremental_keeps_previous_users(self):
+        cache = self._cache()
+        with _quiet():
+            cache.make_cache()
+        users = self._snapshot(cache)['users']
+
+        self.server.mock._usergroup_get = _down
+        self._refresh(cache)
+
+        self.assertTrue(users)
+        self.assertEqual(self._snapshot(cache)['users'], users)
+
+
+if __name__ == '__main__':
+    unittest.main()
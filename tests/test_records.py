@@ -0,0 +1,80 @@
+import pickle
+import unittest
+
+import records
+from zabbix_api import _parse_host_tags, _parse_problems, _parse_usergroup, _parse_usermacro
+
+
+PROBLEMS = [
+    {
+        'eventid': '101', 'objectid': '501', 'clock': '1700000000', 'severity': '4',
+        'name': "High CPU", 'acknowledged': '1',
+        'acknowledges': [
+            {'acknowledgeid': '7', 'userid': '3', 'clock': '1700000100', 'action': '6',
+             'message': "ack", 'old_severity': '2', 'new_severity': '4'},
+            {'acknowledgeid': '8', 'userid': '3', 'clock': '1700000200', 'action': '2', 'message': ""},
+        ]
+    },
+    {'eventid': '102', 'objectid': '502', 'clock': '1700000300', 'severity': '1',
+     'name': "Disk", 'acknowledged': '0', 'acknowledges': []},
+    # Неполная запись пропускается
+    {'eventid': '103', 'clock': '1700000400'},
+]
+
+HOSTS = [
+    {'hostid': '10001', 'tags': [{'tag': 'env', 'value': 'prod'}, {'tag': 'DP', 'value': 'dp01'}]},
+    {'hostid': '10002', 'tags': []},
+    {'hostid': '10003'},
+]
+
+MACROS = [
+    {'hostid': '10001', 'macro': '{$OWNER}', 'value': 'team1'},
+    {'hostid': '10001', 'macro': '{$CPU.UTIL.CRIT}', 'value': '90'},
+    {'hostid': '10002', 'macro': '{$OWNER}', 'value': 'team2'},
+]
+
+USERGROUPS = [
+    {'usrgrpid': '7', 'name': "Admins", 'users': [{'userid': '1'}, {'userid': '2'}]},
+    {'usrgrpid': '8', 'name': "Guests", 'users': [{'userid': '2'}]},
+    {'usrgrpid': '7', 'name': "Admins", 'users': [{'userid': '3'}]},
+    {'usrgrpid': '9', 'name': "Broken"},
+]
+
+
+class RecordsTest(unittest.TestCase):
+    """Типизированный разбор совпадает с прежним после to_dict()"""
+
+    def test_problems(self):
+        problems = records.parse_problems(PROBLEMS)
+        self.assertEqual(problems.to_dict(), _parse_problems(PROBLEMS))
+        self.assertEqual(problems[101].acknowledges[0].new_severity, 4)
+        self.assertTrue(problems[101].acknowledged)
+
+    def test_host_tags(self):
+        tags = records.parse_host_tags(HOSTS)
+        self.assertEqual(tags.to_dict(), _parse_host_tags(HOSTS))
+        self.assertEqual(tags[10001].get('env'), 'prod')
+        self.assertEqual(records.parse_host_tags([]).to_dict(), _parse_host_tags([]))
+
+    def test_usermacro(self):
+        macros = records.parse_usermacro(MACROS)
+        self.assertEqual(macros.to_dict(), _parse_usermacro(MACROS))
+        self.assertEqual(macros[10002].get('{$OWNER}'), 'team2')
+
+    def test_usergroup(self):
+        groups = records.parse_usergroup(USERGROUPS)
+        self.assertEqual(groups.to_dict(), _parse_usergroup(USERGROUPS))
+        self.assertEqual(groups[7].userids, (1, 2, 3))
+        self.assertEqual(groups.groups_of(2), [7, 8])
+
+    def test_pickle(self):
+        for value in (records.parse_problems(PROBLEMS), records.parse_host_tags(HOSTS),
+                      records.parse_usermacro(MACROS), records.parse_usergroup(USERGROUPS)):
+            with self.subTest(type=type(value).__name__):
+                restored = pickle.loads(pickle.dumps(value))
+                self.assertIs(type(restored), type(value))
+                self.assertEqual(restored, value)
+
+
+if __name__ == '__main__':
+    unittest.main()
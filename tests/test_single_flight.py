@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from single_flight import AsyncSingleFlight, SingleFlight, is_coalescable, make_key
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def _run(self, flights, call, threads=5, params=None):
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            futures = [pool.submit(flights.do, 'host.get', params or {'output': ['hostid']}, call)
+                       for _ in range(threads)]
+            return [future.result() for future in futures]
+
+    def test_concurrent_calls_are_coalesced(self):
+        flights = SingleFlight()
+        calls = []
+
+        def call():
+            calls.append(1)
+            time.sleep(0.1)
+            return [{'hostid': '1'}]
+
+        results = self._run(flights, call)
+
+        self.assertEqual(results, [[{'hostid': '1'}]] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flights.stats()['methods']['host.get'], {'calls': 1, 'coalesced': 4})
+        self.assertEqual(flights.in_flight(), 0)
+
+    def test_waiters_get_their_own_copy(self):
+        flights = SingleFlight()
+        started = threading.Event()
+
+        def call():
+            started.set()
+            time.sleep(0.1)
+            return {'hosts': []}
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            leader = pool.submit(flights.do, 'host.get', {}, call)
+            started.wait()
+            waiter = pool.submit(flights.do, 'host.get', {}, call)
+            leader, waiter = leader.result(), waiter.result()
+
+        leader['hosts'].append('changed')
+        self.assertEqual(waiter, {'hosts': []})
+
+    def test_error_is_shared(self):
+        flights = SingleFlight()
+
+        def call():
+            time.sleep(0.1)
+            raise ConnectionError("down")
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(flights.do, 'host.get', {}, call) for _ in range(3)]
+            for future in futures:
+                with self.assertRaises(ConnectionError):
+                    future.result()
+        self.assertEqual(flights.in_flight(), 0)
+
+    def test_key_and_methods(self):
+        self.assertEqual(make_key('host.get', {'a': 1, 'b': [2]}), make_key('host.get', {'b': [2], 'a': 1}))
+        self.assertNotEqual(make_key('host.get', {'a': 1}), make_key('item.get', {'a': 1}))
+        self.assertTrue(is_coalescable('event.get'))
+        self.assertTrue(is_coalescable('apiinfo.version'))
+        self.assertFalse(is_coalescable('host.update'))
+
+
+class AsyncSingleFlightTest(unittest.TestCase):
+
+    def test_concurrent_calls_are_coalesced(self):
+        flights = AsyncSingleFlight()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return [{'hostid': '1'}]
+
+        async def run():
+            return await asyncio.gather(*(flights.do('host.get', {}, call) for _ in range(4)))
+
+        results = asyncio.run(run())
+
+        self.assertEqual(results, [[{'hostid': '1'}]] * 4)
+        results[0][0]['hostid'] = 'changed'
+        self.assertEqual(results[1], [{'hostid': '1'}])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flights.stats()['coalesced'], 3)
+
+    def test_waiters_survive_leader_cancel(self):
+        # Отмена лидера не должна отменять ожидающих его вызовов
+        flights = AsyncSingleFlight()
+        calls = []
+
+        async def call():
+            calls.append(len(calls))
+            await asyncio.sleep(0.05)
+            return {'call': calls[-1]}
+
+        async def run():
+            leader = asyncio.create_task(flights.do('host.get', {}, call))
+            await asyncio.sleep(0)
+            waiters = [asyncio.create_task(flights.do('host.get', {}, call)) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            results = await asyncio.gather(*waiters)
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return results
+
+        results = asyncio.run(run())
+
+        # Один из ожидающих повторил запрос, остальные получили его результат
+        self.assertEqual(results, [{'call': 1}] * 3)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(flights.in_flight(), 0)
+
+    def test_cancelled_waiter_does_not_cancel_leader(self):
+        flights = AsyncSingleFlight()
+
+        async def call():
+            await asyncio.sleep(0.05)
+            return 'ok'
+
+        async def run():
+            leader = asyncio.create_task(flights.do('host.get', {}, call))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(flights.do('host.get', {}, call))
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            return await leader
+
+        self.assertEqual(asyncio.run(run()), 'ok')
+
+
+if __name__ == '__main__':
+    unittest.main()
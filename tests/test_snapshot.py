@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from snapshot import FileLock, SnapshotStore
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class FileLockTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = Path(tempfile.mkdtemp(prefix='zabbix-test-'))
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        self.path = self.workdir / 'pid' / 'job.lock'
+
+    def test_second_holder_is_refused(self):
+        with FileLock(self.path) as first:
+            self.assertTrue(first)
+            self.assertEqual(first.holder(), os.getpid())
+            with FileLock(self.path) as second:
+                self.assertFalse(second)
+        with FileLock(self.path) as third:
+            self.assertTrue(third)
+
+    def test_lock_released_when_holder_dies(self):
+        holder = subprocess.Popen(
+            [sys.executable, '-c',
+             "import sys, time; from snapshot import FileLock; "
+             f"lock = FileLock({str(self.path)!r}); lock.acquire(); print('locked', flush=True); time.sleep(60)"],
+            cwd=ROOT, stdout=subprocess.PIPE, text=True)
+        self.addCleanup(holder.wait)
+        self.addCleanup(holder.kill)
+        self.assertEqual(holder.stdout.readline().strip(), 'locked')
+
+        lock = FileLock(self.path)
+        self.assertFalse(lock.acquire())
+        self.assertEqual(lock.holder(), holder.pid)
+
+        holder.kill()
+        holder.wait()
+        holder.stdout.close()
+        self.assertTrue(lock.acquire())
+        lock.release()
+
+
+class SnapshotStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = Path(tempfile.mkdtemp(prefix='zabbix-test-'))
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        self.store = SnapshotStore(self.workdir, 'zabbix_local', '.cache', keep=2)
+
+    def _write(self, data):
+        with self.store.writer() as f:
+            json.dump(data, f)
+
+    def test_publish_and_prune(self):
+        self.assertIsNone(self.store.load_json())
+        for version in range(1, 5):
+            self._write({'version': version})
+
+        self.assertEqual(self.store.load_json(), {'version': 4})
+        self.assertTrue(self.store.link.is_symlink())
+        self.assertEqual([version for version, _ in self.store.versions()], [3, 4])
+
+    def test_failed_write_keeps_previous_snapshot(self):
+        self._write({'version': 1})
+        with self.assertRaises(RuntimeError):
+            with self.store.writer() as f:
+                f.write('{"broken": ')
+                raise RuntimeError("build failed")
+
+        self.assertEqual(self.store.load_json(), {'version': 1})
+        self.assertEqual(len(self.store.versions()), 1)
+        self.assertEqual(list(self.store.snapshot_dir.glob('.*.tmp')), [])
+
+    def test_open_snapshot_survives_new_version(self):
+        self._write({'version': 1})
+        with open(self.store.latest()) as f:
+            self._write({'version': 2})
+            self._write({'version': 3})
+            self.assertEqual(json.load(f), {'version': 1})
+
+    def test_legacy_plain_file(self):
+        self.store.link.write_text(json.dumps({'legacy': True}))
+        self.assertEqual(self.store.load_json(), {'legacy': True})
+        self._write({'version': 1})
+        self.assertEqual(self.store.load_json(), {'version': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import contextlib
+import io
+import unittest
+
+from mock_zabbix import MockDataset, MockZabbixServer
+from zabbix_api import API
+
+
+def _down(params):
+    raise ValueError("database is down")
+
+
+def _deadlock(params):
+    # Временная ошибка базы: API повторяет такие запросы на чтение
+    raise ValueError("Deadlock found when trying to get lock")
+
+
+def _quiet():
+    # Методы API сообщают о ходе работы через print
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+class HostGroupMapCacheTest(unittest.TestCase):
+    """Ошибка запроса не должна попадать в кэш справочных методов"""
+
+    def setUp(self):
+        self.server = MockZabbixServer(MockDataset(hosts=40, groups=4, days=1, events_per_day=10)).start()
+        self.addCleanup(self.server.stop)
+        with _quiet():
+            self.api = API(url=self.server.url, user="Admin", password="zabbix")
+            self.api.enable_cache()
+            self.groups = self.api.get_hostgroup_list_v64()['array']
+
+    def test_recovers_after_failed_call(self):
+        self.server.mock._host_get = _down
+        with _quiet():
+            failed = self.api.get_host_group_map(self.groups)
+        self.assertEqual(failed, {'all': {}, 'hostgroup': {}, 'host_groups': {}})
+
+        del self.server.mock._host_get
+        with _quiet():
+            recovered = self.api.get_host_group_map(self.groups)
+            cached = self.api.get_host_group_map(self.groups)
+
+        self.assertEqual(len(recovered['all']), 40)
+        self.assertEqual(cached, recovered)
+        stats = self.api.cache_stats()['methods']['get_host_group_map']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_hostgroup_hosts_recovers_after_failed_call(self):
+        self.server.mock._hostgroup_get = _down
+        with _quiet():
+            failed = self.api.get_hostgroup_hosts_v64(self.groups)
+        self.assertEqual(failed['all'], {})
+
+        del self.server.mock._hostgroup_get
+        with _quiet():
+            recovered = self.api.get_hostgroup_hosts_v64(self.groups)
+        self.assertEqual(len(recovered['all']), 40)
+
+
+class EventPagingTest(unittest.TestCase):
+    """Сервер отдает меньше строк, чем запрошено: обход не должен обрываться"""
+
+    def setUp(self):
+        self.dataset = MockDataset(hosts=50, groups=5, days=2, events_per_day=600)
+        self.server = MockZabbixServer(self.dataset, page_limit=200).start()
+        self.addCleanup(self.server.stop)
+        with _quiet():
+            self.api = API(url=self.server.url, user="Admin", password="zabbix")
+        self.problems = [e for e in self.dataset.events if e['value'] == '1' and int(e['severity']) >= 1]
+
+    def test_iter_events_with_server_page_limit(self):
+        clocks = [int(e['clock']) for e in self.problems]
+        with _quiet():
+            events = list(self.api.iter_events(min(clocks), max(clocks), page_size=1000, profile='minimal'))
+
+        self.assertGreater(len(self.problems), 1000)
+        self.assertEqual(sorted(e['eventid'] for e in events), sorted(e['eventid'] for e in self.problems))
+
+    def test_iter_events_since_with_server_page_limit(self):
+        with _quiet():
+            events = list(self.api.iter_events_since(0, page_size=1000, profile='minimal'))
+
+        self.assertEqual([e['eventid'] for e in events], [e['eventid'] for e in self.problems])
+
+
+class FanOutRetryTest(unittest.TestCase):
+    """Пачка повторяется одним слоем повторов (retries), а не вложенными"""
+
+    def setUp(self):
+        self.server = MockZabbixServer(MockDataset(hosts=30, groups=3, days=1, events_per_day=10)).start()
+        self.addCleanup(self.server.stop)
+        with _quiet():
+            self.api = API(url=self.server.url, user="Admin", password="zabbix", retries=2, max_concurrency=4)
+        self.hostids = [host['hostid'] for host in self.server.mock.dataset.hosts]
+
+    def test_failing_chunks_are_sent_retries_plus_one_times(self):
+        self.server.mock._host_get = _deadlock
+        self.server.mock.reset_stats()
+        before = self.api.scheduler_stats()['requests']
+
+        with _quiet():
+            result = self.api.get_hosts_bulk(self.hostids, chunk_size=10)
+
+        self.assertEqual(result, {})
+        # 3 пачки x (1 + retries), каждая попытка - одно место в пределе AIMD
+        self.assertEqual(self.server.mock.snapshot()['methods']['host.get'], 9)
+        self.assertEqual(self.api.scheduler_stats()['requests'] - before, 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import asyncio
+import contextlib
+import io
+import unittest
+
+from mock_zabbix import MockDataset, MockZabbixServer
+from zabbix_api import PartialResultError
+from zabbix_async_api import AsyncAPI
+
+
+def _quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+class AsyncHostsBulkTest(unittest.TestCase):
+    """Ошибка одной пачки не должна отбрасывать данные остальных"""
+
+    def setUp(self):
+        self.server = MockZabbixServer(MockDataset(hosts=30, groups=3, days=1, events_per_day=10)).start()
+        self.addCleanup(self.server.stop)
+        self.hostids = [host['hostid'] for host in self.server.mock.dataset.hosts]
+        mock = self.server.mock
+        original = mock._host_get
+
+        def host_get(params):
+            # Падает только пачка с первым хостом
+            if self.hostids[0] in params.get('hostids', []):
+                raise ValueError("database is down")
+            return original(params)
+
+        mock._host_get = host_get
+
+    def _bulk(self, **options):
+        async def run():
+            async with AsyncAPI(url=self.server.url, user="Admin", password="zabbix") as api:
+                return await api.get_hosts_bulk(self.hostids, chunk_size=10, **options)
+
+        with _quiet():
+            return asyncio.run(run())
+
+    def test_partial_result(self):
+        result = self._bulk()
+        self.assertEqual(sorted(result), self.hostids[10:])
+
+    def test_strict_raises_with_partial_result(self):
+        with self.assertRaises(PartialResultError) as raised:
+            self._bulk(strict=True)
+        self.assertEqual(sorted(raised.exception.result), self.hostids[10:])
+        self.assertEqual([failure['hostids'] for failure in raised.exception.failures], [self.hostids[:10]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import contextlib
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+
+from cache_format import JsonFormat
+from daemon_client import DaemonClient, DaemonError
+from make_cache import ZabbixCache
+from mock_zabbix import MockDataset, MockZabbixServer
+from zabbix_api import API
+from zabbix_daemon import ZabbixDaemon
+
+
+def _quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def _day(days_ago):
+    return (date.today() - timedelta(days=days_ago)).isoformat()
+
+
+def _events(eventid, hosts, severity='3', recovered=False):
+    event = {'problem': {'eventid': str(eventid), 'clock': 0, 'severity': severity, 'hosts': hosts, 'tags': []}}
+    if recovered:
+        event['recovery'] = {'eventid': str(eventid + 1), 'clock': 60}
+        event['duration'] = 60
+    return [event]
+
+
+class DaemonEventDaysTest(unittest.TestCase):
+    """Дни событий в памяти - только из окна event_days"""
+
+    def setUp(self):
+        self.workdir = Path(tempfile.mkdtemp(prefix='zabbix-test-'))
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        for days_ago in range(4):
+            JsonFormat().write(self.workdir / f"events-{_day(days_ago)}.json", _events(days_ago * 10, ['10001']))
+        self.daemon = ZabbixDaemon(None, socket_path=self.workdir / 'daemon.sock',
+                                   event_dir=self.workdir, event_days=2)
+
+    def _request(self, method, **params):
+        return self.daemon.handle(json.dumps({'method': method, 'params': params}))
+
+    def test_old_days_pruned_on_events_call(self):
+        self.daemon._load_days()
+        self.assertEqual(sorted(self.daemon._days), [_day(1), _day(0)])
+
+        # Прошли сутки: окно сдвинулось, а reload никто не вызывал
+        self.daemon._recent_dates = lambda: [_day(-1), _day(0)]
+        self._request('events', date_from=_day(0))
+
+        self.assertEqual(sorted(self.daemon._days), [_day(0)])
+
+    def test_days_outside_window_are_read_but_not_kept(self):
+        response = self._request('events', date_from=_day(3), date_to=_day(2))
+        self.assertEqual([event['problem']['eventid'] for event in response['result']], ['30', '20'])
+        self.assertEqual(self.daemon._days, {})
+
+
+class DaemonProtocolTest(unittest.TestCase):
+    """Запросы клиента к демону по Unix-сокету против mock-сервера"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dataset = MockDataset(hosts=40, groups=4, days=1, events_per_day=10)
+        cls.server = MockZabbixServer(cls.dataset).start()
+        cls.workdir = Path(tempfile.mkdtemp(prefix='zabbix-test-'))
+        with _quiet():
+            cls.api = API(url=cls.server.url, user="Admin", password="zabbix")
+            ZabbixCache(cls.api, cache_dir=cls.workdir / 'cache', pid_dir=cls.workdir / 'pid').make_cache()
+        JsonFormat().write(cls.workdir / f"events-{_day(0)}.json",
+                           _events(1, ['10001'], severity='4') + _events(3, ['10002'], recovered=True))
+
+        cls.socket_path = cls.workdir / 'daemon.sock'
+        cls.daemon = ZabbixDaemon(cls.api, socket_path=cls.socket_path, cache_dir=cls.workdir / 'cache',
+                                  event_dir=cls.workdir, event_days=2)
+        cls.output = io.StringIO()
+        cls.thread = threading.Thread(target=cls._serve, daemon=True)
+        cls.thread.start()
+        client = DaemonClient(cls.socket_path, timeout=5)
+        for _ in range(100):
+            if client.available():
+                break
+            time.sleep(0.05)
+        client.close()
+
+    @classmethod
+    def _serve(cls):
+        with contextlib.redirect_stdout(cls.output):
+            cls.daemon.serve()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.daemon.stop()
+        cls.thread.join(10)
+        cls.server.stop()
+        shutil.rmtree(cls.workdir, True)
+
+    def setUp(self):
+        self.client = DaemonClient(self.socket_path, timeout=10).connect()
+        self.addCleanup(self.client.close)
+
+    def test_ping_and_stats(self):
+        self.assertEqual(self.client.call('ping'), 'pong')
+        stats = self.client.call('stats')
+        self.assertEqual(stats['structure']['hosts'], 40)
+        self.assertIn(_day(0), stats['event_days'])
+
+    def test_structure_queries(self):
+        snapshot = json.loads((self.workdir / 'cache' / 'zabbix_local.cache').read_text())
+        hosts = snapshot['host']['all']
+        prod = sorted(hostid for hostid, host in hosts.items()
+                      if host.get('tags', {}).get('env', {}).get('value') == 'prod')
+
+        self.assertEqual(self.client.call('hosts.select', tags={'env': 'prod'}), prod)
+        host = self.client.call('host', hostid=prod[0])
+        self.assertEqual((host['hostid'], host['name']), (prod[0], hosts[prod[0]]['name']))
+        self.assertEqual(len(host['group_names']), len(hosts[prod[0]]['groups']))
+        self.assertEqual(self.client.call('structure', part='hg_available'), snapshot['hg_available'])
+
+    def test_events(self):
+        events = self.client.call('events')
+        self.assertEqual([event['problem']['eventid'] for event in events], ['1', '3'])
+        self.assertEqual([e['problem']['eventid'] for e in self.client.call('events', min_severity=4)], ['1'])
+        self.assertEqual([e['problem']['eventid'] for e in self.client.call('events', open_only=True)], ['1'])
+        self.assertEqual([e['problem']['eventid'] for e in self.client.call('events', hostids=[10002])], ['3'])
+
+    def test_api_through_daemon(self):
+        self.assertEqual(sorted(self.client.api('get_host_ids')), sorted(h['hostid'] for h in self.dataset.hosts))
+
+    def test_errors_keep_connection(self):
+        with self.assertRaises(DaemonError):
+            self.client.call('unknown')
+        with self.assertRaisesRegex(DaemonError, "недоступен"):
+            self.client.api('__init__')
+        with self.assertRaises(DaemonError):
+            self.client.call('structure', part='missing')
+        self.assertEqual(self.client.call('ping'), 'pong')
+
+    def test_second_daemon_refused(self):
+        with _quiet():
+            self.assertFalse(ZabbixDaemon(self.api, socket_path=self.socket_path).serve())
+        self.assertTrue(self.socket_path.exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,491 @@
-from zabbix_utils import ZabbixAPI
+from zabbix_utils import ZabbixAPI, APIRequestError
 from configparser import ConfigParser
+from pathlib import Path
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from lookup_cache import LookupCache, SqliteCacheBackend
+from single_flight import SingleFlight, is_coalescable
+from request_scheduler import AdaptiveConcurrency, backoff_delay, is_transient
+from api_metrics import ApiMetrics
+from projection import projection
+import records
+
+
+def _resolve_credentials(url=None, token=None, user=None, password=None, creds_file=None):
+    """
+    Собирает параметры подключения из аргументов и .ini файла.
+    Общая часть для API и AsyncAPI.
+
+    Returns:
+        (url, token, user, password)
+    """
+    creds = None
+    if creds_file:
+        creds = ConfigParser()
+        if not creds.read(creds_file):
+            print(
+                f"Предупреждение: Файл конфигурации '{creds_file}' не найден или пуст.")
+            creds = None
+
+    url = url or (
+        creds.get("ZABBIX", "URL", fallback=None) if creds else None)
+    token = token or (
+        creds.get("ZABBIX", "TOKEN", fallback=None) if creds else None)
+    user = user or (
+        creds.get("ZABBIX", "LOGIN", fallback=None) if creds else None)
+    password = password or (
+        creds.get("ZABBIX", "PASSWORD", fallback=None) if creds else None)
+
+    if not url:
+        raise ValueError("Необходимо указать URL")
+    if not token and not (user and password):
+        raise ValueError(
+            "Необходимо указать токен или логин/пароль для аутентификации.")
+
+    return url, token, user, password
+
+
+def _normalize_hosts(hosts):
+    """
+    Приводит hosts к списку id.
+    Возвращает None, если хосты не указаны или их нельзя привести к списку.
+    """
+    # Проверка входных данных
+    if not hosts:
+        print("Предупреждение: Не указаны хосты")
+        return None
+
+    # Преобразуем к списку если hosts != списку если это возможно либо выдаем ошибку
+    if isinstance(hosts, str):
+        return [hosts]
+    if not isinstance(hosts, list):
+        try:
+            return [str(hosts)]
+        except:
+            print("Ошибка: hosts должен быть списком, числом или строкой")
+            return None
+    return hosts
+
+# -------------------------------------------------------------------------------------------
+# Разбор ответов Zabbix API.
+# Вынесено из методов, чтобы API и AsyncAPI строили одинаковые структуры.
+
+
+def _parse_usermacro(macros):
+    result = {}
+
+    for macro in macros:
+        if 'hostid' in macro and 'macro' in macro and 'value' in macro:
+            hostid = macro['hostid']
+            macro_name = macro['macro']
+            value = macro['value']
+
+            # Создаем структуру словаря
+            if 'host' not in result:
+                result['host'] = {}
+
+            if hostid not in result['host']:
+                result['host'][hostid] = {}
+
+            if 'macro' not in result['host'][hostid]:
+                result['host'][hostid]['macro'] = {}
+
+            if macro_name not in result['host'][hostid]['macro']:
+                result['host'][hostid]['macro'][macro_name] = {}
+
+            # Записываем значение
+            result['host'][hostid]['macro'][macro_name]['value'] = value
+
+    return result
+
+
+def _parse_host_tags(host_data):
+    result = {}
+
+    for host in host_data:
+        if 'hostid' in host and 'tags' in host:
+            hostid = host['hostid']
+            tags = host['tags']
+
+            # Создаем структуру в результатах
+            if 'host' not in result:
+                result['host'] = {}
+
+            if hostid not in result['host']:
+                result['host'][hostid] = {}
+
+            if 'tags' not in result['host'][hostid]:
+                result['host'][hostid]['tags'] = {}
+
+            # Обрабатываем каждый тег
+            for tag in tags:
+                if 'tag' in tag and 'value' in tag:
+                    tag_name = tag['tag']
+                    tag_value = tag['value']
+
+                    # Добавляем тег в структуру
+                    if tag_name not in result['host'][hostid]['tags']:
+                        result['host'][hostid]['tags'][tag_name] = {}
+
+                    result['host'][hostid]['tags'][tag_name]['value'] = tag_value
+
+    return result
+
+
+def _parse_usergroup(usergroups):
+    result = {'usrgrp': {}, 'users': {}}
+
+    for usergroup in usergroups:
+        if not all(key in usergroup for key in ['usrgrpid', 'name', 'users']):
+            continue
+
+        usergrpid = usergroup['usrgrpid']
+        name = usergroup['name']
+        users = usergroup['users']
+
+        # Инициализируем структуру группы
+        if usergrpid not in result['usrgrp']:
+            result['usrgrp'][usergrpid] = {
+                'name': name,
+                'users': {}
+            }
+
+        # Обрабатываем пользователей группы
+        if isinstance(users, list):
+            for user in users:
+                if isinstance(user, dict) and 'userid' in user:
+                    userid = user['userid']
+
+                    # Добавляем в группу
+                    result['usrgrp'][usergrpid]['users'][userid] = {
+                        'exist': True}
+
+                    # Добавляем обратную ссылку
+                    if userid not in result['users']:
+                        result['users'][userid] = {'usrgrp': {}}
+                    result['users'][userid]['usrgrp'][usergrpid] = {
+                        'exist': True}
+
+    return result
+
+
+def _parse_problems(problems):
+    result = {}
+
+    for problem in problems:
+        if not all(key in problem for key in ['name', 'clock', 'severity', 'eventid', 'objectid']):
+            continue
+
+        eventid = problem['eventid']
+        result[eventid] = {
+            'name': problem['name'],
+            'clock': problem['clock'],
+            'severity': problem['severity'],
+            'objectid': problem['objectid'],
+            'acknowledged': problem['acknowledged'],
+            'acknowledges': {}
+        }
+
+        if 'acknowledges' in problem and isinstance(problem['acknowledges'], list):
+            for acknowledge in problem['acknowledges']:
+                acknowledges_fields = ['acknowledgeid', 'message', 'clock', 'userid', 'action']
+                if all(key in acknowledge for key in acknowledges_fields):
+                    ack_id = acknowledge['acknowledgeid']
+                    result[eventid]['acknowledges'][ack_id] = {
+                        'message': acknowledge['message'],
+                        'clock': acknowledge['clock'],
+                        'userid': acknowledge['userid'],
+                        'action': acknowledge['action'],
+                        'old_severity': acknowledge.get('old_severity', ''),
+                        'new_severity': acknowledge.get('new_severity', '')
+                    }
+
+    return result
+
+
+def _parse_hostgroup_list(res):
+    array = []
+    result = {}
+
+    if isinstance(res, list) and len(res)>0: #Проверяем, что res = список и числовое значение > 0
+        for group in res:
+            if isinstance(group, dict) and "name" in group and "groupid" in group:
+                result[group["groupid"]] = {"name": group["name"]}
+                array.append(group["groupid"])
+
+    return {"hash": result, "array": array}
+
+    # dict = {}
+    #     group = {"groupid": 123, "name": "Servers"}
+    #         result = {
+    #             123: {"name": "Servers"},
+    #             456: {"name": "Workstations"},
+    # }
+
+
+def _parse_hostgroup_hosts(res):
+    result = {
+        'all': {},
+        'hostgroup': {}
+    }
+
+    if isinstance(res, list) and res:
+        for group in res:
+            if isinstance(group, dict) and 'hosts' in group and isinstance(group['hosts'], list) and 'groupid' in group:
+
+                groupid = group['groupid']
+
+                for host in group['hosts']:
+                    if not isinstance(host, dict) or 'hostid' not in host:
+                        continue
+
+                    hostid = host['hostid']
+
+                    result['all'][hostid] = _host_record(host)
+
+                    if groupid not in result['hostgroup']:
+                        result['hostgroup'][groupid] = {'host': {}}
+
+                    result['hostgroup'][groupid]['host'][hostid] = {'host': host['host']} if 'host' in host else {}
+
+    return result
+
+
+def _host_record(host):
+    #Поля хоста в кэше структуры. Профиль minimal запрашивает только hostid - тогда полей нет
+    if not all(key in host for key in ['name', 'host', 'status']):
+        return {}
+    return {
+        'host': host['host'],
+        'name': host['name'],
+        'status': host['status'],
+        'flags': host.get('flags', '0'),
+        'proxy': host.get('proxy_hostid', '0'),
+    }
+
+
+def _parse_host_group_map(host_data, groups=None):
+    """
+    Разбор host.get с selectHostGroups в структуру get_hostgroup_hosts_v64
+    и обратный индекс: {'all': ..., 'hostgroup': ..., 'host_groups': {hostid: [groupid, ...]}}.
+    groups - учитывать членство только в этих группах (None - во всех).
+    """
+    result = {
+        'all': {},
+        'hostgroup': {},
+        'host_groups': {}
+    }
+    groups = set(groups) if groups is not None else None
+
+    for host in host_data:
+        if not isinstance(host, dict) or 'hostid' not in host:
+            continue
+
+        hostid = host['hostid']
+        groupids = sorted(
+            group['groupid'] for group in host.get('hostgroups', [])
+            if 'groupid' in group and (groups is None or group['groupid'] in groups))
+        if not groupids:
+            continue
+
+        result['all'][hostid] = _host_record(host)
+        result['host_groups'][hostid] = groupids
+        member = {'host': host['host']} if 'host' in host else {}
+        for groupid in groupids:
+            result['hostgroup'].setdefault(groupid, {'host': {}})['host'][hostid] = dict(member)
+
+    return result
+
+
+def _event_projection(output, details, profile):
+    #Поля event.get: по профилю (projection.py) или, без профиля, по output/details
+    if profile is not None:
+        return projection('event.get', profile)
+
+    params = {'output': output}
+    if details:
+        params.update(
+            selectHosts="extend",
+            selectTags="extend",
+            selectAcknowledges="extend"
+        )
+    return params
+
+
+def _parse_hosts_bulk(host_data):
+    """
+    Разбор host.get с selectTags/selectHostGroups/selectMacros.
+    Теги и макросы раскладываются так же, как в get_host_tags/get_usermacro,
+    поля хоста (если запрошены) - как в get_hostgroup_hosts_v64.
+    """
+    result = {}
+
+    for host in host_data:
+        if not isinstance(host, dict) or 'hostid' not in host:
+            continue
+
+        hostid = host['hostid']
+        result[hostid] = {}
+
+        if all(key in host for key in ['name', 'host', 'status']):
+            result[hostid].update({
+                'host': host['host'],
+                'name': host['name'],
+                'status': host['status'],
+                'flags': host.get('flags', '0'),
+                'proxy': host.get('proxy_hostid', '0'),
+            })
+
+        result[hostid]['tags'] = {}
+        result[hostid]['groups'] = sorted(
+            group['groupid'] for group in host.get('hostgroups', []) if 'groupid' in group)
+
+        for tag in host.get('tags', []):
+            if 'tag' in tag and 'value' in tag:
+                result[hostid]['tags'][tag['tag']] = {'value': tag['value']}
+
+        if 'macros' in host:
+            result[hostid]['macro'] = {}
+            for macro in host['macros']:
+                if 'macro' in macro and 'value' in macro:
+                    result[hostid]['macro'][macro['macro']] = {'value': macro['value']}
+
+    return result
+
+# -------------------------------------------------------------------------------------------
+# Разбиение больших списков hostid на пачки (см. API._fan_out).
+# Размер пачки подобран по стоимости ответа: problem.get с подтверждениями
+# на хост в разы тяжелее, чем теги или макросы.
+
+FANOUT_CHUNK_SIZE = {
+    'usermacro.get': 1000,
+    'host.get': 1000,
+    'problem.get': 250
+}
+
+
+class PartialResultError(Exception):
+    """
+    Часть пачек не удалось получить и после повторов.
+
+    Attributes:
+        result: Результат по успешным пачкам (в том же виде, что и полный)
+        failures: [{'hostids': [...], 'error': исключение}, ...]
+    """
+
+    def __init__(self, method, result, failures):
+        failed = sum(len(failure['hostids']) for failure in failures)
+        super().__init__(f"{method}: не получены данные {failed} хостов ({len(failures)} пачек)")
+        self.method = method
+        self.result = result
+        self.failures = failures
+
+# -------------------------------------------------------------------------------------------
+
+
+class RateLimiter:
+    """
+    Ограничение частоты запросов (token bucket), потокобезопасное.
+    acquire() блокирует поток, пока не будет разрешен очередной запрос.
+
+    Args:
+        rate: Запросов в секунду
+        burst: Сколько запросов можно выполнить подряд без ожидания
+    """
+
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError("rate должен быть > 0")
+
+        self.rate = float(rate)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+# -------------------------------------------------------------------------------------------
+
+
+def _is_session_expired(error):
+    # Текст ошибки Zabbix при недействительной сессии отличается между версиями
+    message = str(error).lower()
+    return any(text in message for text in ('session terminated', 're-login', 'not authorised', 'not authorized'))
+
+
+class _LookupFailed(Exception):
+    """
+    Ошибка запроса в кэшируемом методе: value - пустой результат, который метод
+    возвращает вызывающему. В кэш такой результат не попадает.
+    """
+
+    def __init__(self, value):
+        super().__init__(value)
+        self.value = value
+
+
+def _memoized(method):
+    """
+    Кэширование результата метода API через self.lookup_cache (если включен
+    enable_cache() и для метода задан TTL). Метод сообщает об ошибке через
+    _LookupFailed: вызывающий получает пустое значение, а кэш - ничего, так что
+    следующий вызов снова идет на сервер.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = self.lookup_cache
+        if cache is None or not cache.enabled(name):
+            try:
+                return method(self, *args, **kwargs)
+            except _LookupFailed as e:
+                return e.value
+
+        # Без пользователя (вход по токену) область - отпечаток токена, не сам токен
+        identity = self.user or hashlib.sha256(str(self.token).encode()).hexdigest()[:16]
+        key = cache.make_key(name, args, kwargs, scope=(self.url, identity))
+        found, value = cache.get(name, key)
+        if found:
+            return value
+
+        try:
+            value = method(self, *args, **kwargs)
+        except _LookupFailed as e:
+            return e.value
+        cache.set(name, key, value)
+        return value
+
+    return wrapper
+
+# -------------------------------------------------------------------------------------------
 
 
 class API:
 
-    def __init__(self, url=None, token=None, user=None, password=None, creds_file=None):
+    def __init__(self, url=None, token=None, user=None, password=None, creds_file=None,
+                 max_rps=None, lazy=False, probe=None, session_file=None, coalesce=True,
+                 timeout=5, fanout_workers=4, max_concurrency=None,
+                 latency_target=None, retries=2):
         """
         Args:
             url: URL Zabbix API
@@ -12,72 +493,359 @@ class API:
             user: Имя пользователя Zabbix
             password: Пароль Zabbix
             creds_file: Путь к .ini файлу с кредами
+            max_rps: Предел запросов в секунду для всех вызовов этого объекта (None - без предела)
+            lazy: Подключаться при первом запросе, а не при создании объекта
+            probe: Проверочный host.get(limit=1) после входа (по умолчанию - только без lazy)
+            session_file: Файл для сохранения сессии логина/пароля между процессами.
+                          Сохраненная сессия используется повторно, а при ее истечении
+                          выполняется повторный вход.
+            coalesce: Объединять одновременные одинаковые запросы на чтение из разных
+                      потоков в один вызов Zabbix API (см. single_flight.py)
+            timeout: Таймаут HTTP-запроса к Zabbix API, секунд
+            fanout_workers: Сколько пачек большого списка хостов запрашивать параллельно
+                            (get_usermacro, get_host_tags, get_problem, get_hosts_bulk)
+            max_concurrency: Включает адаптивный предел одновременных запросов
+                             (см. request_scheduler.AdaptiveConcurrency) с этой верхней
+                             границей; пачки get_hosts_bulk и др. тогда идут в столько
+                             потоков, сколько разрешает предел (None - без предела)
+            latency_target: Задержка ответа (сек), при которой предел снижается
+            retries: Сколько раз повторять запрос на чтение при временной ошибке
+                     (обрыв соединения, таймаут, 429/5xx), с растущей задержкой;
+                     относится и к каждой пачке fanout_workers
         """
-        creds = None
-        if creds_file:
-            creds = ConfigParser()
-            if not creds.read(creds_file):
-                print(
-                    f"Предупреждение: Файл конфигурации '{creds_file}' не найден или пуст.")
-                creds = None
-
-        self.url = url or (
-            creds.get("ZABBIX", "URL", fallback=None) if creds else None)
-        self.token = token or (
-            creds.get("ZABBIX", "TOKEN", fallback=None) if creds else None)
-        self.user = user or (
-            creds.get("ZABBIX", "LOGIN", fallback=None) if creds else None)
-        self.password = password or (
-            creds.get("ZABBIX", "PASSWORD", fallback=None) if creds else None)
-
-        if not self.url:
-            raise ValueError("Необходимо указать URL")
-        if not self.token and not (self.user and self.password):
-            raise ValueError(
-                "Необходимо указать токен или логин/пароль для аутентификации.")
+        self.url, self.token, self.user, self.password = _resolve_credentials(
+            url, token, user, password, creds_file)
+
+        # Общий для всех потоков предел частоты запросов
+        self.rate_limiter = RateLimiter(max_rps) if max_rps else None
+        # Адаптивный предел одновременных запросов (AIMD), см. scheduler_stats()
+        self.scheduler = AdaptiveConcurrency(max_limit=max_concurrency, latency_target=latency_target) \
+            if max_concurrency else None
+        self.retries = retries
+
+        self.timeout = timeout
+        self.fanout_workers = max(int(fanout_workers), 1)
+
+        # Кэш результатов справочных методов, включается enable_cache()
+        self.lookup_cache = None
+        # Пишет ли Zabbix журнал аудита (см. has_audit_log), None - еще не проверялось
+        self._audit_log = None
+
+        # Объединение одновременных одинаковых запросов, счетчики - coalesce_stats()
+        self.single_flight = SingleFlight() if coalesce else None
+
+        # Хуки вызовов: hook(method, elapsed, result, error, retry), см. add_call_hook()
+        self.call_hooks = []
+        # Постоянные метрики вызовов, включаются enable_metrics()
+        self.metrics = None
+
+        self.lazy = lazy
+        self.probe = (not lazy) if probe is None else probe
+        # Сессия нужна только для входа по логину/паролю, токен и так постоянный
+        self.session_file = Path(session_file) if session_file and not self.token else None
+        self._connect_lock = threading.RLock()
+        # Номер текущей сессии: растет при каждом повторном входе
+        self._session_generation = 0
 
         # Атрибут для хранения активного подключения ZabbixAPI
         self.api = None
-        # Выполняем подключение ПРИ СОЗДАНИИ объекта
-        self._connect()
-        print(f"Успешное подключение к Zabbix API: {self.url} \n")
+        if not lazy:
+            # Выполняем подключение ПРИ СОЗДАНИИ объекта
+            self._connect()
+
+    @property
+    def api(self):
+        # В режиме lazy подключаемся при первом обращении
+        if self._api is None and self.lazy:
+            with self._connect_lock:
+                if self._api is None:
+                    try:
+                        self._connect()
+                    except ConnectionError:
+                        return None
+        return self._api
+
+    @api.setter
+    def api(self, value):
+        self._api = value
 
     def _connect(self):
         try:
             print(f"Попытка подключения к {self.url} \n")
-            self.api = ZabbixAPI(url=self.url, timeout=5)
+            self.api = ZabbixAPI(url=self.url, timeout=self.timeout)
 
             if self.token:
                 self.api.login(token=self.token)
             else:
-                self.api.login(user=self.user, password=self.password)
-                
-            # Небольшая проверка, что API живой (запросим хосты)
-            try_hosts = self.api.host.get(limit=1)
-            if try_hosts:
-                print("API доступен", "\n")
-            else:
-                print(f"Ошибка: Не удалось получить данные хостов. \n")
-                raise ConnectionError(f"Не удалось получить данные хостов. \n") 
-            
+                self._login()
+
+            if self.probe:
+                # Небольшая проверка, что API живой (запросим хосты)
+                try_hosts = self._request('host.get', limit=1)
+                if try_hosts:
+                    print("API доступен", "\n")
+                else:
+                    print(f"Ошибка: Не удалось получить данные хостов. \n")
+                    raise ConnectionError(f"Не удалось получить данные хостов. \n")
+
         except Exception as e:
             self.api = None
             error_message = f"Ошибка подключения к Zabbix {self.url} \n"
             print(error_message)
             raise ConnectionError(e) from None
 
+        print(f"Успешное подключение к Zabbix API: {self.url} \n")
+
+    def _login(self, reuse=True):
+        """
+        Вход по логину/паролю. С session_file сначала пробуем сохраненную сессию,
+        иначе входим и сохраняем новую. Сессия передается в zabbix_utils как токен:
+        так он не завершает ее при logout и она остается доступна другим процессам.
+        """
+        if not self.session_file or self.api.version < 5.4:
+            self.api.login(user=self.user, password=self.password)
+            return
+
+        sessionid = self._load_session() if reuse else None
+        if sessionid:
+            print("Используется сохраненная сессия Zabbix \n")
+        else:
+            sessionid = self.api.send_api_request(
+                'user.login',
+                {'username': self.user, 'password': self.password},
+                need_auth=False
+            ).get('result')
+            self._save_session(sessionid)
+
+        self.api.login(token=sessionid)
+
+    def _load_session(self):
+        try:
+            with open(self.session_file) as f:
+                session = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if session.get('url') != self.url or session.get('user') != self.user:
+            return None
+        return session.get('sessionid')
+
+    def _save_session(self, sessionid):
+        # Файл только для владельца, запись атомарная
+        self.session_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.session_file.with_name(f".{self.session_file.name}.{os.getpid()}.tmp")
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'url': self.url, 'user': self.user, 'sessionid': sessionid}, f)
+        os.replace(tmp_file, self.session_file)
+
+    def _relogin(self, generation):
+        with self._connect_lock:
+            # Другой поток мог уже войти заново
+            if self._session_generation != generation:
+                return
+            print("Сессия Zabbix истекла, повторный вход \n")
+            self._login(reuse=False)
+            self._session_generation += 1
+
+    def enable_cache(self, ttl=None, maxsize=1024, path=None):
+        """
+        Включает кэширование справочных методов (get_template_id_by_name,
+        get_hostgroup_id, get_hostgroup_list_v64 и др., см. lookup_cache.DEFAULT_TTL).
+
+        Args:
+            ttl: {имя метода: секунды} поверх значений по умолчанию, 0 - не кэшировать
+            maxsize: Максимум записей в памяти (LRU)
+            path: Файл SQLite для общего между процессами кэша (None - только в памяти)
+        """
+        backend = SqliteCacheBackend(path) if path else None
+        self.lookup_cache = LookupCache(ttl=ttl, maxsize=maxsize, backend=backend)
+        return self.lookup_cache
+
+    def invalidate_cache(self, method=None):
+        """Сбрасывает кэш метода (по имени) или весь кэш"""
+        if self.lookup_cache is not None:
+            self.lookup_cache.invalidate(method)
+
+    def cache_stats(self):
+        """Счетчики попаданий/промахов кэша по методам"""
+        return self.lookup_cache.stats() if self.lookup_cache is not None else {}
+
+    def coalesce_stats(self):
+        """
+        Счетчики объединения запросов: calls - ушло в Zabbix, coalesced - получили
+        результат уже выполнявшегося такого же запроса.
+        """
+        return self.single_flight.stats() if self.single_flight is not None else {}
+
+    def scheduler_stats(self):
+        """
+        Состояние адаптивного предела: текущий limit, in_flight, сколько раз
+        он рос (increases) и снижался (decreases), сколько ответов были
+        медленными или с временной ошибкой (overloaded).
+        """
+        return self.scheduler.stats() if self.scheduler is not None else {}
+
+    def add_call_hook(self, hook):
+        """
+        Добавляет хук, который вызывается после каждого запроса к Zabbix API:
+        hook(method, elapsed, result, error, retry), где elapsed - время ответа
+        в секундах, error - исключение или None, retry - это повтор вызова.
+        """
+        self.call_hooks = self.call_hooks + [hook]
+
+    def remove_call_hook(self, hook):
+        self.call_hooks = [h for h in self.call_hooks if h is not hook]
+
+    def enable_metrics(self, **kwargs):
+        """
+        Включает сбор метрик по всем вызовам (см. api_metrics.ApiMetrics).
+        Для замера отдельной задачи удобнее with ApiMetrics(api, ...).
+
+        Returns:
+            ApiMetrics
+        """
+        if self.metrics is not None:
+            self.remove_call_hook(self.metrics)
+        self.metrics = ApiMetrics(**kwargs)
+        self.add_call_hook(self.metrics)
+        return self.metrics
+
+    def _request(self, method, **params):
+        """
+        Единая точка вызова методов Zabbix API ('host.get' и т.п.).
+        Возвращает поле result ответа.
+        """
+        if self.single_flight is not None and is_coalescable(method):
+            return self.single_flight.do(method, params, lambda: self._request_once(method, params))
+        return self._request_once(method, params)
+
+    def _request_once(self, method, params):
+        generation = self._session_generation
+        try:
+            return self._attempt(method, params)
+        except APIRequestError as e:
+            if self.token or not _is_session_expired(e):
+                raise
+
+        self._relogin(generation)
+        return self._attempt(method, params, retry=True)
+
+    def _attempt(self, method, params, retry=False):
+        # Единственный слой повторов: вызывающие (_fan_out и др.) сами не повторяют,
+        # иначе каждая их попытка приходила бы в AdaptiveConcurrency как новая работа.
+        # Повторяются только чтения: запись могла выполниться, хотя ответ потерян
+        retries = self.retries if is_coalescable(method) else 0
+        for attempt in range(retries + 1):
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            try:
+                return self._scheduled(method, params, retry or attempt > 0)
+            except Exception as e:
+                if attempt == retries or not is_transient(e):
+                    raise
+            time.sleep(backoff_delay(attempt))
+
+    def _scheduled(self, method, params, retry):
+        if self.scheduler is None:
+            return self._send(method, params, retry)
+
+        token = self.scheduler.acquire()
+        elapsed = None
+        overloaded = False
+        start = time.perf_counter()
+        try:
+            result = self._send(method, params, retry)
+            elapsed = time.perf_counter() - start
+            return result
+        except Exception as e:
+            overloaded = is_transient(e)
+            raise
+        finally:
+            self.scheduler.release(token, method, elapsed, overloaded)
+
+    def _send(self, method, params, retry=False):
+        hooks = self.call_hooks
+        if not hooks:
+            return self.api.send_api_request(method, params).get('result')
+
+        result = error = None
+        start = time.perf_counter()
+        try:
+            result = self.api.send_api_request(method, params).get('result')
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            for hook in hooks:
+                try:
+                    hook(method, elapsed, result, error, retry)
+                except Exception as e:
+                    print(f"Ошибка в хуке вызова {method}: {e}")
+
+    def _fan_out(self, method, hosts, chunk_size=None, **params):
+        """
+        Вызов method по пачкам hostids: пачки выполняются параллельно в fanout_workers
+        потоках. Пачка повторяется только внутри _request (retries раз при временной
+        ошибке): второй слой повторов здесь умножал бы число попыток.
+
+        Returns:
+            (строки ответа всех успешных пачек одним списком,
+             [{'hostids': [...], 'error': исключение}, ...] по пачкам, которые не удалось получить)
+        """
+        chunk_size = chunk_size or FANOUT_CHUNK_SIZE.get(method, 500)
+        chunks = [hosts[i:i + chunk_size] for i in range(0, len(hosts), chunk_size)]
+
+        def fetch(chunk):
+            try:
+                return self._request(method, hostids=chunk, **params), None
+            except Exception as e:
+                return None, e
+
+        # С адаптивным пределом потоков может быть больше: лишние ждут в scheduler
+        workers = self.scheduler.max_limit if self.scheduler is not None else self.fanout_workers
+        if len(chunks) == 1 or workers == 1:
+            results = [fetch(chunk) for chunk in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+                results = list(pool.map(fetch, chunks))
+
+        rows = []
+        failures = []
+        for chunk, (result, error) in zip(chunks, results):
+            if error is None:
+                rows.extend(result)
+            else:
+                failures.append({'hostids': chunk, 'error': error})
+
+        if failures:
+            failed = sum(len(failure['hostids']) for failure in failures)
+            print(f"Ошибка {method}: не получено {len(failures)} из {len(chunks)} пачек "
+                  f"({failed} хостов): {failures[0]['error']}")
+        return rows, failures
+
+    def _fan_out_result(self, method, rows, failures, parse, strict):
+        # Частичный результат возвращается как есть, strict - исключением с ним внутри
+        result = parse(rows)
+        if failures and strict:
+            raise PartialResultError(method, result, failures)
+        return result
+
 # -------------------------------------------------------------------------------------------
 
+    @_memoized
     def get_template_id_by_name(self, name):
         if not self.api:
             print("Ошибка: Экземпляр API не инициализирован.")
-            return None
+            raise _LookupFailed(None)
         if not name:
             print("Предупреждение: Имя шаблона не указано.")
             return None
 
         try:
-            templates = self.api.template.get(
+            templates = self._request(
+                'template.get',
                 filter={'host': [name]},
                 output=['templateid']
             )
@@ -92,14 +860,15 @@ class API:
 
         except Exception as e:
             print(f"Ошибка при получении ID шаблона '{name}': {e}")
-            return None
+            raise _LookupFailed(None)
 
 # -------------------------------------------------------------------------------------------
 
+    @_memoized
     def get_hosts_by_template_id(self, id):
         if not self.api:
             print("Ошибка: Экземпляр API не инициализирован.")
-            return []
+            raise _LookupFailed([])
         if not id:
             print("Предупреждение: Template ID не указан.")
             return []
@@ -107,7 +876,8 @@ class API:
         host_ids = []
 
         try:
-            result = self.api.template.get(
+            result = self._request(
+                'template.get',
                 templateids=[id],
                 selectHosts=['hostid'],
                 output=[]
@@ -120,16 +890,17 @@ class API:
 
         except Exception as e:
             print(f"Ошибка при получении хостов для шаблона ID {id}: {e}")
-            return []
+            raise _LookupFailed([])
 
         return host_ids
 
 # -------------------------------------------------------------------------------------------
 
+    @_memoized
     def get_hostgroup_id(self, name):
         if not self.api:
             print("Ошибка: Экземпляр API не инициализирован.")
-            return []
+            raise _LookupFailed([])
         if not name:
             print("Предупреждение: Hostgroup name не указан.")
             return []
@@ -141,7 +912,8 @@ class API:
             else:
                 names = name
 
-            hostgroups = self.api.hostgroup.get(
+            hostgroups = self._request(
+                'hostgroup.get',
                 filter={"name": names},
                 output=["groupid", "name"]
             )
@@ -149,360 +921,466 @@ class API:
             return [group["groupid"] for group in hostgroups]
 
         except Exception as e:
-            print(f"Ошибка при получении hostgroup ID: {e}"
-            )
-            return []
+            print(f"Ошибка при получении hostgroup ID: {e}")
+            raise _LookupFailed([])
 
 # -------------------------------------------------------------------------------------------
 
-    def get_usermacro(self, hosts):
+    def get_usermacro(self, hosts, typed=False, chunk_size=None, strict=False):
         """
-        Получение макросов хостов
+        Получение макросов хостов.
+
+        Большой список хостов запрашивается пачками по chunk_size (по умолчанию
+        FANOUT_CHUNK_SIZE) параллельно. Если часть пачек не получена, возвращаются
+        макросы остальных хостов, а при strict=True - PartialResultError.
         """
+        empty = records.HostMacroMap() if typed else {}
+
         if not self.api:
             print("Ошибка: API не инициализирован")
-            return {}
+            return empty
 
-        # Проверка входных данных
+        hosts = _normalize_hosts(hosts)
         if not hosts:
-            print("Предупреждение: Не указаны хосты")
-            return {}
+            return empty
 
-        # Преобразуем к списку если hosts != списку если это возможно либо выдаем ошибку
-        if isinstance(hosts, str):
-            hosts = [hosts]
-        elif not isinstance(hosts, list):
-            try:
-                hosts = [str(hosts)]
-            except:
-                print("Ошибка: hosts должен быть списком, числом или строкой")
-                return {}
-
-        # Структура для результатов
-        result = {}
-
-        try:
-            # Запрашиваем макросы
-            macros = self.api.usermacro.get(hostids=hosts)
-
-            # Обрабатываем результаты
-            for macro in macros:
-                if 'hostid' in macro and 'macro' in macro and 'value' in macro:
-                    hostid = macro['hostid']
-                    macro_name = macro['macro']
-                    value = macro['value']
+        # Запрашиваем макросы
+        macros, failures = self._fan_out('usermacro.get', hosts, chunk_size)
+        parse = records.parse_usermacro if typed else _parse_usermacro
+        return self._fan_out_result('usermacro.get', macros, failures, parse, strict)
 
-                    # Создаем структуру словаря
-                    if 'host' not in result:
-                        result['host'] = {}
-
-                    if hostid not in result['host']:
-                        result['host'][hostid] = {}
-
-                    if 'macro' not in result['host'][hostid]:
-                        result['host'][hostid]['macro'] = {}
-
-                    if macro_name not in result['host'][hostid]['macro']:
-                        result['host'][hostid]['macro'][macro_name] = {}
+# -------------------------------------------------------------------------------------------
 
-                    # Записываем значение
-                    result['host'][hostid]['macro'][macro_name]['value'] = value
+    def get_host_tags(self, hosts, typed=False, chunk_size=None, strict=False):
+        """
+        Теги хостов. Пачки и частичные ошибки - как в get_usermacro.
+        """
+        empty = records.HostTagMap() if typed else {}
 
-            return result
+        if not self.api:
+            print("Ошибка: API не инициализирован")
+            return empty
 
-        except Exception as e:
-            print(f"Ошибка при получении макросов: {e}")
-            return {}
+        hosts = _normalize_hosts(hosts)
+        if not hosts:
+            return empty
+
+        host_data, failures = self._fan_out(
+            'host.get',
+            hosts,
+            chunk_size,
+            selectTags="extend",
+            output=["host"]
+        )
+        parse = records.parse_host_tags if typed else _parse_host_tags
+        return self._fan_out_result('host.get', host_data, failures, parse, strict)
 
 # -------------------------------------------------------------------------------------------
 
-    def get_host_tags(self, hosts):
+    def get_hosts_bulk(self, hosts, chunk_size=500, macros=False, fields=False, strict=False):
+        """
+        Теги, группы и (опционально) макросы для многих хостов пачками host.get.
+
+        Args:
+            hosts: Список hostid
+            chunk_size: Сколько hostid отправлять в одном запросе
+            macros: Запрашивать ли макросы хостов
+            fields: Запрашивать ли поля хоста (host, name, status, flags, proxy)
+            strict: PartialResultError, если часть пачек не получена;
+                    иначе возвращаются данные по остальным хостам
+
+        Returns:
+            {hostid: {'tags': {tag: {'value': ...}}, 'groups': [groupid, ...],
+                      'macro': {macro: {'value': ...}}}}
+            Ключ 'macro' есть только при macros=True, поля хоста - при fields=True.
+        """
         if not self.api:
             print("Ошибка: API не инициализирован")
             return {}
 
-        # Проверяем входные данные
+        hosts = _normalize_hosts(hosts)
         if not hosts:
-            print("Предупреждение: Не указаны хосты")
             return {}
 
-        # Преобразуем к списку если нужно
-        if isinstance(hosts, str):
-                hosts = [hosts]
-        elif not isinstance(hosts, list):
-            try:
-                hosts = [str(hosts)]     
-            except:
-                print("Ошибка: hosts должен быть списком, числом или строкой")
-                return {}
+        params = {
+            'output': ['hostid', 'host', 'name', 'status', 'flags', 'proxy_hostid'] if fields else ['hostid'],
+            'selectTags': ['tag', 'value'],
+            'selectHostGroups': ['groupid']
+        }
+        if macros:
+            params['selectMacros'] = ['macro', 'value']
 
-        # Структура для результатов
-        result = {}
+        host_data, failures = self._fan_out('host.get', hosts, chunk_size, **params)
+        return self._fan_out_result('host.get', host_data, failures, _parse_hosts_bulk, strict)
 
-        try:
-            host_data = self.api.host.get(
-                hostids=hosts,
-                selectTags="extend",
-                output=["host"]
-            )
-
-            # Обрабатываем результаты
-            for host in host_data:
-                if 'hostid' in host and 'tags' in host:
-                    hostid = host['hostid']
-                    tags = host['tags']
+# -------------------------------------------------------------------------------------------
 
-                    # Создаем структуру в результатах
-                    if 'host' not in result:
-                        result['host'] = {}
+    def get_host_ids(self):
+        """
+        Список hostid всех хостов (только id, без данных).
+        Возвращает None при ошибке, чтобы ее нельзя было спутать с пустым списком.
+        """
+        if not self.api:
+            print("Ошибка: API не инициализирован")
+            return None
 
-                    if hostid not in result['host']:
-                        result['host'][hostid] = {}
+        try:
+            hosts = self._request('host.get', output=['hostid'])
+        except Exception as e:
+            print(f"Ошибка при получении списка хостов: {e}")
+            return None
 
-                    if 'tags' not in result['host'][hostid]:
-                        result['host'][hostid]['tags'] = {}
+        return [host['hostid'] for host in hosts]
 
-                    # Обрабатываем каждый тег
-                    for tag in tags:
-                        if 'tag' in tag and 'value' in tag:
-                            tag_name = tag['tag']
-                            tag_value = tag['value']
+# -------------------------------------------------------------------------------------------
 
-                            # Добавляем тег в структуру
-                            if tag_name not in result['host'][hostid]['tags']:
-                                result['host'][hostid]['tags'][tag_name] = {}
+    def get_audit_resources(self, time_from, resourcetypes):
+        """
+        Id объектов, изменявшихся начиная с time_from, по записям auditlog.get.
 
-                            result['host'][hostid]['tags'][tag_name]['value'] = tag_value
+        Args:
+            time_from: unixtime начала периода
+            resourcetypes: Типы ресурсов аудита (4 - хост, 14 - группа хостов, ...)
 
-            return result
+        Returns:
+            {resourcetype: set(resourceid)} или None, если аудит недоступен
+            (нет прав, отключен или старая версия Zabbix)
+        """
+        if not self.api:
+            print("Ошибка: API не инициализирован")
+            return None
 
+        try:
+            entries = self._request(
+                'auditlog.get',
+                output=['resourcetype', 'resourceid'],
+                filter={'resourcetype': [str(t) for t in resourcetypes]},
+                time_from=int(time_from)
+            )
         except Exception as e:
-            print(f"Ошибка при получении тегов: {e}")
-            return {}
+            print(f"Журнал аудита недоступен: {e}")
+            return None
+
+        result = {int(t): set() for t in resourcetypes}
+        for entry in entries:
+            resourcetype = int(entry.get('resourcetype', -1))
+            if resourcetype in result and entry.get('resourceid'):
+                result[resourcetype].add(entry['resourceid'])
+        return result
+
+    def has_audit_log(self):
+        """
+        Ведет ли Zabbix журнал аудита: auditlog.get(limit=1) без фильтра по времени
+        вернул хоть одну запись. Пустой ответ get_audit_resources за период тогда
+        значит "изменений не было", а не "аудит отключен". Успешная проверка
+        выполняется один раз на объект API.
+        """
+        if self._audit_log is None:
+            if not self.api:
+                print("Ошибка: API не инициализирован")
+                return False
+            try:
+                entries = self._request('auditlog.get', output=['auditid'], limit=1)
+            except Exception as e:
+                print(f"Журнал аудита недоступен: {e}")
+                return False
+            self._audit_log = bool(entries)
+        return self._audit_log
 
 # -------------------------------------------------------------------------------------------
 
-    def get_usergroup(self):
+    @_memoized
+    def get_usergroup(self, typed=False):
+        empty = records.UserGroupMap() if typed else {}
+
         if not self.api:
-            
+
             print("Ошибка: API не инициализирован")
-            return {}
+            raise _LookupFailed(empty)
 
         try:
-            usergroups = self.api.usergroup.get(
+            usergroups = self._request(
+                'usergroup.get',
                 output=["usrgrpid", "name", "users"],
                 selectUsers=1
             )
         except Exception as e:
             print(f"Ошибка при получении данных usergroup: {e}")
-            return {}
-
-        result = {'usrgrp': {}, 'users': {}}
-
-        for usergroup in usergroups:
-            if not all(key in usergroup for key in ['usrgrpid', 'name', 'users']):
-                continue
-
-            usergrpid = usergroup['usrgrpid']
-            name = usergroup['name']
-            users = usergroup['users']
-
-            # Инициализируем структуру группы
-            if usergrpid not in result['usrgrp']:
-                result['usrgrp'][usergrpid] = {
-                    'name': name,
-                    'users': {}
-                }
+            raise _LookupFailed(empty)
 
-            # Обрабатываем пользователей группы
-            if isinstance(users, list):
-                for user in users:
-                    if isinstance(user, dict) and 'userid' in user:
-                        userid = user['userid']
-
-                        # Добавляем в группу
-                        result['usrgrp'][usergrpid]['users'][userid] = {
-                            'exist': True}
-
-                        # Добавляем обратную ссылку
-                        if userid not in result['users']:
-                            result['users'][userid] = {'usrgrp': {}}
-                        result['users'][userid]['usrgrp'][usergrpid] = {
-                            'exist': True}
-
-        return result
+        return records.parse_usergroup(usergroups) if typed else _parse_usergroup(usergroups)
 
 # -------------------------------------------------------------------------------------------
 
-    def get_problem(self, hosts):
+    def get_problem(self, hosts, typed=False, chunk_size=None, strict=False):
+        """
+        Открытые проблемы хостов. Пачки и частичные ошибки - как в get_usermacro.
+        """
+        empty = records.ProblemMap() if typed else {}
+
         if not self.api:
             print("Ошибка: API не инициализирован")
-            return {}
+            return empty
 
-        # Проверяем входные данные
+        hosts = _normalize_hosts(hosts)
         if not hosts:
-            print("Предупреждение: Не указаны хосты")
-            return {}
+            return empty
+
+        # Проблема триггера на нескольких хостах может прийти в двух пачках,
+        # разбор по eventid оставляет одну
+        problems, failures = self._fan_out(
+            'problem.get',
+            hosts,
+            chunk_size,
+            selectAcknowledges="extend"
+        )
+        parse = records.parse_problems if typed else _parse_problems
+        return self._fan_out_result('problem.get', problems, failures, parse, strict)
 
-        # Преобразуем к списку
-        if isinstance(hosts, str):
-            hosts = [hosts]
-        elif not isinstance(hosts, list):
-            try:
-                hosts = [str(hosts)]
-            except:
-                print("Ошибка: hosts должен быть списком, числом или строкой")
-                return {}
+ # -------------------------------------------------------------------------------------------
 
-        # Структура
-        result = {}
+    @_memoized
+    def get_hostgroup_list_v64(self):
 
         try:
-            problems = self.api.problem.get(
-                hostids=hosts,
-                selectAcknowledges="extend"
-            )
+           res = self._request('hostgroup.get')
         except Exception as e:
-            print(f"Ошибка при получении данных о problems: {e}")
-            return {}
-
-        for problem in problems:
-            if not all(key in problem for key in ['name', 'clock', 'severity', 'eventid', 'objectid']):
-                continue
-
-            eventid = problem['eventid']
-            result[eventid] = {
-                'name': problem['name'],
-                'clock': problem['clock'],
-                'severity': problem['severity'],
-                'objectid': problem['objectid'],
-                'acknowledged': problem['acknowledged'],
-                'acknowledges': {}
-            }
+            print("Ошибка при получении хостов")
+            raise _LookupFailed({})
 
-            if 'acknowledges' in problem and isinstance(problem['acknowledges'], list):
-                for acknowledge in problem['acknowledges']:
-                    acknowledges_fields = ['acknowledgeid', 'message', 'clock', 'userid', 'action']
-                    if all(key in acknowledge for key in acknowledges_fields):
-                        ack_id = acknowledge['acknowledgeid']
-                        result[eventid]['acknowledges'][ack_id] = {
-                            'message': acknowledge['message'],
-                            'clock': acknowledge['clock'],
-                            'userid': acknowledge['userid'],
-                            'action': acknowledge['action'],
-                            'old_severity': acknowledge.get('old_severity', ''),
-                            'new_severity': acknowledge.get('new_severity', '')
-                        }
+        return _parse_hostgroup_list(res)
 
-        return result
-    
- # -------------------------------------------------------------------------------------------
-   
-    def get_hostgroup_list_v64(self):
-        
-        array = []
-        result = {}
-        
-        try:
-           res = self.api.hostgroup.get()
-        except Exception as e:
-            print("Ошибка при получении хостов")
-            return {}
-        
-        if isinstance(res, list) and len(res)>0: #Проверяем, что res = список и числовое значение > 0
-            for group in res:
-                if isinstance(group, dict) and "name" in group and "groupid" in group:
-                    result[group["groupid"]] = {"name": group["name"]} 
-                    array.append(group["groupid"])
-                    
-        return {"hash": result, "array": array}
-   
-    # dict = {}
-    #     group = {"groupid": 123, "name": "Servers"}
-    #         result = {
-    #             123: {"name": "Servers"},
-    #             456: {"name": "Workstations"},
-    # }
 # -------------------------------------------------------------------------------------------
 
-    def get_hostgroup_hosts_v64(self, groups):
-         
+    @_memoized
+    def get_hostgroup_hosts_v64(self, groups, profile='full'):
+         """
+         Хосты групп: {'all': {hostid: поля}, 'hostgroup': {groupid: {'host': {hostid: ...}}}}
+
+         Args:
+             profile: Какие поля хостов запрашивать (см. projection.HOSTGROUP_PROFILES):
+                      'minimal' - только hostid, 'report' - поля кэша структуры,
+                      'full' - все поля (selectHosts="extend"), или свой словарь
+         """
+
          if not groups:
             raise ValueError("Нужно указать groups")
-         
-         result = {
-             'all': {},
-             'hostgroup':{}
-            }
-         
+
          try:
-            res = self.api.hostgroup.get(
+            res = self._request(
+              'hostgroup.get',
               groupids=groups,
-              selectHosts="extend"
+              **projection('hostgroup.get', profile)
               )
-              
+
          except Exception as e:
             print(f"Ошибка при запросе хост-групп: {e}")
-            return result
-        
-         if isinstance(res, list) and res:
-             for group in res:
-                 if isinstance (group, dict) and 'hosts' in group and isinstance(group['hosts'], list) and 'groupid' in group:
-                     
-                     groupid = group['groupid']
-                     
-                     for host in group['hosts']:
-                         if isinstance(host, dict) and all(key in host for key in ['name', 'host', 'hostid', 'status']):
-                             
-                          hostid = host['hostid']
-                     
-                          result['all'][hostid] = {
-                                'host': host['host'],
-                                'name': host['name'],
-                                'status': host['status'],
-                                'flags': host.get('flags', '0'),
-                                'proxy': host.get('proxy_hostid', '0'),
-                     }
-                     
-                          if groupid not in result['hostgroup']:
-                             result['hostgroup'][groupid] = {'host': {}}
-                         
-                          result['hostgroup'][groupid]['host'][hostid] = {
-                              'host': host['host']
-                    }
-                             
-         return result 
-     
-     
+            raise _LookupFailed({'all': {}, 'hostgroup': {}})
+
+         return _parse_hostgroup_hosts(res)
+
+
+# -------------------------------------------------------------------------------------------
+
+
+    @_memoized
+    def get_host_group_map(self, groups=None, profile='report'):
+        """
+        То же, что get_hostgroup_hosts_v64, но одним host.get с selectHostGroups:
+        каждый хост приходит один раз, а не по разу в каждой своей группе, так что
+        объем ответа растет с числом хостов, а не хостов x членств.
+
+        Args:
+            groups: Список groupid (None - все группы)
+            profile: Поля хостов, как в get_hostgroup_hosts_v64 (projection.HOSTGROUP_PROFILES)
+
+        Returns:
+            {'all': {hostid: поля}, 'hostgroup': {groupid: {'host': {hostid: ...}}},
+             'host_groups': {hostid: [groupid, ...]}} - последнее - обратный индекс
+            хост -> группы (только группы из groups)
+        """
+        empty = {'all': {}, 'hostgroup': {}, 'host_groups': {}}
+
+        if not self.api:
+            print("Ошибка: API не инициализирован")
+            raise _LookupFailed(empty)
+
+        params = {
+            'output': projection('hostgroup.get', profile).get('selectHosts', 'extend'),
+            'selectHostGroups': ['groupid']
+        }
+        if isinstance(params['output'], list):
+            params['output'] = list(dict.fromkeys(['hostid'] + params['output']))
+        if groups is not None:
+            params['groupids'] = groups
+
+        try:
+            host_data = self._request('host.get', **params)
+        except Exception as e:
+            print(f"Ошибка при запросе хостов с группами: {e}")
+            raise _LookupFailed(empty)
+
+        return _parse_host_group_map(host_data, groups)
+
 # -------------------------------------------------------------------------------------------
 
-     
-    def get_events(self, time_from=None, time_till=None, min_severity=1, value=1, eventids=None):
+
+    def get_events(self, time_from=None, time_till=None, min_severity=1, value=1, eventids=None,
+                   output="extend", details=True, profile=None, strict=False):
+        """
+        Args:
+            output: Поля события ("extend" или список полей)
+            details: Запрашивать хосты, теги и подтверждения (select*="extend")
+            profile: Профиль полей вместо output/details (см. projection.EVENT_PROFILES):
+                     'minimal', 'report', 'full' или свой словарь
+            strict: Пробрасывать ошибку запроса, а не возвращать пустой список
+                    (пустой список неотличим от "событий нет")
+
+        Параметры со значением None в запрос не передаются.
+        """
         if not self.api:
             print("Ошибка: API не инициализирован")
             return []
-        
+
+        params = {
+            'time_from': time_from,
+            'time_till': time_till,
+            'min_severity': min_severity,
+            'value': value,
+            'eventids': eventids
+        }
+        params.update(_event_projection(output, details, profile))
+
         try:
-            events = self.api.event.get(
-                selectHosts="extend",
-                selectTags="extend",
-                selectAcknowledges="extend",
-                time_from=time_from,
-                time_till=time_till,
-                min_severity=min_severity,
-                value=value,
-                eventids=eventids
-            )
+            events = self._request(
+                'event.get',
+                **{key: val for key, val in params.items() if val is not None})
             return events if isinstance(events, list) else []
         except Exception as e:
             print(f"Ошибка при получении событий: {e}")
+            if strict:
+                raise
             return []
 # -------------------------------------------------------------------------------------------
 
-        
-        
-            
-                
-                
-            
-                
+    def iter_events(self, time_from, time_till, min_severity=1, value=1, page_size=1000,
+                    output="extend", details=True, profile=None):
+        """
+        Генератор событий за период [time_from, time_till] постранично.
+
+        Страницы запрашиваются с сортировкой по (clock, eventid) и limit=page_size.
+        Период делится по clock последнего события страницы: все более ранние
+        события отдаются, а следующий запрос начинается с этой секунды. Если вся
+        страница пришла из одной секунды, она дочитывается по eventid_from.
+        Обход заканчивается только пустой страницей: сервер может отдавать меньше
+        page_size строк (ограничение на стороне Zabbix или прокси), и короткая
+        страница еще не значит, что событий больше нет. В памяти одновременно не
+        больше одной страницы.
+
+        Параметры как у get_events. В отличие от get_events, ошибка запроса
+        пробрасывается: иначе вызывающий молча получил бы обрезанный поток.
+        """
+        if not self.api:
+            print("Ошибка: API не инициализирован")
+            return
+
+        params = {
+            'min_severity': min_severity,
+            'value': value,
+            'limit': page_size
+        }
+        params.update(_event_projection(output, details, profile))
+        if isinstance(params['output'], list):
+            params['output'] = list(dict.fromkeys(params['output'] + ['eventid', 'clock']))
+        params = {key: val for key, val in params.items() if val is not None}
+
+        start = int(time_from)
+        time_till = int(time_till)
+
+        try:
+            while start <= time_till:
+                page = self._request(
+                    'event.get',
+                    time_from=start,
+                    time_till=time_till,
+                    sortfield=['clock', 'eventid'],
+                    sortorder='ASC',
+                    **params
+                )
+
+                if not page:
+                    return
+
+                last_clock = int(page[-1]['clock'])
+
+                if int(page[0]['clock']) == last_clock:
+                    # Вся страница в одной секунде - дочитываем ее по eventid
+                    while page:
+                        yield from page
+                        page = self._request(
+                            'event.get',
+                            time_from=last_clock,
+                            time_till=last_clock,
+                            eventid_from=int(page[-1]['eventid']) + 1,
+                            sortfield='eventid',
+                            sortorder='ASC',
+                            **params
+                        )
+                    start = last_clock + 1
+                    continue
+
+                # События последней секунды страницы придут в следующем запросе
+                for event in page:
+                    if int(event['clock']) == last_clock:
+                        break
+                    yield event
+                start = last_clock
+
+        except Exception as e:
+            print(f"Ошибка при получении событий: {e}")
+            raise
+# -------------------------------------------------------------------------------------------
+
+    def iter_events_since(self, eventid_from, min_severity=1, value=1, page_size=1000,
+                          output="extend", details=True, profile=None):
+        """
+        Генератор событий с eventid >= eventid_from по возрастанию eventid, страницами
+        по page_size. Курсор для слежения за новыми событиями: следующий запрос
+        начинается с eventid последнего события + 1. Как и в iter_events, обход
+        заканчивается пустой страницей, а не короткой.
+
+        Параметры как у get_events. Ошибка запроса пробрасывается, как в iter_events.
+        """
+        if not self.api:
+            print("Ошибка: API не инициализирован")
+            return
+
+        params = {
+            'min_severity': min_severity,
+            'value': value,
+            'limit': page_size
+        }
+        params.update(_event_projection(output, details, profile))
+        if isinstance(params['output'], list):
+            params['output'] = list(dict.fromkeys(params['output'] + ['eventid']))
+        params = {key: val for key, val in params.items() if val is not None}
+
+        cursor = int(eventid_from)
+        try:
+            while True:
+                page = self._request(
+                    'event.get',
+                    eventid_from=cursor,
+                    sortfield='eventid',
+                    sortorder='ASC',
+                    **params
+                )
+                if not page:
+                    return
+                yield from page
+                cursor = int(page[-1]['eventid']) + 1
+
+        except Exception as e:
+            print(f"Ошибка при получении событий: {e}")
+            raise
+# -------------------------------------------------------------------------------------------
@@ -0,0 +1,456 @@
+import asyncio
+import time
+
+import aiohttp
+from zabbix_utils import AsyncZabbixAPI
+import records
+from single_flight import AsyncSingleFlight, is_coalescable
+from projection import projection
+from zabbix_api import (
+    PartialResultError,
+    _resolve_credentials,
+    _normalize_hosts,
+    _parse_usermacro,
+    _parse_host_tags,
+    _parse_usergroup,
+    _parse_problems,
+    _parse_hostgroup_list,
+    _parse_hostgroup_hosts,
+    _parse_hosts_bulk,
+    _event_projection,
+)
+
+
+class AsyncAPI:
+    """
+    Асинхронный вариант API поверх AsyncZabbixAPI из zabbix_utils.
+
+    Методы get_* повторяют методы API и возвращают те же структуры, но
+    являются корутинами. Одновременно к Zabbix уходит не больше
+    concurrency запросов.
+
+    Пример:
+        async with AsyncAPI(creds_file="creds.ini", concurrency=20) as api:
+            tags, macros = await api.gather([
+                api.get_host_tags(hostids),
+                api.get_usermacro(hostids),
+            ])
+    """
+
+    def __init__(self, url=None, token=None, user=None, password=None, creds_file=None,
+                 concurrency=10, timeout=5, coalesce=True):
+        """
+        Args:
+            url: URL Zabbix API
+            token: API токен
+            user: Имя пользователя Zabbix
+            password: Пароль Zabbix
+            creds_file: Путь к .ini файлу с кредами
+            concurrency: Максимум одновременных запросов к Zabbix API
+            timeout: Таймаут одного запроса, секунды
+            coalesce: Объединять одновременные одинаковые запросы на чтение в один вызов
+        """
+        self.url, self.token, self.user, self.password = _resolve_credentials(
+            url, token, user, password, creds_file)
+
+        if concurrency < 1:
+            raise ValueError("concurrency должен быть >= 1")
+
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+        # Хуки вызовов, как у API: hook(method, elapsed, result, error, retry)
+        self.call_hooks = []
+        # Объединение одновременных одинаковых запросов, как у API
+        self.single_flight = AsyncSingleFlight() if coalesce else None
+
+        # Подключение создается в connect(): aiohttp-сессии нужен запущенный event loop
+        self.api = None
+        self._semaphore = None
+        # aiohttp-сессия принадлежит AsyncAPI: AsyncZabbixAPI не закрывает свою,
+        # если упал в конструкторе (проверка версии) или при входе
+        self._session = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def connect(self):
+        try:
+            print(f"Попытка подключения к {self.url} \n")
+            self._session = aiohttp.ClientSession()
+            self.api = AsyncZabbixAPI(url=self.url, timeout=self.timeout, client_session=self._session)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+            if self.token:
+                await self.api.login(token=self.token)
+            else:
+                await self.api.login(user=self.user, password=self.password)
+
+            # Небольшая проверка, что API живой (запросим хосты)
+            try_hosts = await self.api.host.get(limit=1)
+            if try_hosts:
+                print("API доступен", "\n")
+            else:
+                print(f"Ошибка: Не удалось получить данные хостов. \n")
+                raise ConnectionError(f"Не удалось получить данные хостов. \n")
+
+        except Exception as e:
+            await self.close()
+            print(f"Ошибка подключения к Zabbix {self.url} \n")
+            raise ConnectionError(e) from None
+
+        print(f"Успешное подключение к Zabbix API: {self.url} \n")
+        return self
+
+    async def close(self):
+        api, self.api = self.api, None
+        session, self._session = self._session, None
+        try:
+            if api is not None:
+                await api.logout()
+        except Exception as e:
+            print(f"Ошибка при отключении от Zabbix: {e}")
+        finally:
+            # Закрывается и после неудачного подключения, и после ошибки logout
+            if session is not None and not session.closed:
+                await session.close()
+
+    async def _call(self, method, **params):
+        """
+        Выполняет один метод Zabbix API ('host.get' и т.п.) с учетом
+        ограничения на число одновременных запросов.
+        """
+        if self.single_flight is not None and is_coalescable(method):
+            return await self.single_flight.do(method, params, lambda: self._call_once(method, params))
+        return await self._call_once(method, params)
+
+    async def _call_once(self, method, params):
+        async with self._semaphore:
+            hooks = self.call_hooks
+            if not hooks:
+                response = await self.api.send_async_request(method, params)
+                return response.get('result')
+
+            result = error = None
+            start = time.perf_counter()
+            try:
+                result = (await self.api.send_async_request(method, params)).get('result')
+                return result
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                for hook in hooks:
+                    try:
+                        hook(method, elapsed, result, error, False)
+                    except Exception as e:
+                        print(f"Ошибка в хуке вызова {method}: {e}")
+
+    def coalesce_stats(self):
+        return self.single_flight.stats() if self.single_flight is not None else {}
+
+    def add_call_hook(self, hook):
+        self.call_hooks = self.call_hooks + [hook]
+
+    def remove_call_hook(self, hook):
+        self.call_hooks = [h for h in self.call_hooks if h is not hook]
+
+    async def gather(self, calls, concurrency=None, return_exceptions=False):
+        """
+        Выполняет набор корутин конкурентно, не более concurrency одновременно.
+        Результаты возвращаются в порядке calls.
+
+        Args:
+            calls: Итерируемое корутин (например, [api.get_problem(h) for h in chunks])
+            concurrency: Ограничение для этого вызова, по умолчанию self.concurrency
+            return_exceptions: Как в asyncio.gather
+        """
+        limit = asyncio.Semaphore(concurrency or self.concurrency)
+
+        async def _run(coro):
+            async with limit:
+                return await coro
+
+        return await asyncio.gather(*(_run(c) for c in calls),
+                                    return_exceptions=return_exceptions)
+
+# -------------------------------------------------------------------------------------------
+
+    async def get_template_id_by_name(self, name):
+        if not self.api:
+            print("Ошибка: Экземпляр API не инициализирован.")
+            return None
+        if not name:
+            print("Предупреждение: Имя шаблона не указано.")
+            return None
+
+        try:
+            templates = await self._call(
+                'template.get',
+                filter={'host': [name]},
+                output=['templateid']
+            )
+        except Exception as e:
+            print(f"Ошибка при получении ID шаблона '{name}': {e}")
+            return None
+
+        if templates:
+            return templates[0]['templateid']
+        print(f"Шаблон с именем '{name}' не найден.")
+        return None
+
+# -------------------------------------------------------------------------------------------
+
+    async def get_hosts_by_template_id(self, id):
+        if not self.api:
+            print("Ошибка: Экземпляр API не инициализирован.")
+            return []
+        if not id:
+            print("Предупреждение: Template ID не указан.")
+            return []
+
+        try:
+            result = await self._call(
+                'template.get',
+                templateids=[id],
+                selectHosts=['hostid'],
+                output=[]
+            )
+        except Exception as e:
+            print(f"Ошибка при получении хостов для шаблона ID {id}: {e}")
+            return []
+
+        if result and 'hosts' in result[0] and result[0]['hosts']:
+            return [host['hostid'] for host in result[0]['hosts']]
+        return []
+
+# -------------------------------------------------------------------------------------------
+
+    async def get_hostgroup_id(self, name):
+        if not self.api:
+            print("Ошибка: Экземпляр API не инициализирован.")
+            return []
+        if not name:
+            print("Предупреждение: Hostgroup name не указан.")
+            return []
+
+        names = [name] if isinstance(name, str) else name
+
+        try:
+            hostgroups = await self._call(
+                'hostgroup.get',
+                filter={"name": names},
+                output=["groupid", "name"]
+            )
+        except Exception as e:
+            print(f"Ошибка при получении hostgroup ID: {e}")
+            return []
+
+        return [group["groupid"] for group in hostgroups]
+
+# -------------------------------------------------------------------------------------------
+
+    async def get_usermacro(self, hosts, typed=False):
+        empty = records.HostMacroMap() if typed else {}
+
+        if not self.api:
+            print("Ошибка: API не инициализирован")
+            return empty
+
+        hosts = _normalize_hosts(hosts)
+        if not hosts:
+            return empty
+
+        try:
+            macros = await self._call('usermacro.get', hostids=hosts)
+        except Exception as e:
+            print(f"Ошибка при получении макросов: {e}")
+            return empty
+
+        return records.parse_usermacro(macros) if typed else _parse_usermacro(macros)
+
+# -------------------------------------------------------------------------------------------
+
+    async def get_host_tags(self, hosts, typed=False):
+        empty = records.HostTagMap() if typed else {}
+
+        if not self.api:
+            print("Ошибка: API не инициализирован")
+            return empty
+
+        hosts = _normalize_hosts(hosts)
+        if not hosts:
+            return empty
+
+        try:
+            host_data = await self._call(
+                'host.get',
+                hostids=hosts,
+                selectTags="extend",
+                output=["host"]
+            )
+        except Exception as e:
+            print(f"Ошибка при получении тегов: {e}")
+            return empty
+
+        return records.parse_host_tags(host_data) if typed else _parse_host_tags(host_data)
+
+# -------------------------------------------------------------------------------------------
+
+    async def get_hosts_bulk(self, hosts, chunk_size=500, macros=False, fields=False, strict=False):
+        """
+        Как API.get_hosts_bulk, но пачки запрашиваются конкурентно.
+        Ошибка одной пачки не отменяет остальные: при strict=True - PartialResultError
+        с данными успешных пачек, иначе возвращаются данные по остальным хостам.
+        """
+        if not self.api:
+            print("Ошибка: API не инициализирован")
+            return {}
+
+        hosts = _normalize_hosts(hosts)
+        if not hosts:
+            return {}
+
+        params = {
+            'output': ['hostid', 'host', 'name', 'status', 'flags', 'proxy_hostid'] if fields else ['hostid'],
+            'selectTags': ['tag', 'value'],
+            'selectHostGroups': ['groupid']
+        }
+        if macros:
+            params['selectMacros'] = ['macro', 'value']
+
+        chunks = [hosts[i:i + chunk_size] for i in range(0, len(hosts), chunk_size)]
+        results = await asyncio.gather(*(
+            self._call('host.get', hostids=chunk, **params) for chunk in chunks
+        ), return_exceptions=True)
+
+        rows = []
+        failures = []
+        for chunk, host_data in zip(chunks, results):
+            if isinstance(host_data, BaseException):
+                failures.append({'hostids': chunk, 'error': host_data})
+            else:
+                rows.extend(host_data)
+
+        result = _parse_hosts_bulk(rows)
+        if failures:
+            failed = sum(len(failure['hostids']) for failure in failures)
+            print(f"Ошибка host.get: не получено {len(failures)} из {len(chunks)} пачек "
+                  f"({failed} хостов): {failures[0]['error']}")
+            if strict:
+                raise PartialResultError('host.get', result, failures)
+        return result
+
+# -------------------------------------------------------------------------------------------
+
+    async def get_usergroup(self, typed=False):
+        empty = records.UserGroupMap() if typed else {}
+
+        if not self.api:
+            print("Ошибка: API не инициализирован")
+            return empty
+
+        try:
+            usergroups = await self._call(
+                'usergroup.get',
+                output=["usrgrpid", "name", "users"],
+                selectUsers=1
+            )
+        except Exception as e:
+            print(f"Ошибка при получении данных usergroup: {e}")
+            return empty
+
+        return records.parse_usergroup(usergroups) if typed else _parse_usergroup(usergroups)
+
+# -------------------------------------------------------------------------------------------
+
+    async def get_problem(self, hosts, typed=False):
+        empty = records.ProblemMap() if typed else {}
+
+        if not self.api:
+            print("Ошибка: API не инициализирован")
+            return empty
+
+        hosts = _normalize_hosts(hosts)
+        if not hosts:
+            return empty
+
+        try:
+            problems = await self._call(
+                'problem.get',
+                hostids=hosts,
+                selectAcknowledges="extend"
+            )
+        except Exception as e:
+            print(f"Ошибка при получении данных о problems: {e}")
+            return empty
+
+        return records.parse_problems(problems) if typed else _parse_problems(problems)
+
+# -------------------------------------------------------------------------------------------
+
+    async def get_hostgroup_list_v64(self):
+        try:
+            res = await self._call('hostgroup.get')
+        except Exception as e:
+            print("Ошибка при получении хостов")
+            return {}
+
+        return _parse_hostgroup_list(res)
+
+# -------------------------------------------------------------------------------------------
+
+    async def get_hostgroup_hosts_v64(self, groups, profile='full'):
+        """
+        Как API.get_hostgroup_hosts_v64: profile - поля хостов (projection.HOSTGROUP_PROFILES)
+        """
+        if not groups:
+            raise ValueError("Нужно указать groups")
+
+        try:
+            res = await self._call(
+                'hostgroup.get',
+                groupids=groups,
+                **projection('hostgroup.get', profile)
+            )
+        except Exception as e:
+            print(f"Ошибка при запросе хост-групп: {e}")
+            return {'all': {}, 'hostgroup': {}}
+
+        return _parse_hostgroup_hosts(res)
+
+# -------------------------------------------------------------------------------------------
+
+    async def get_events(self, time_from=None, time_till=None, min_severity=1, value=1, eventids=None,
+                         output="extend", details=True, profile=None):
+        """
+        Как API.get_events: profile - профиль полей вместо output/details
+        (projection.EVENT_PROFILES)
+        """
+        if not self.api:
+            print("Ошибка: API не инициализирован")
+            return []
+
+        params = {
+            'time_from': time_from,
+            'time_till': time_till,
+            'min_severity': min_severity,
+            'value': value,
+            'eventids': eventids
+        }
+        params.update(_event_projection(output, details, profile))
+
+        try:
+            events = await self._call(
+                'event.get', **{key: val for key, val in params.items() if val is not None})
+        except Exception as e:
+            print(f"Ошибка при получении событий: {e}")
+            return []
+
+        return events if isinstance(events, list) else []
+# -------------------------------------------------------------------------------------------
@@ -0,0 +1,371 @@
+import argparse
+import json
+import os
+import signal
+import socketserver
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from zabbix_api import API
+from snapshot import FileLock, SnapshotStore
+from cache_loader import StructureIndex, load_file
+from host_index import HostIndex
+from daemon_client import DEFAULT_SOCKET
+
+
+# Долгоживущий процесс: одна авторизованная сессия API, кэш структуры и дневные
+# файлы событий в памяти. Клиенты (daemon_client.py) обращаются к нему по
+# Unix-сокету и не тратят секунды на импорт, вход в Zabbix и чтение кэшей.
+
+# Методы API, доступные клиентам: только чтение
+API_METHODS = {
+    'get_template_id_by_name', 'get_hosts_by_template_id', 'get_hostgroup_id',
+    'get_usermacro', 'get_host_tags', 'get_hosts_bulk', 'get_host_ids', 'get_usergroup',
+    'get_problem', 'get_hostgroup_list_v64', 'get_hostgroup_hosts_v64', 'get_host_group_map',
+    'get_events'
+}
+
+
+def _json_default(value):
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        daemon = self.server.zabbix_daemon
+        # Соединение живет, пока клиент не закроет его: запросы идут по одному
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = daemon.handle(line)
+            self.wfile.write(json.dumps(response, default=_json_default).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class ZabbixDaemon:
+    """
+    Сервис с теплым подключением к Zabbix и кэшами в памяти.
+
+    Снимок структуры (make_cache.py) и дневные файлы событий (event_cache.py)
+    перечитываются, только когда на диске появилась новая версия: make_cache
+    публикует новый снимок, follow дописывает файл текущего дня.
+
+    Методы (METHODS):
+        ping, stats, reload
+        api(name, params)         - метод API из API_METHODS
+        structure(part=None)      - снимок структуры или его часть ('host', 'users', ...)
+        hosts.select(tags, macros, groups, mode) - hostid по индексам (host_index.HostIndex.select)
+        host(hostid)              - поля хоста с именами групп
+        events(date_from, date_to, hostids, min_severity, open_only) - события из дневных файлов
+
+    Пример:
+        api = API(creds_file="creds.ini")
+        ZabbixDaemon(api, cache_dir="/tmp/zabbix/cache_structure", event_dir="/tmp/zabbix/cache_event").serve()
+
+    Args:
+        api: API (одно подключение на все запросы клиентов)
+        socket_path: Путь к сокету (доступ только владельцу)
+        cache_dir: Каталог кэша структуры (None - без структуры)
+        event_dir: Каталог дневных файлов событий (None - без событий)
+        event_days: Сколько последних дней событий держать в памяти
+    """
+
+    METHODS = {
+        'ping': '_ping',
+        'stats': '_stats_method',
+        'reload': '_reload',
+        'api': '_api',
+        'structure': '_structure_method',
+        'hosts.select': '_hosts_select',
+        'host': '_host',
+        'events': '_events'
+    }
+
+    def __init__(self, api, socket_path=DEFAULT_SOCKET, cache_dir=None, event_dir=None, event_days=7):
+        self.api = api
+        self.socket_path = Path(socket_path)
+        self.snapshots = SnapshotStore(cache_dir, "zabbix_local", ".cache") if cache_dir else None
+        self.event_dir = Path(event_dir) if event_dir else None
+        self.event_days = event_days
+        # Второй демон на том же сокете не запустится
+        self.lock = FileLock(self.socket_path.with_name(self.socket_path.name + '.lock'))
+
+        self._reload_lock = threading.Lock()
+        self._structure = {'path': None, 'signature': None, 'cache': {},
+                           'index': HostIndex({}), 'names': StructureIndex({})}
+        # {дата: (путь, подпись файла, события)}
+        self._days = {}
+        self._days_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'start': None, 'requests': 0, 'errors': 0, 'methods': {}}
+        self._server = None
+
+    # ------------------------------------------------------------------ сервер
+
+    def serve(self):
+        """
+        Слушает сокет до stop(), SIGTERM или Ctrl+C.
+
+        Returns:
+            False, если демон с этим сокетом уже запущен, иначе True
+        """
+        if not self.lock.acquire():
+            print(f"Демон уже запущен (PID {self.lock.holder()}), блокировка {self.lock.path}")
+            return False
+
+        try:
+            self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+            # Блокировка наша - оставшийся сокет принадлежит упавшему процессу
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+
+            self._structure_state()
+            self._load_days()
+
+            umask = os.umask(0o077)
+            try:
+                self._server = _Server(str(self.socket_path), _Handler)
+            finally:
+                os.umask(umask)
+            self._server.zabbix_daemon = self
+            self._stats['start'] = time.time()
+
+            if threading.current_thread() is threading.main_thread():
+                signal.signal(signal.SIGTERM, lambda *args: self.stop())
+            print(f"Демон слушает {self.socket_path}")
+
+            try:
+                self._server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            return True
+
+        finally:
+            if self._server is not None:
+                self._server.server_close()
+                self._server = None
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+            self.lock.release()
+
+    def stop(self):
+        # shutdown() ждет завершения serve_forever - из обработчика сигнала его нельзя вызывать напрямую
+        if self._server is not None:
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+
+    def handle(self, line):
+        """Разбирает запрос (JSON-строку) и возвращает ответ {'result': ...} или {'error': ...}"""
+        method = None
+        try:
+            request = json.loads(line)
+            method = request.get('method')
+            params = request.get('params') or {}
+            handler = self.METHODS.get(method)
+            if handler is None:
+                raise ValueError(f"Неизвестный метод: {method}")
+            result = {'result': getattr(self, handler)(**params)}
+        except Exception as e:
+            result = {'error': f"{type(e).__name__}: {e}"}
+
+        with self._stats_lock:
+            self._stats['requests'] += 1
+            self._stats['errors'] += 'error' in result
+            if isinstance(method, str) and method in self.METHODS:
+                self._stats['methods'][method] = self._stats['methods'].get(method, 0) + 1
+        return result
+
+    # ------------------------------------------------------------------ кэши
+
+    @staticmethod
+    def _signature(path):
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _structure_state(self, force=False):
+        #Снимок структуры с индексами; перечитывается, если опубликована новая версия
+        if self.snapshots is None:
+            return self._structure
+
+        path = self.snapshots.latest()
+        signature = self._signature(path) if path is not None else None
+        state = self._structure
+        if not force and path == state['path'] and signature == state['signature']:
+            return state
+
+        with self._reload_lock:
+            state = self._structure
+            if not force and path == state['path'] and signature == state['signature']:
+                return state
+            try:
+                cache = load_file(path) if path is not None else {}
+            except (ValueError, IOError) as e:
+                print(f"Ошибка загрузки кэша {path}: {e}")
+                return state
+            self._structure = {'path': path, 'signature': signature, 'cache': cache,
+                               'index': HostIndex.from_cache(cache), 'names': StructureIndex(cache)}
+            if path is not None:
+                print(f"Загружен кэш структуры {path}")
+            return self._structure
+
+    def _day_path(self, date_str):
+        paths = sorted(self.event_dir.glob(f"events-{date_str}.*"))
+        return paths[0] if paths else None
+
+    def _day_events(self, date_str, keep=True):
+        #События дня; файл перечитывается, если изменился (follow дописывает текущий день)
+        path = self._day_path(date_str)
+        if path is None:
+            with self._days_lock:
+                self._days.pop(date_str, None)
+            return []
+
+        signature = self._signature(path)
+        cached = self._days.get(date_str)
+        if cached is not None and cached[0] == path and cached[1] == signature:
+            return cached[2]
+
+        try:
+            events = load_file(path)
+        except (ValueError, IOError) as e:
+            print(f"Ошибка загрузки {path}: {e}")
+            return cached[2] if cached is not None else []
+        if keep:
+            with self._days_lock:
+                self._days[date_str] = (path, signature, events)
+        return events
+
+    def _recent_dates(self):
+        today = datetime.now().date()
+        return [(today - timedelta(days=day)).isoformat() for day in range(self.event_days)]
+
+    def _prune_days(self, recent):
+        #Дни, вышедшие из окна (демон работает дольше суток), больше не держим
+        with self._days_lock:
+            if not self._days.keys() <= recent:
+                self._days = {date_str: day for date_str, day in self._days.items() if date_str in recent}
+
+    def _load_days(self):
+        if self.event_dir is None:
+            return
+        recent = set(self._recent_dates())
+        self._prune_days(recent)
+        for date_str in sorted(recent):
+            self._day_events(date_str)
+
+    # ------------------------------------------------------------------ методы
+
+    def _ping(self):
+        return 'pong'
+
+    def _stats_method(self):
+        with self._stats_lock:
+            stats = json.loads(json.dumps(self._stats))
+        state = self._structure
+        stats['uptime'] = time.time() - stats['start'] if stats['start'] else 0
+        stats['structure'] = {'path': str(state['path']) if state['path'] else None,
+                              'hosts': len(state['cache'].get('host', {}).get('all', {}))}
+        with self._days_lock:
+            days = sorted(self._days.items())
+        stats['event_days'] = {date_str: len(events) for date_str, (_, _, events) in days}
+        stats['api'] = {'coalesce': self.api.coalesce_stats(), 'cache': self.api.cache_stats(),
+                        'scheduler': self.api.scheduler_stats()}
+        return stats
+
+    def _reload(self):
+        self._structure_state(force=True)
+        with self._days_lock:
+            self._days = {}
+        self._load_days()
+        return self._stats_method()
+
+    def _api(self, name, params=None):
+        if name not in API_METHODS:
+            raise ValueError(f"Метод API недоступен через демон: {name}")
+        params = dict(params or {})
+        # Записи typed=True не сериализуются в JSON
+        params.pop('typed', None)
+        return getattr(self.api, name)(**params)
+
+    def _structure_method(self, part=None):
+        cache = self._structure_state()['cache']
+        if part is None:
+            return cache
+        if part not in cache:
+            raise KeyError(f"В кэше структуры нет раздела {part}")
+        return cache[part]
+
+    def _hosts_select(self, tags=None, macros=None, groups=None, mode='and'):
+        return self._structure_state()['index'].select(tags=tags, macros=macros, groups=groups, mode=mode).hostids()
+
+    def _host(self, hostid):
+        state = self._structure_state()
+        hostid = str(hostid)
+        host = state['cache'].get('host', {}).get('all', {}).get(hostid)
+        if host is None:
+            return None
+        names = state['names']
+        return dict(host, hostid=hostid,
+                    group_names=[names.group_names.get(g, g) for g in names.host_groups.get(hostid, ())])
+
+    def _events(self, date_from=None, date_to=None, hostids=None, min_severity=None, open_only=False):
+        """
+        События за дни [date_from, date_to] (YYYY-MM-DD, по умолчанию - сегодня).
+        Дни из окна event_days берутся из памяти, более старые читаются с диска.
+        """
+        if self.event_dir is None:
+            raise ValueError("Демон запущен без каталога событий")
+
+        today = datetime.now().date()
+        start = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else today
+        end = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else max(start, today)
+        recent = set(self._recent_dates())
+        self._prune_days(recent)
+        hostids = {str(hostid) for hostid in hostids} if hostids else None
+
+        result = []
+        day = start
+        while day <= end:
+            date_str = day.isoformat()
+            for event in self._day_events(date_str, keep=date_str in recent):
+                problem = event.get('problem', {})
+                if hostids is not None and not hostids.intersection(str(h) for h in problem.get('hosts', [])):
+                    continue
+                if min_severity is not None and int(problem.get('severity') or 0) < int(min_severity):
+                    continue
+                if open_only and event.get('recovery'):
+                    continue
+                result.append(event)
+            day += timedelta(days=1)
+        return result
+
+# -------------------------------------------------------------------------------------------
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Демон Zabbix API с кэшами в памяти (Unix-сокет)")
+    parser.add_argument('--creds', default="creds.ini", help="Файл с кредами (.ini)")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET)
+    parser.add_argument('--cache-dir', help="Каталог кэша структуры (make_cache.py)")
+    parser.add_argument('--event-dir', help="Каталог дневных файлов событий (event_cache.py)")
+    parser.add_argument('--event-days', type=int, default=7, help="Сколько последних дней событий держать в памяти")
+    parser.add_argument('--max-concurrency', type=int, default=None, help="Адаптивный предел запросов к API")
+    parser.add_argument('--max-rps', type=float, default=None)
+    args = parser.parse_args()
+
+    api = API(creds_file=args.creds, max_concurrency=args.max_concurrency, max_rps=args.max_rps)
+    # Справочные методы повторно не ходят в Zabbix между запросами клиентов
+    api.enable_cache()
+    ZabbixDaemon(api, socket_path=args.socket, cache_dir=args.cache_dir,
+                 event_dir=args.event_dir, event_days=args.event_days).serve()